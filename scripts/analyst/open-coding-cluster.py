@@ -0,0 +1,171 @@
+import argparse
+from pathlib import Path
+import json
+from src.clustering import (
+    ClusterModel,
+    ClusteringConfig,
+    EmbeddingStore,
+    IncrementalConfig,
+    NOISE_CLUSTER,
+    cluster_labels,
+    fit_cluster_model,
+    load_labels,
+    sentence_transformer_embedder,
+    update_clusters,
+    write_clusters,
+)
+
+
+def run_incremental(args, labels, store, embed_fn, config) -> None:
+    incremental_config = IncrementalConfig(
+        outlier_factor=args.outlier_factor,
+        max_growth=args.max_growth,
+        max_outlier_rate=args.max_outlier_rate,
+    )
+    if ClusterModel.exists(args.model_dir):
+        model, update = update_clusters(
+            ClusterModel.load(args.model_dir),
+            labels,
+            store,
+            embed_fn,
+            incremental_config,
+        )
+        clusters, changed = update.clusters, update.changed_cluster_ids
+        print(
+            f"{update.num_new_labels} new labels, {update.num_outliers} outliers"
+            + (", drift bound exceeded: reclustered" if update.reclustered else "")
+        )
+    else:
+        model = fit_cluster_model(
+            args.model_dir, labels, store, embed_fn, config, incremental_config
+        )
+        clusters = model.clusters
+        changed = [cluster for cluster in clusters if cluster != NOISE_CLUSTER]
+        print(f"No saved clusters in {args.model_dir}: fitted all labels")
+
+    write_clusters(args.output, clusters)
+    # Clusters whose axial coding is stale; see generate_input_texts/axial_coding.py
+    changed_path = args.output.with_suffix(".changed.json")
+    with open(changed_path, "w") as f:
+        json.dump(changed, f)
+    # Saved last, so a failed run is redone from the previous model
+    model.save()
+    print(
+        f"{len(clusters)} clusters written to {args.output}, "
+        f"{len(changed)} changed ({changed_path})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Cluster open coding labels into the input of axial coding."
+    )
+    parser.add_argument(
+        "--input",
+        type=Path,
+        default=Path("data") / "coding_results" / "open_coding.jsonl",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("data") / "coding_results" / "open_coding_clustered.json",
+    )
+    parser.add_argument(
+        "--embeddings-dir", type=Path, default=Path("data") / "embeddings"
+    )
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--device", default=None)
+    parser.add_argument(
+        "--embed-processes", type=int, default=1, help="Worker processes for embedding"
+    )
+    parser.add_argument("--pca-components", type=int, default=50)
+    parser.add_argument(
+        "--min-cluster-sizes", type=int, nargs="+", default=[10, 20, 40, 80]
+    )
+    parser.add_argument(
+        "--min-samples",
+        type=int,
+        nargs="+",
+        default=None,
+        help="Candidates for HDBSCAN min_samples (default: same as min_cluster_size)",
+    )
+    parser.add_argument(
+        "--cluster-selection-method", choices=["eom", "leaf"], default="eom"
+    )
+    parser.add_argument("--fit-sample", type=int, default=100_000)
+    parser.add_argument("--silhouette-sample", type=int, default=10_000)
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel sweep workers")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Assign labels not seen before to the saved clusters instead of refitting",
+    )
+    parser.add_argument(
+        "--model-dir",
+        type=Path,
+        default=Path("data") / "coding_results" / "open_coding_clusters",
+        help="Where --incremental keeps the fitted clusters",
+    )
+    parser.add_argument("--outlier-factor", type=float, default=1.5)
+    parser.add_argument(
+        "--max-growth",
+        type=float,
+        default=1.0,
+        help="Refit once labels added since the last fit exceed this fraction",
+    )
+    parser.add_argument(
+        "--max-outlier-rate",
+        type=float,
+        default=0.2,
+        help="Refit once this fraction of the labels added since the last fit are noise",
+    )
+    args = parser.parse_args()
+
+    labels = load_labels(args.input)
+    print(f"{len(labels)} unique labels in {args.input}")
+
+    store = EmbeddingStore(args.embeddings_dir, args.model, args.dim)
+    num_stored = len(store)
+    embed_fn = None
+    if (store.lookup(labels) < 0).any():
+        embed_fn = sentence_transformer_embedder(
+            args.model, device=args.device, num_processes=args.embed_processes
+        )
+
+    config = ClusteringConfig(
+        pca_components=args.pca_components,
+        fit_sample=args.fit_sample,
+        min_cluster_sizes=args.min_cluster_sizes,
+        min_samples=args.min_samples or [None],
+        cluster_selection_method=args.cluster_selection_method,
+        silhouette_sample=args.silhouette_sample,
+        random_state=args.seed,
+        n_jobs=args.jobs,
+    )
+    if args.incremental:
+        run_incremental(args, labels, store, embed_fn, config)
+        print(f"Embedded {len(store) - num_stored} new labels")
+        return
+
+    result = cluster_labels(labels, store, embed_fn, config)
+    print(f"Embedded {len(store) - num_stored} new labels")
+    for candidate in result.sweep:
+        silhouette = (
+            "-" if candidate.silhouette is None else f"{candidate.silhouette:.4f}"
+        )
+        print(
+            f"min_cluster_size={candidate.min_cluster_size:<4} "
+            f"min_samples={candidate.min_samples!s:<5} "
+            f"clusters={candidate.num_clusters:<5} "
+            f"noise={candidate.noise_fraction:.1%} silhouette={silhouette}"
+            + ("  <- selected" if candidate == result.best else "")
+        )
+
+    write_clusters(args.output, result.clusters)
+    print(f"{len(result.clusters)} clusters written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,34 @@
-import json
+import argparse
 from pathlib import Path
-from typing import Optional
-from langchain_openai import ChatOpenAI
-from src.agent import AgentType, BaseAgent
-from json_repair import repair_json
-from contextlib import suppress
+from src.pipeline import PipelineManifest
+from scripts.invoke.open_coding import OpenCodingAgent
 
-class OpenCodingAgent(BaseAgent):
-    def __init__(
-        self,
-        agent_id: Optional[str] = None,
-        logs_dir: Optional[Path] = Path("logs"),
-        data_dir: Optional[Path] = Path("data"),
-    ) -> None:
-        super().__init__(
-            agent_id=agent_id,
-            agent_type=AgentType.OPEN_CODING,
-            logs_dir=logs_dir,
-            data_dir=data_dir,
-        )
 
-    def get_llm(self) -> ChatOpenAI:
-        return ChatOpenAI(model="gpt-4o-mini")
+def extract_labels(parsed, fields):
+    # One line per label
+    return parsed["labels"]
 
-    
-if __name__ == "__main__":
-    agent = OpenCodingAgent(agent_id='c9a5d150-345f-4573-a105-b3039ba91e75')
-    print(agent.config.agent_id)
 
-    successful_tasks = agent._get_successful_tasks()
-    output_texts = [task.output_text for task in successful_tasks]
-    # print(output_texts)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    agent_ids = parser.add_mutually_exclusive_group(required=True)
+    agent_ids.add_argument("--agent-id")
+    agent_ids.add_argument(
+        "--pipeline-id", help="Use the open_coding agent of this pipeline"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("data") / "coding_results" / "open_coding.jsonl",
+    )
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
 
-    output_data = []
-    for output_text in output_texts:
-        with suppress(Exception):
-            output_data.extend(json.loads(repair_json(output_text))['labels'])
-    print(output_data)
+    agent_id = args.agent_id or PipelineManifest.load(args.pipeline_id).stage_agent_id(
+        "open_coding"
+    )
+    with OpenCodingAgent(agent_id=agent_id) as agent:
+        print(agent.config.agent_id)
 
-    Path("data/coding_results").mkdir(parents=True, exist_ok=True)
-    with open(Path("data") / "coding_results" / "open_coding.json", "w") as f:
-        json.dump(output_data, f, indent=4)
+        result = agent.extract_results(args.output, extract_labels, args.processes)
+        print(result)
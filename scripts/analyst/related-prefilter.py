@@ -0,0 +1,70 @@
+import argparse
+from pathlib import Path
+from src.clustering import sentence_transformer_embedder
+from src.pipeline import PipelineManifest
+from src.relevance import RelevanceClassifier, training_examples
+from scripts.invoke.related import RelatedAgent
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train the local relevance pre-filter on a RelatedAgent's LLM judgements."
+    )
+    agent_ids = parser.add_mutually_exclusive_group(required=True)
+    agent_ids.add_argument("--agent-id")
+    agent_ids.add_argument(
+        "--pipeline-id", help="Use the related agent of this pipeline"
+    )
+    parser.add_argument(
+        "--output", type=Path, default=Path("data") / "models" / "relevance"
+    )
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--embed-processes", type=int, default=1)
+    parser.add_argument(
+        "--min-precision",
+        type=float,
+        default=0.98,
+        help="Held-out precision each auto-resolved side must reach",
+    )
+    parser.add_argument("--test-size", type=float, default=0.2)
+    args = parser.parse_args()
+
+    agent_id = args.agent_id or PipelineManifest.load(args.pipeline_id).stage_agent_id(
+        "related"
+    )
+    with RelatedAgent(agent_id=agent_id) as agent:
+        texts, labels = training_examples(agent)
+    print(f"{len(texts)} judged comments, {labels.mean():.1%} relevant")
+
+    embed_fn = sentence_transformer_embedder(
+        args.model, device=args.device, num_processes=args.embed_processes
+    )
+    classifier = RelevanceClassifier.train(
+        texts, labels, embed_fn, args.model, test_size=args.test_size
+    )
+    report = classifier.report
+    print(f"ROC AUC {report.roc_auc:.3f}, Brier score {report.brier_score:.4f}")
+    print("Calibration (mean predicted -> fraction relevant):")
+    for calibration_bin in report.calibration:
+        print(
+            f"  {calibration_bin.mean_predicted:.2f} -> {calibration_bin.fraction_relevant:.2f}"
+        )
+    print("threshold  reject: coverage precision recall-loss  accept: coverage precision")
+    for point in report.thresholds[4::5]:
+        print(
+            f"  {point.threshold:.2f}     {point.reject_coverage:8.1%} {point.reject_precision:9.1%} "
+            f"{point.reject_recall_loss:11.1%}          {point.accept_coverage:8.1%} {point.accept_precision:9.1%}"
+        )
+
+    reject_threshold, accept_threshold = classifier.choose_thresholds(args.min_precision)
+    print(
+        f"Chosen for {args.min_precision:.0%} precision: irrelevant at p <= {reject_threshold}, "
+        f"relevant at p >= {accept_threshold} (None: side disabled)"
+    )
+    classifier.save(args.output)
+    print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
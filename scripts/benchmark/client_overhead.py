@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from langchain_openai import ChatOpenAI
+from stub_server import StubServer
+from src.agent import AgentType, BaseAgent
+
+
+class BenchmarkAgent(BaseAgent):
+    model = "gpt-4o-mini"
+
+
+async def _per_task_clients(num_requests: int, concurrency: int) -> float:
+    # Previous behaviour: a fresh ChatOpenAI for every task
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _one(index: int) -> None:
+        async with semaphore:
+            llm = ChatOpenAI(model=BenchmarkAgent.model)
+            await llm.ainvoke(f"request {index}")
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(_one(i) for i in range(num_requests)))
+    return time.perf_counter() - started_at
+
+
+async def _shared_client(agent: BaseAgent, num_requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    agent._http_pool_size = concurrency
+
+    async def _one(index: int) -> None:
+        async with semaphore:
+            await agent.get_llm().ainvoke(f"request {index}")
+
+    started_at = time.perf_counter()
+    try:
+        await asyncio.gather(*(_one(i) for i in range(num_requests)))
+    finally:
+        await agent.aclose_llms()
+    return time.perf_counter() - started_at
+
+
+async def main(num_requests: int, concurrency: int) -> None:
+    server = StubServer()
+    await server.start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "stub"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with BenchmarkAgent(
+            agent_type=AgentType.OPEN_CODING,
+            data_dir=Path(tmp_dir) / "data",
+            logs_dir=Path(tmp_dir) / "logs",
+        ) as agent:
+            runs = [
+                ("per-task client", lambda: _per_task_clients(num_requests, concurrency)),
+                ("shared client", lambda: _shared_client(agent, num_requests, concurrency)),
+            ]
+            print(f"{num_requests} requests, concurrency {concurrency}, zero server latency")
+            for name, run in runs:
+                server.num_connections = 0
+                elapsed = await run()
+                print(
+                    f"{name:>16}: {elapsed / num_requests * 1000:7.3f} ms/request, "
+                    f"{num_requests / elapsed:8.1f} req/s, "
+                    f"{server.num_connections} connections opened"
+                )
+
+    await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Per-request client overhead against a local stub OpenAI server."
+    )
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from run_tasks import BenchmarkAgent, _write_inputs
+from stub_server import StubServer
+from src.agent import AgentType, TaskStatus
+
+
+def _run_until_killed(
+    base_url: str, data_dir: Path, logs_dir: Path, agent_id: str, concurrency: int
+) -> None:
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "stub"
+    agent = BenchmarkAgent(
+        AgentType.OPEN_CODING, agent_id=agent_id, data_dir=data_dir, logs_dir=logs_dir
+    )
+    asyncio.run(agent.run_tasks(max_concurrent_requests=concurrency))
+
+
+async def main(args: argparse.Namespace) -> None:
+    server = StubServer(latency=args.latency, seed=0)
+    await server.start()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir, logs_dir = Path(tmp_dir) / "data", Path(tmp_dir) / "logs"
+        inputs_path = Path(tmp_dir) / "inputs.jsonl"
+        _write_inputs(inputs_path, args.tasks)
+        agent = BenchmarkAgent(
+            agent_type=AgentType.OPEN_CODING, data_dir=data_dir, logs_dir=logs_dir
+        )
+        await agent.create_tasks_from_inputs(inputs_path)
+        agent_id = agent.config.agent_id
+        agent.close()
+
+        # SIGKILL mid-run: nothing gets to flush or close
+        process = multiprocessing.get_context("spawn").Process(
+            target=_run_until_killed,
+            args=(server.base_url, data_dir, logs_dir, agent_id, args.concurrency),
+        )
+        process.start()
+        await asyncio.sleep(args.kill_after)
+        os.kill(process.pid, signal.SIGKILL)
+        await asyncio.to_thread(process.join)
+
+        db_path = data_dir / "tasks" / f"{agent_id}.db"
+        wal_path = db_path.with_name(db_path.name + "-wal")
+        wal_bytes = wal_path.stat().st_size if wal_path.exists() else 0
+
+        # Startup of the resumed run: config, store (WAL recovery), pending work
+        started_at = time.perf_counter()
+        agent = BenchmarkAgent(
+            AgentType.OPEN_CODING,
+            agent_id=agent_id,
+            data_dir=data_dir,
+            logs_dir=logs_dir,
+        )
+        num_tasks = agent.store.count()
+        num_pending = agent.store.count(TaskStatus.PENDING)
+        next(agent.store.iter_tasks(TaskStatus.PENDING), None)
+        startup_secs = time.perf_counter() - started_at
+
+        agent.store.flush()
+        integrity = sqlite3.connect(db_path).execute("PRAGMA integrity_check").fetchone()[0]
+        agent.close()
+
+    await server.close()
+    print(
+        f"Killed after {args.kill_after}s with {num_tasks - num_pending}/{num_tasks} tasks done "
+        f"({wal_bytes / 1e6:.1f} MB WAL); resume startup {startup_secs * 1000:.1f} ms, "
+        f"integrity check: {integrity}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Kill run_tasks mid-run and time how long the resumed agent takes to start."
+    )
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds")
+    parser.add_argument("--kill-after", type=float, default=10.0, help="Seconds")
+    asyncio.run(main(parser.parse_args()))
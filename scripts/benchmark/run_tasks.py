@@ -0,0 +1,261 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from stub_server import StubServer
+from src.agent import AgentType, BaseAgent, InputWriter
+
+SCENARIOS = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+COMMENTS_PER_POST = 20
+
+
+class BenchmarkAgent(BaseAgent):
+    model = "gpt-4o-mini"
+
+
+def _write_inputs(path: Path, num_tasks: int) -> None:
+    # Same shape as the open coding inputs: one prompt, posts with many comments
+    with InputWriter(path) as writer:
+        template_id = writer.add_template(
+            "Code the comment below.\n\n"
+            "## Post\n- Title: {post_title}\n- Content: {post_content}\n\n"
+            "## Comment\n- Content: {content}\n\n"
+            "## Output Format\nReturn a JSON object with a `labels` list.\n"
+        )
+        for index in range(num_tasks):
+            post_index, comment_index = divmod(index, COMMENTS_PER_POST)
+            context_id = writer.add_context(
+                f"POST_{post_index}",
+                {
+                    "post_title": f"Benchmark post {post_index}",
+                    "post_content": "A post body of a few sentences. " * 10,
+                },
+            )
+            writer.add_item(
+                f"POST_{post_index}:{comment_index}",
+                template_id,
+                context_id,
+                {"content": f"Comment {index}: " + "some words of a reply " * 5},
+            )
+
+
+async def _measure_loop_lag(lags: list[float], interval: float = 0.05) -> None:
+    # How late the event loop wakes a sleeping coroutine
+    while True:
+        started_at = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started_at - interval)
+
+
+def _count_files(root: Path) -> tuple[int, int]:
+    paths = [path for path in root.rglob("*") if path.is_file()]
+    return len(paths), sum(path.stat().st_size for path in paths)
+
+
+def _run_scenario(
+    base_url: str,
+    num_tasks: int,
+    run_tasks_kwargs: dict,
+    result_queue: multiprocessing.Queue,
+) -> None:
+    # Runs in a fresh process so peak RSS belongs to this scenario alone
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "stub"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        inputs_path = Path(tmp_dir) / "inputs.jsonl"
+        _write_inputs(inputs_path, num_tasks)
+
+        async def _main():
+            agent = BenchmarkAgent(
+                agent_type=AgentType.OPEN_CODING,
+                data_dir=Path(tmp_dir) / "data",
+                logs_dir=Path(tmp_dir) / "logs",
+            )
+            await agent.create_tasks_from_inputs(inputs_path)
+
+            lags: list[float] = []
+            monitor = asyncio.create_task(_measure_loop_lag(lags))
+            started_at = time.perf_counter()
+            result = await agent.run_tasks(**run_tasks_kwargs)
+            elapsed = time.perf_counter() - started_at
+            monitor.cancel()
+            agent.close()
+            return result, elapsed, sorted(lags)
+
+        result, elapsed, lags = asyncio.run(_main())
+        num_files, num_bytes = _count_files(Path(tmp_dir) / "data")
+        num_log_files, num_log_bytes = _count_files(Path(tmp_dir) / "logs")
+
+    metrics = result.metrics
+    result_queue.put(
+        {
+            "num_tasks": num_tasks,
+            "num_tasks_completed": result.num_tasks_completed,
+            "num_tasks_failed": result.num_tasks_failed,
+            "num_task_retries": result.num_task_retries,
+            "elapsed_secs": elapsed,
+            "tasks_per_sec": result.num_tasks_completed / elapsed,
+            "latency_p50": metrics.latency_p50,
+            "latency_p95": metrics.latency_p95,
+            "latency_p99": metrics.latency_p99,
+            "queue_wait_p99": metrics.queue_wait_p99,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "files_written": num_files + num_log_files,
+            "bytes_written": num_bytes + num_log_bytes,
+            "loop_lag_p99_ms": lags[int(len(lags) * 0.99)] * 1000 if lags else 0.0,
+            "loop_lag_max_ms": lags[-1] * 1000 if lags else 0.0,
+        }
+    )
+
+
+def _git_commit() -> str:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def _compare(output: Path, base_commit: str, commit: str) -> None:
+    # Latest record per (commit, scenario)
+    latest: dict[tuple[str, str], dict] = {}
+    with open(output, "r") as f:
+        for line in f:
+            record = json.loads(line)
+            latest[(record["commit"], record["scenario"])] = record
+
+    fields = [
+        "tasks_per_sec",
+        "latency_p99",
+        "peak_rss_mb",
+        "files_written",
+        "loop_lag_p99_ms",
+    ]
+    print(f"\n{base_commit} -> {commit}")
+    for (record_commit, scenario), record in latest.items():
+        base = latest.get((base_commit, scenario))
+        if record_commit != commit or base is None:
+            continue
+        changes = ", ".join(
+            f"{field} {base[field]:.3g} -> {record[field]:.3g}"
+            + (
+                f" ({(record[field] / base[field] - 1) * 100:+.1f}%)"
+                if base[field]
+                else ""
+            )
+            for field in fields
+        )
+        print(f"{scenario:>5}: {changes}")
+
+
+async def main(args: argparse.Namespace) -> None:
+    server = StubServer(
+        latency=args.latency,
+        latency_distribution=args.latency_distribution,
+        rate_limit_rate=args.rate_limit_rate,
+        server_error_rate=args.server_error_rate,
+        retry_after=args.retry_after,
+        completion_tokens=args.completion_tokens,
+        seed=0,
+    )
+    await server.start()
+
+    commit = _git_commit()
+    run_tasks_kwargs = {
+        "max_concurrent_requests": args.concurrency,
+        "pack_size": args.pack_size,
+    }
+    context = multiprocessing.get_context("spawn")
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    for scenario in args.scenarios:
+        server.num_requests = server.num_rate_limited = server.num_server_errors = 0
+        result_queue = context.Queue()
+        process = context.Process(
+            target=_run_scenario,
+            args=(server.base_url, SCENARIOS[scenario], run_tasks_kwargs, result_queue),
+        )
+        process.start()
+        # The server keeps serving on this event loop while the scenario runs
+        measurements = await asyncio.to_thread(result_queue.get)
+        await asyncio.to_thread(process.join)
+
+        record = {
+            "commit": commit,
+            "recorded_at": datetime.now().isoformat(),
+            "scenario": scenario,
+            "server": {
+                "latency": args.latency,
+                "latency_distribution": args.latency_distribution,
+                "rate_limit_rate": args.rate_limit_rate,
+                "server_error_rate": args.server_error_rate,
+            },
+            "run_tasks": run_tasks_kwargs,
+            "num_requests": server.num_requests,
+            "num_rate_limited": server.num_rate_limited,
+            "num_server_errors": server.num_server_errors,
+            **measurements,
+        }
+        with open(args.output, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        print(
+            f"{scenario:>5}: {record['tasks_per_sec']:8.1f} tasks/s, "
+            f"p50/p99 {record['latency_p50'] * 1000:.1f}/{record['latency_p99'] * 1000:.1f} ms, "
+            f"peak RSS {record['peak_rss_mb']:.0f} MB, "
+            f"{record['files_written']} files ({record['bytes_written'] / 1e6:.1f} MB), "
+            f"loop lag p99/max {record['loop_lag_p99_ms']:.1f}/{record['loop_lag_max_ms']:.1f} ms, "
+            f"{record['num_task_retries']} retries"
+        )
+
+    await server.close()
+    if args.compare:
+        _compare(args.output, args.compare, commit)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Drive BaseAgent.run_tasks against a local stub OpenAI server."
+    )
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=["1k", "10k"]
+    )
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--pack-size", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds")
+    parser.add_argument(
+        "--latency-distribution",
+        choices=["constant", "exponential", "lognormal"],
+        default="lognormal",
+    )
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--server-error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Seconds")
+    parser.add_argument("--completion-tokens", type=int, default=None)
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("data") / "benchmarks" / "run_tasks.jsonl",
+        help="Results are appended here, one line per scenario, tagged with the git commit",
+    )
+    parser.add_argument(
+        "--compare", metavar="COMMIT", help="Compare this run with an earlier commit"
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,42 @@
+import argparse
+import importlib
+from pathlib import Path
+
+from src.agent import compare_orders
+
+
+def _load_agent_class(path: str):
+    # "scripts.invoke.open_coding:OpenCodingAgent"
+    module_name, class_name = path.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay the recorded task latencies of an agent under each dispatch order."
+    )
+    parser.add_argument(
+        "agent_class", help="module:Class, e.g. scripts.invoke.open_coding:OpenCodingAgent"
+    )
+    parser.add_argument("agent_id")
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[64], help="Simulated workers"
+    )
+    parser.add_argument("--data-dir", type=Path, default=Path("data"))
+    parser.add_argument("--logs-dir", type=Path, default=Path("logs"))
+    args = parser.parse_args()
+
+    agent = _load_agent_class(args.agent_class)(
+        agent_id=args.agent_id, data_dir=args.data_dir, logs_dir=args.logs_dir
+    )
+    try:
+        for concurrency in args.concurrency:
+            for result in compare_orders(agent, concurrency):
+                print(
+                    f"{result.order:>13} x{concurrency}: {result.num_tasks} tasks, "
+                    f"makespan {result.makespan_secs:.1f}s, tail {result.tail_secs:.1f}s, "
+                    f"mean completion {result.mean_completion_secs:.1f}s, "
+                    f"utilization {result.utilization:.1%}"
+                )
+    finally:
+        agent.close()
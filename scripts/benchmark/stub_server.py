@@ -0,0 +1,202 @@
+import asyncio
+import json
+import random
+import time
+from typing import Callable, Literal, Optional, Union
+
+
+class StubServer:
+    """Minimal OpenAI-compatible `/v1/chat/completions` server for local benchmarks.
+
+    Speaks HTTP/1.1 with keep-alive so client-side connection reuse is observable
+    through `num_connections`. Response latency is `latency` seconds (the median for
+    "lognormal", the mean for "exponential"), and a `rate_limit_rate` / `server_error_rate`
+    fraction of requests is answered with 429 (with Retry-After) or 500 instead.
+    `reply` is the completion text, or a function mapping the last message to it.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        latency_distribution: Literal[
+            "constant", "exponential", "lognormal"
+        ] = "constant",
+        latency_sigma: float = 0.5,
+        rate_limit_rate: float = 0.0,
+        server_error_rate: float = 0.0,
+        retry_after: float = 1.0,
+        completion_tokens: Optional[int] = None,
+        reply: Union[str, Callable[[str], str]] = '{"labels": ["Stub label"]}',
+        seed: Optional[int] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.latency_distribution = latency_distribution
+        self.latency_sigma = latency_sigma
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.retry_after = retry_after
+        self.completion_tokens = completion_tokens
+        self.reply = reply
+        self.num_connections = 0
+        self.num_requests = 0
+        self.num_rate_limited = 0
+        self.num_server_errors = 0
+        self._random = random.Random(seed)
+        self._server: Optional[asyncio.Server] = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Drop idle keep-alive connections, otherwise wait_closed blocks on them
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.num_connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                self.num_requests += 1
+                if latency := self._sample_latency():
+                    await asyncio.sleep(latency)
+                status, extra_headers, payload = self._respond(
+                    request_line.decode("latin-1"), body
+                )
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"{extra_headers}"
+                    "\r\n".encode("latin-1")
+                    + payload
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def _sample_latency(self) -> float:
+        if not self.latency or self.latency_distribution == "constant":
+            return self.latency
+        if self.latency_distribution == "exponential":
+            return self._random.expovariate(1 / self.latency)
+        return self._random.lognormvariate(0, self.latency_sigma) * self.latency
+
+    def _respond(self, request_line: str, body: bytes) -> tuple[str, str, bytes]:
+        # Returns the status line, extra header lines and body
+        if "/chat/completions" not in request_line:
+            return "404 Not Found", "", b'{"error": {"message": "not found"}}'
+        draw = self._random.random()
+        if draw < self.rate_limit_rate:
+            self.num_rate_limited += 1
+            return (
+                "429 Too Many Requests",
+                f"Retry-After-Ms: {int(self.retry_after * 1000)}\r\n",
+                b'{"error": {"message": "Rate limit reached", "type": "requests", '
+                b'"code": "rate_limit_exceeded"}}',
+            )
+        if draw < self.rate_limit_rate + self.server_error_rate:
+            self.num_server_errors += 1
+            return (
+                "500 Internal Server Error",
+                "",
+                b'{"error": {"message": "Stub server error", "type": "server_error"}}',
+            )
+
+        request = json.loads(body or b"{}")
+        messages = request.get("messages", [])
+        prompt_tokens = sum(
+            len(str(message.get("content", ""))) // 4 for message in messages
+        )
+        reply = (
+            self.reply(str(messages[-1].get("content", "")) if messages else "")
+            if callable(self.reply)
+            else self.reply
+        )
+        completion_tokens = (
+            self.completion_tokens
+            if self.completion_tokens is not None
+            else len(reply) // 4
+        )
+        payload = {
+            "id": f"chatcmpl-stub-{self.num_requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+        return "200 OK", "", json.dumps(payload).encode()
+
+
+async def _serve_forever(**kwargs) -> None:
+    server = StubServer(**kwargs)
+    await server.start()
+    print(f"Stub server listening on {server.base_url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument(
+        "--latency-distribution",
+        choices=["constant", "exponential", "lognormal"],
+        default="constant",
+    )
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--server-error-rate", type=float, default=0.0)
+    parser.add_argument("--completion-tokens", type=int, default=None)
+    args = parser.parse_args()
+    asyncio.run(
+        _serve_forever(
+            port=args.port,
+            latency=args.latency,
+            latency_distribution=args.latency_distribution,
+            rate_limit_rate=args.rate_limit_rate,
+            server_error_rate=args.server_error_rate,
+            completion_tokens=args.completion_tokens,
+        )
+    )
@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+from pathlib import Path
+
+from run_tasks import BenchmarkAgent, _write_inputs
+from stub_server import StubServer
+from src.agent import AgentType, TaskStatus, WorkerConfig, run_worker
+
+
+async def _create_agent(data_dir: Path, logs_dir: Path, num_tasks: int) -> str:
+    inputs_path = data_dir.parent / "inputs.jsonl"
+    _write_inputs(inputs_path, num_tasks)
+    agent = BenchmarkAgent(
+        agent_type=AgentType.OPEN_CODING, data_dir=data_dir, logs_dir=logs_dir
+    )
+    await agent.create_tasks_from_inputs(inputs_path)
+    agent.close()
+    return agent.config.agent_id
+
+
+def _worker_main(
+    agent_id: str, worker: WorkerConfig, agent_kwargs: dict, index: int, lease_secs: float
+) -> None:
+    run_worker(
+        BenchmarkAgent,
+        agent_id,
+        worker,
+        agent_kwargs,
+        index,
+        lease_secs=lease_secs,
+        claim_poll_interval=0.5,
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    server = StubServer(latency=args.latency, latency_distribution="lognormal", seed=0)
+    await server.start()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir, logs_dir = Path(tmp_dir) / "data", Path(tmp_dir) / "logs"
+        agent_id = await _create_agent(data_dir, logs_dir, args.tasks)
+        agent_kwargs = {
+            "agent_type": AgentType.OPEN_CODING,
+            "data_dir": data_dir,
+            "logs_dir": logs_dir,
+        }
+
+        context = multiprocessing.get_context("spawn")
+        processes = [
+            context.Process(
+                target=_worker_main,
+                args=(
+                    agent_id,
+                    WorkerConfig(
+                        worker_id=f"worker-{index}",
+                        api_key=f"stub-key-{index}",
+                        base_url=server.base_url,
+                        max_concurrent_requests=args.concurrency,
+                    ),
+                    agent_kwargs,
+                    index,
+                    args.lease_secs,
+                ),
+            )
+            for index in range(args.workers)
+        ]
+        started_at = time.perf_counter()
+        for process in processes:
+            process.start()
+        if args.kill_after is not None:
+            # Simulate a crashed worker: its leased tasks must lapse and be reclaimed
+            await asyncio.sleep(args.kill_after)
+            os.kill(processes[0].pid, signal.SIGKILL)
+            print(f"Killed worker-0 after {args.kill_after}s")
+        for process in processes:
+            await asyncio.to_thread(process.join)
+        elapsed = time.perf_counter() - started_at
+
+        agent = BenchmarkAgent(agent_id=agent_id, **agent_kwargs)
+        task_counts = agent.refresh_progress()
+        agent.close()
+
+    await server.close()
+    num_completed = task_counts[TaskStatus.COMPLETED.name]
+    print(
+        f"{args.workers} workers: {num_completed}/{args.tasks} tasks completed in "
+        f"{elapsed:.1f}s ({num_completed / elapsed:.1f} tasks/s), "
+        f"{server.num_requests} requests; task counts {task_counts}"
+    )
+    if num_completed != args.tasks:
+        raise SystemExit("Not every task was completed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run several local worker processes on one agent against the stub server."
+    )
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16, help="Per worker")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds")
+    parser.add_argument("--lease-secs", type=float, default=5.0)
+    parser.add_argument(
+        "--kill-after",
+        type=float,
+        default=None,
+        help="SIGKILL the first worker after this many seconds",
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -1,17 +1,33 @@
 from pathlib import Path
+import argparse
 import json
 
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--changed-only",
+        action="store_true",
+        help="Only clusters listed in open_coding_clustered.changed.json "
+        "(written by open-coding-cluster.py --incremental)",
+    )
+    args = parser.parse_args()
+
     with open("prompts/03-axial_coding.md", "r") as f:
         prompt = f.read()
 
     with open("data/coding_results/open_coding_clustered.json", "r") as f:
         open_coding_results = json.load(f)
 
+    changed = None
+    if args.changed_only:
+        with open("data/coding_results/open_coding_clustered.changed.json", "r") as f:
+            changed = {str(cluster) for cluster in json.load(f)}
+
     input_texts = []
     for k, v in open_coding_results.items():
         if k == "-1": continue
+        if changed is not None and k not in changed: continue
         input_text = prompt.format(
             cluster_label=k,
             subcategories=json.dumps(v, indent=4)
@@ -1,5 +1,6 @@
 from pathlib import Path
 import json
+from src.agent import InputWriter
 
 
 def main():
@@ -7,30 +8,36 @@ def main():
         prompt = f.read()
 
     data_dir = Path("data") / "raw" / "20251230"
-    post_files = data_dir.glob("POST_*.json")
+    post_files = sorted(data_dir.glob("POST_*.json"))
 
-    input_texts = []
+    # Compact format: the prompt and each post are stored once, each comment
+    # references them and is rendered only when its task is dispatched
+    with InputWriter(Path("data") / "input_texts" / "open_coding.jsonl") as writer:
+        template_id = writer.add_template(prompt)
 
-    for post_file in post_files:
-        with open(post_file, "r") as f:
-            data = json.load(f)
+        for post_file in post_files:
+            with open(post_file, "r") as f:
+                data = json.load(f)
 
             post_info = data["post_info"]
-            subreddit = post_info["subreddit"]
-            comments = data["comments"]
-
-            for comment in comments:
-                input_text = prompt.format(
-                    subreddit=subreddit,
-                    post_title=post_info["title"],
-                    post_content=post_info["content"],
-                    content=comment["content"],
+            context_id = writer.add_context(
+                post_file.stem,
+                {
+                    "subreddit": post_info["subreddit"],
+                    "post_title": post_info["title"],
+                    "post_content": post_info["content"],
+                },
+            )
+
+            for index, comment in enumerate(data["comments"]):
+                writer.add_item(
+                    f"{post_file.stem}:{index}",
+                    template_id,
+                    context_id,
+                    {"content": comment["content"]},
                 )
-                input_texts.append(input_text)
 
-    Path("data/input_texts").mkdir(parents=True, exist_ok=True)
-    with open(Path("data") / "input_texts" / "open_coding.json", "w") as f:
-        json.dump(input_texts, f, indent=4)
+    print(f"{writer.num_items} input items written to {writer.path}")
 
 
 if __name__ == "__main__":
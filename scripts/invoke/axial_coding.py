@@ -1,12 +1,16 @@
+import argparse
 import asyncio
 import json
 from pathlib import Path
 from typing import Optional
-from langchain_openai import ChatOpenAI
-from src.agent import AgentType, BaseAgent
+from src.agent import AgentType, AxialCodingOutput, BaseAgent
+from src.mapreduce import load_centroids, run_axial_coding
 
 
 class AxialCodingAgent(BaseAgent):
+    model = "gpt-4o"
+    output_schema = AxialCodingOutput
+
     def __init__(
         self,
         agent_id: Optional[str] = None,
@@ -20,22 +24,75 @@ class AxialCodingAgent(BaseAgent):
             data_dir=data_dir,
         )
 
-    def get_llm(self) -> ChatOpenAI:
-        return ChatOpenAI(model="gpt-4o")
+
+def map_reduce(args: argparse.Namespace) -> None:
+    # Reads the clusters directly: the calls are planned here, not by the input generator
+    with open("prompts/03-axial_coding.md", "r") as f:
+        prompt = f.read()
+    with open("prompts/03-axial_coding_reduce.md", "r") as f:
+        reduce_prompt = f.read()
+    with open(Path("data") / "coding_results" / "open_coding_clustered.json", "r") as f:
+        clusters = {k: v for k, v in json.load(f).items() if k != "-1"}
+    if args.changed_only:
+        changed_path = Path("data") / "coding_results" / "open_coding_clustered.changed.json"
+        with open(changed_path, "r") as f:
+            changed = {str(cluster) for cluster in json.load(f)}
+        clusters = {k: v for k, v in clusters.items() if k in changed}
+
+    with AxialCodingAgent(agent_id=args.agent_id) as agent:
+        print(agent.config.agent_id)
+
+        records = asyncio.run(
+            run_axial_coding(
+                agent,
+                clusters,
+                prompt,
+                reduce_prompt,
+                args.max_prompt_tokens,
+                centroids=load_centroids(
+                    Path("data") / "coding_results" / "open_coding_clusters"
+                ),
+            )
+        )
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"{len(records)} records written to {args.output}")
 
 
 if __name__ == "__main__":
-    with open(Path("data") / "input_texts" / "axial_coding.json", "r") as f:
-        input_texts = json.load(f)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--map-reduce",
+        action="store_true",
+        help="Plan token-budgeted calls from open_coding_clustered.json: split "
+        "oversized clusters and merge their parts, pack small clusters",
+    )
+    parser.add_argument("--agent-id", default=None, help="Resume this agent")
+    parser.add_argument("--max-prompt-tokens", type=int, default=8000)
+    parser.add_argument("--changed-only", action="store_true")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("data") / "coding_results" / "axial_coding.jsonl",
+    )
+    args = parser.parse_args()
+
+    if args.map_reduce:
+        map_reduce(args)
+    else:
+        with open(Path("data") / "input_texts" / "axial_coding.json", "r") as f:
+            input_texts = json.load(f)
 
-    # input_texts = input_texts[:2]
+        # input_texts = input_texts[:2]
 
-    agent = AxialCodingAgent()
-    print(agent.config.agent_id)
+        with AxialCodingAgent() as agent:
+            print(agent.config.agent_id)
 
-    tasks_created_result = asyncio.run(agent.create_tasks(input_texts))
-    print(tasks_created_result)
+            tasks_created_result = asyncio.run(agent.create_tasks(input_texts))
+            print(tasks_created_result)
 
-    tasks_running_result = asyncio.run(agent.run_tasks())
-    print(tasks_running_result)
+            tasks_running_result = asyncio.run(agent.run_tasks())
+            print(tasks_running_result)
 
@@ -1,12 +1,38 @@
+import argparse
 import asyncio
-import json
 from pathlib import Path
 from typing import Optional
-from langchain_openai import ChatOpenAI
-from src.agent import AgentType, BaseAgent
+from src.agent import (
+    AgentType,
+    BaseAgent,
+    Deduplicator,
+    ModelTier,
+    OpenCodingOutput,
+    RoutingPolicy,
+    TaskOrder,
+    TasksRunningResult,
+)
+from src.pipeline import PipelineManifest
+from src.saturation import SaturationConfig, SaturationMonitor
+
+# Opt-in with --route: short comments on a cheaper model, escalated when their
+# responses fail validation
+OPEN_CODING_ROUTING = RoutingPolicy(
+    tiers=[
+        ModelTier(model="gpt-4.1-nano", max_input_tokens=1500),
+        ModelTier(model="gpt-4o-mini"),
+        ModelTier(model="gpt-4o"),
+    ]
+)
 
 
 class OpenCodingAgent(BaseAgent):
+    model = "gpt-4o-mini"
+    output_schema = OpenCodingOutput
+    # The prompt shows the post: exact duplicates share labels across posts, near
+    # duplicates (e.g. a reply quoting a comment) only within one
+    dedup_across_contexts = False
+
     def __init__(
         self,
         agent_id: Optional[str] = None,
@@ -20,24 +46,87 @@ class OpenCodingAgent(BaseAgent):
             data_dir=data_dir,
         )
 
-    def get_llm(self) -> ChatOpenAI:
-        return ChatOpenAI(model="gpt-4o-mini")
+
+async def run_until_saturated(
+    agent: BaseAgent, config: SaturationConfig, **run_tasks_kwargs
+) -> TasksRunningResult:
+    monitor = SaturationMonitor(agent, config)
+    await monitor.start()
+    try:
+        return await agent.run_tasks(
+            on_task_completed=monitor.observe,
+            skip_task=monitor.skip_task,
+            **run_tasks_kwargs,
+        )
+    finally:
+        report = await monitor.close()
+        print(
+            f"Saturated after {report.saturated_at} comments"
+            if report.saturated_at is not None
+            else "Not saturated"
+        )
 
 
 if __name__ == "__main__":
-    with open(Path("data") / "input_texts" / "open_coding.json", "r") as f:
-        input_texts = json.load(f)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--stop-at-saturation",
+        action="store_true",
+        help="Stop once new comments stop producing new concepts",
+    )
+    parser.add_argument("--min-discovery-rate", type=float, default=0.02)
+    parser.add_argument(
+        "--saturation-sample",
+        type=float,
+        default=0.0,
+        help="Fraction of the remaining comments still coded after saturation",
+    )
+    parser.add_argument(
+        "--longest-first",
+        action="store_true",
+        help="Dispatch the comments with the longest prompts first",
+    )
+    parser.add_argument(
+        "--route",
+        action="store_true",
+        help="Route comments across model tiers by length (OPEN_CODING_ROUTING)",
+    )
+    agent_ids = parser.add_mutually_exclusive_group()
+    agent_ids.add_argument("--agent-id", default=None, help="Resume this agent")
+    agent_ids.add_argument(
+        "--pipeline-id", help="Resume the open_coding agent of this pipeline"
+    )
+    args = parser.parse_args()
 
-    # input_texts = input_texts[:100]
+    agent_id = args.agent_id
+    if args.pipeline_id is not None:
+        agent_id = PipelineManifest.load(args.pipeline_id).stage_agent_id("open_coding")
 
-    agent = OpenCodingAgent(
-        agent_id='c9a5d150-345f-4573-a105-b3039ba91e75'
-    )
-    print(agent.config.agent_id)
+    inputs_path = Path("data") / "input_texts" / "open_coding.jsonl"
+
+    with OpenCodingAgent(agent_id=agent_id) as agent:
+        print(agent.config.agent_id)
+        if args.route:
+            agent.routing = OPEN_CODING_ROUTING
+        order = TaskOrder.LONGEST_FIRST if args.longest_first else TaskOrder.CREATED
 
-    # tasks_created_result = asyncio.run(agent.create_tasks(input_texts))
-    # print(tasks_created_result)
+        # tasks_created_result = asyncio.run(
+        #     agent.create_tasks_from_inputs(inputs_path, Deduplicator())
+        # )
+        # print(tasks_created_result)
 
-    tasks_running_result = asyncio.run(agent.run_tasks())
-    print(tasks_running_result)
+        if args.stop_at_saturation:
+            tasks_running_result = asyncio.run(
+                run_until_saturated(
+                    agent,
+                    SaturationConfig(
+                        min_discovery_rate=args.min_discovery_rate,
+                        sample_fraction=args.saturation_sample,
+                    ),
+                    order=order,
+                )
+            )
+        else:
+            tasks_running_result = asyncio.run(agent.run_tasks(order=order))
+        print(tasks_running_result)
 
@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import uuid
+from pathlib import Path
+
+from src.agent import Deduplicator
+from src.clustering import ClusteringConfig
+from src.mapreduce import AxialCodingStage
+from src.pipeline import (
+    AgentStage,
+    ClusteringStage,
+    Pipeline,
+    StageConfig,
+    relevant_comments_handoff,
+)
+from src.saturation import SaturationConfig, SaturationMonitor
+from scripts.invoke.axial_coding import AxialCodingAgent
+from scripts.invoke.open_coding import OpenCodingAgent
+from scripts.invoke.related import RelatedAgent
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Related -> open coding -> clustering -> axial coding, with streaming handoff."
+    )
+    parser.add_argument(
+        "--pipeline-id", help="Resume this pipeline (default: start a new one)"
+    )
+    parser.add_argument(
+        "--inputs",
+        type=Path,
+        default=Path("data") / "input_texts" / "related.jsonl",
+        help="Written by scripts/generate_input_texts/related.py",
+    )
+    parser.add_argument("--related-concurrency", type=int, default=32)
+    parser.add_argument("--open-coding-concurrency", type=int, default=32)
+    parser.add_argument("--axial-coding-concurrency", type=int, default=8)
+    parser.add_argument("--related-rpm", type=float, default=None)
+    parser.add_argument("--open-coding-rpm", type=float, default=None)
+    parser.add_argument("--axial-coding-rpm", type=float, default=None)
+    parser.add_argument(
+        "--min-labels",
+        type=int,
+        default=2000,
+        help="Unique labels before clustering starts",
+    )
+    parser.add_argument(
+        "--update-every",
+        type=int,
+        default=2000,
+        help="New labels between incremental cluster updates",
+    )
+    parser.add_argument(
+        "--min-cluster-sizes", type=int, nargs="+", default=[10, 20, 40, 80]
+    )
+    parser.add_argument(
+        "--max-prompt-tokens",
+        type=int,
+        default=8000,
+        help="Axial coding prompt budget: larger clusters are split, smaller ones packed",
+    )
+    parser.add_argument(
+        "--stop-at-saturation",
+        action="store_true",
+        help="Stop open coding once new comments stop producing new concepts",
+    )
+    parser.add_argument("--min-discovery-rate", type=float, default=0.02)
+    parser.add_argument(
+        "--saturation-sample",
+        type=float,
+        default=0.0,
+        help="Fraction of the remaining comments still coded after saturation",
+    )
+    parser.add_argument(
+        "--prefilter",
+        type=Path,
+        default=None,
+        help="Relevance pre-filter trained by scripts/analyst/related-prefilter.py",
+    )
+    args = parser.parse_args()
+
+    prefilter = None
+    if args.prefilter is not None:
+        # Imported here: loads scikit-learn and sentence-transformers
+        from src.relevance import RelevanceClassifier, prefilter_tasks
+
+        classifier = RelevanceClassifier.load(args.prefilter)
+
+        def prefilter(agent, emit):
+            return prefilter_tasks(agent, classifier, on_resolved=emit)
+
+    saturation = None
+    if args.stop_at_saturation:
+        saturation_config = SaturationConfig(
+            min_discovery_rate=args.min_discovery_rate,
+            sample_fraction=args.saturation_sample,
+        )
+
+        def saturation(agent):
+            return SaturationMonitor(agent, saturation_config)
+
+    with open("prompts/02-open_coding.md", "r") as f:
+        open_coding_prompt = f.read()
+    with open("prompts/03-axial_coding.md", "r") as f:
+        axial_coding_prompt = f.read()
+    with open("prompts/03-axial_coding_reduce.md", "r") as f:
+        axial_coding_reduce_prompt = f.read()
+
+    related = AgentStage(
+        "related",
+        RelatedAgent,
+        StageConfig(
+            max_concurrent_requests=args.related_concurrency,
+            requests_per_minute=args.related_rpm,
+        ),
+        inputs_path=args.inputs,
+        deduplicator=Deduplicator,
+        prefilter=prefilter,
+    )
+    open_coding = AgentStage(
+        "open_coding",
+        OpenCodingAgent,
+        StageConfig(
+            max_concurrent_requests=args.open_coding_concurrency,
+            requests_per_minute=args.open_coding_rpm,
+        ),
+        upstream="related",
+        handoff=relevant_comments_handoff(related, open_coding_prompt),
+        saturation=saturation,
+    )
+    clusters_dir = Path("data") / "coding_results" / "open_coding_clusters"
+    clustering = ClusteringStage(
+        "clustering",
+        upstream="open_coding",
+        model_dir=clusters_dir,
+        output_path=Path("data") / "coding_results" / "open_coding_clustered.json",
+        embeddings_dir=Path("data") / "embeddings",
+        config=ClusteringConfig(min_cluster_sizes=args.min_cluster_sizes),
+        min_labels=args.min_labels,
+        update_every=args.update_every,
+    )
+    axial_coding = AxialCodingStage(
+        "axial_coding",
+        AxialCodingAgent,
+        axial_coding_prompt,
+        axial_coding_reduce_prompt,
+        output_path=Path("data") / "coding_results" / "axial_coding.jsonl",
+        upstream="clustering",
+        config=StageConfig(
+            max_concurrent_requests=args.axial_coding_concurrency,
+            requests_per_minute=args.axial_coding_rpm,
+        ),
+        max_prompt_tokens=args.max_prompt_tokens,
+        model_dir=clusters_dir,
+    )
+
+    pipeline = Pipeline(
+        args.pipeline_id or str(uuid.uuid4()),
+        [related, open_coding, clustering, axial_coding],
+    )
+    print(f"Pipeline {pipeline.pipeline_id} ({pipeline.manifest_path})")
+    manifest = asyncio.run(pipeline.run())
+    for stage, agent_id in manifest.agent_ids.items():
+        print(f"{stage}: agent {agent_id}")
+
+
+if __name__ == "__main__":
+    main()
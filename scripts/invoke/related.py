@@ -1,12 +1,17 @@
+import argparse
 import asyncio
-import json
 from pathlib import Path
 from typing import Optional
-from langchain_openai import ChatOpenAI
-from src.agent import AgentType, BaseAgent
+from src.agent import AgentType, BaseAgent, Deduplicator, RelatedOutput
 
 
 class RelatedAgent(BaseAgent):
+    model = "gpt-4o-mini"
+    output_schema = RelatedOutput
+    # Relevance depends on the post: exact duplicates (copypasta, bot messages) share
+    # a result across posts, near duplicates only within one
+    dedup_across_contexts = False
+
     def __init__(
         self,
         agent_id: Optional[str] = None,
@@ -20,22 +25,36 @@ class RelatedAgent(BaseAgent):
             data_dir=data_dir,
         )
 
-    def get_llm(self) -> ChatOpenAI:
-        return ChatOpenAI(model="gpt-4o-mini")
-
 
 if __name__ == "__main__":
-    with open(Path("data") / "input_texts" / "related.json", "r") as f:
-        input_texts = json.load(f)
-
-    # input_texts = input_texts[:2]
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--prefilter",
+        type=Path,
+        default=None,
+        help="Relevance pre-filter trained by scripts/analyst/related-prefilter.py",
+    )
+    args = parser.parse_args()
+
+    inputs_path = Path("data") / "input_texts" / "related.jsonl"
+
+    with RelatedAgent() as agent:
+        print(agent.config.agent_id)
+
+        tasks_created_result = asyncio.run(
+            agent.create_tasks_from_inputs(inputs_path, Deduplicator())
+        )
+        print(tasks_created_result)
 
-    agent = RelatedAgent()
-    print(agent.config.agent_id)
+        if args.prefilter is not None:
+            # Imported here: loads scikit-learn and sentence-transformers
+            from src.relevance import RelevanceClassifier, prefilter_tasks
 
-    tasks_created_result = asyncio.run(agent.create_tasks(input_texts))
-    print(tasks_created_result)
+            prefilter_result = asyncio.run(
+                prefilter_tasks(agent, RelevanceClassifier.load(args.prefilter))
+            )
+            print(prefilter_result)
 
-    tasks_running_result = asyncio.run(agent.run_tasks())
-    print(tasks_running_result)
+        tasks_running_result = asyncio.run(agent.run_tasks())
+        print(tasks_running_result)
 
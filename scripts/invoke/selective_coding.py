@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import json
+from pathlib import Path
+from typing import Optional
+from src.agent import (
+    AgentType,
+    BaseAgent,
+    CategoryConsolidationOutput,
+    SelectiveCodingOutput,
+)
+from src.mapreduce import run_selective_coding
+
+
+class SelectiveCodingAgent(BaseAgent):
+    model = "gpt-4o"
+    output_schema = SelectiveCodingOutput
+
+    def __init__(
+        self,
+        agent_id: Optional[str] = None,
+        logs_dir: Optional[Path] = Path("logs"),
+        data_dir: Optional[Path] = Path("data"),
+    ) -> None:
+        super().__init__(
+            agent_id=agent_id,
+            agent_type=AgentType.SELECTIVE_CODING,
+            logs_dir=logs_dir,
+            data_dir=data_dir,
+        )
+
+
+class CategoryConsolidationAgent(BaseAgent):
+    # Merges main categories (without subcategories) that exceed one selective
+    # coding prompt
+    model = "gpt-4o"
+    output_schema = CategoryConsolidationOutput
+
+    def __init__(
+        self,
+        agent_id: Optional[str] = None,
+        logs_dir: Optional[Path] = Path("logs"),
+        data_dir: Optional[Path] = Path("data"),
+    ) -> None:
+        super().__init__(
+            agent_id=agent_id,
+            agent_type=AgentType.SELECTIVE_CODING,
+            logs_dir=logs_dir,
+            data_dir=data_dir,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agent-id", default=None, help="Resume this agent")
+    parser.add_argument(
+        "--reduce-agent-id",
+        default=None,
+        help="Resume the agent that consolidates categories",
+    )
+    parser.add_argument(
+        "--input",
+        type=Path,
+        default=Path("data") / "coding_results" / "axial_coding.jsonl",
+        help="Written by scripts/invoke/axial_coding.py --map-reduce",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("data") / "coding_results" / "selective_coding.json",
+    )
+    parser.add_argument("--max-prompt-tokens", type=int, default=8000)
+    args = parser.parse_args()
+
+    with open("prompts/04-selective_coding_reduce.md", "r") as f:
+        reduce_prompt = f.read()
+    with open("prompts/04-selective_coding.md", "r") as f:
+        selective_prompt = f.read()
+    with open(args.input, "r") as f:
+        categories = [
+            category
+            for line in f
+            if line.strip()
+            for category in json.loads(line)["main_categories"]
+        ]
+
+    with (
+        CategoryConsolidationAgent(agent_id=args.reduce_agent_id) as reduce_agent,
+        SelectiveCodingAgent(agent_id=args.agent_id) as agent,
+    ):
+        print(f"reduce: {reduce_agent.config.agent_id}, selective: {agent.config.agent_id}")
+
+        output = asyncio.run(
+            run_selective_coding(
+                reduce_agent,
+                agent,
+                categories,
+                reduce_prompt,
+                selective_prompt,
+                args.max_prompt_tokens,
+            )
+        )
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=4, ensure_ascii=False)
+        print(f"Core category: {output['core_category']['name']}")
@@ -0,0 +1,71 @@
+import argparse
+import importlib
+from pathlib import Path
+
+from src.agent import TaskOrder, WorkerConfig, run_worker, run_workers
+
+
+def _load_agent_class(path: str):
+    # "scripts.invoke.open_coding:OpenCodingAgent"
+    module_name, class_name = path.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run workers that lease and execute the pending tasks of an agent."
+    )
+    parser.add_argument(
+        "agent_class", help="module:Class, e.g. scripts.invoke.open_coding:OpenCodingAgent"
+    )
+    parser.add_argument("agent_id")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument(
+        "--data-dir", type=Path, default=Path("data"), help="Shared by all workers"
+    )
+    parser.add_argument("--logs-dir", type=Path, default=Path("logs"))
+    parser.add_argument("--api-key", help="Defaults to OPENAI_API_KEY")
+    parser.add_argument("--base-url", help="Defaults to OPENAI_BASE_URL")
+    parser.add_argument("--concurrency", type=int, default=64, help="Per process")
+    parser.add_argument("--rpm", type=float, default=None, help="Per process")
+    parser.add_argument("--tpm", type=float, default=None, help="Per process")
+    parser.add_argument("--lease-secs", type=float, default=300.0)
+    parser.add_argument(
+        "--longest-first",
+        action="store_true",
+        help="Claim the tasks with the longest prompts first",
+    )
+    args = parser.parse_args()
+
+    agent_class = _load_agent_class(args.agent_class)
+    worker = WorkerConfig(
+        api_key=args.api_key,
+        base_url=args.base_url,
+        max_concurrent_requests=args.concurrency,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+    )
+    agent_kwargs = {"data_dir": args.data_dir, "logs_dir": args.logs_dir}
+    order = TaskOrder.LONGEST_FIRST if args.longest_first else TaskOrder.CREATED
+    if args.processes == 1:
+        results = [
+            run_worker(
+                agent_class,
+                args.agent_id,
+                worker,
+                agent_kwargs,
+                lease_secs=args.lease_secs,
+                order=order,
+            )
+        ]
+    else:
+        results = run_workers(
+            agent_class,
+            args.agent_id,
+            [worker] * args.processes,
+            agent_kwargs,
+            lease_secs=args.lease_secs,
+            order=order,
+        )
+    for result in results:
+        print(result)
@@ -0,0 +1,41 @@
+import argparse
+import json
+from collections import Counter
+from pathlib import Path
+from src.agent import read_logs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Filter an agent's logs/<agent_id>.jsonl, e.g. all failures of one error class."
+    )
+    parser.add_argument("agent_id")
+    parser.add_argument("--logs-dir", type=Path, default=Path("logs"))
+    parser.add_argument("--event", help="e.g. task_failed, task_retry_scheduled")
+    parser.add_argument("--level", choices=["info", "warning", "error"])
+    parser.add_argument("--error-class", help="e.g. RateLimitError")
+    parser.add_argument("--task-id")
+    parser.add_argument(
+        "--count-by",
+        help="Print record counts per value of this field instead of the records",
+    )
+    args = parser.parse_args()
+
+    records = read_logs(
+        args.logs_dir / f"{args.agent_id}.jsonl",
+        event=args.event,
+        level=args.level,
+        error_class=args.error_class,
+        task_id=args.task_id,
+    )
+    if args.count_by:
+        counts = Counter(record.get(args.count_by) for record in records)
+        for value, count in counts.most_common():
+            print(f"{count}\t{value}")
+        return
+    for record in records:
+        print(json.dumps(record, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
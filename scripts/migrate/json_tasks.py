@@ -0,0 +1,59 @@
+import argparse
+from pathlib import Path
+from src.agent import AgentConfig, SQLiteTaskStore, import_json_tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import legacy data/tasks/<task_id>.json files into per-agent task stores."
+    )
+    parser.add_argument("agent_ids", nargs="*", help="Agents to migrate (default: all)")
+    parser.add_argument("--data-dir", type=Path, default=Path("data"))
+    parser.add_argument(
+        "--tasks-dir",
+        type=Path,
+        default=None,
+        help="Directory holding the task files (default: <data-dir>/tasks)",
+    )
+    parser.add_argument(
+        "--all-files",
+        action="store_true",
+        help="Import every task file in --tasks-dir into the single given agent",
+    )
+    args = parser.parse_args()
+
+    tasks_dir = args.tasks_dir or args.data_dir / "tasks"
+
+    if args.all_files:
+        if len(args.agent_ids) != 1:
+            parser.error("--all-files requires exactly one agent ID")
+        store = SQLiteTaskStore(args.data_dir / "tasks" / f"{args.agent_ids[0]}.db")
+        print(f"{args.agent_ids[0]}: {import_json_tasks(store, tasks_dir)} tasks")
+        store.close()
+        return
+
+    agent_ids = args.agent_ids or [
+        path.stem for path in sorted((args.data_dir / "agents").glob("*.json"))
+    ]
+    for agent_id in agent_ids:
+        with open(args.data_dir / "agents" / f"{agent_id}.json", "r") as f:
+            config = AgentConfig.model_validate_json(f.read())
+        if not config.task_ids:
+            continue
+
+        store = SQLiteTaskStore(args.data_dir / "tasks" / f"{agent_id}.db")
+        if store.count():
+            print(f"{agent_id}: task store already populated, skipping")
+        else:
+            unreadable_files: list[Path] = []
+            num_imported = import_json_tasks(
+                store, tasks_dir, config.task_ids, unreadable_files=unreadable_files
+            )
+            print(f"{agent_id}: {num_imported}/{len(config.task_ids)} tasks")
+            for path in unreadable_files:
+                print(f"  skipped unreadable task file {path}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,72 +1,129 @@
-import uuid
+import os
 import asyncio
-from collections import deque
-from abc import ABC, abstractmethod
-from enum import Enum, auto
+import json
+import time
+import warnings
+from abc import ABC
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import Literal, Optional
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator, Optional, Self
 from datetime import datetime
 from dotenv import load_dotenv, find_dotenv
 from tqdm import tqdm
 from langchain_openai import ChatOpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from pydantic import BaseModel, ValidationError
+import httpx
 
-_ = load_dotenv(find_dotenv())
-
-
-class AgentType(Enum):
-    OPEN_CODING = auto()
-    AXIAL_CODING = auto()
-    RELATED = auto()
-
-
-class AgentConfig(BaseModel):
-    agent_type: AgentType
-    agent_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    task_ids: Optional[list[str]] = None
-
-
-class TaskStatus(Enum):
-    PENDING = auto()
-    COMPLETED = auto()
-    FAILED = auto()
+from .batch import (
+    BATCH_ENDPOINT,
+    TERMINAL_BATCH_STATUSES,
+    BatchJob,
+    BatchTransport,
+    LocalBatchTransport,
+    OpenAIBatchTransport,
+    parse_batch_result,
+    write_batch_files,
+)
+from .cache import ResponseCache
+from .dedup import Deduplicator
+from .errors import classify_error
+from .extract import (
+    ExtractFn,
+    ExtractItem,
+    ParseOutcome,
+    emit_parsed,
+    extract_results,
+    parse_output,
+    read_jsonl,
+)
+from .inputs import ContextRecord, InputWriter, TemplateRecord, content_id, read_inputs
+from .logger import AgentLogger, LogLevel, read_logs
+from .metrics import RunMetrics, estimate_cost, serve_metrics, write_metrics_file
+from .packing import pack_prompt, unpack_response
+from .scheduler import (
+    DEFAULT_RETRY_POLICIES,
+    AdaptiveConcurrencyLimiter,
+    ModelTier,
+    RateLimiter,
+    RetryBudget,
+    RetryPolicy,
+    RoutingPolicy,
+    TaskOrder,
+    Throttle,
+    count_tokens,
+    estimate_tokens,
+)
+from .schema import (
+    AgentConfig,
+    AgentType,
+    ErrorKind,
+    ExtractionResult,
+    InvokeResult,
+    SimulationResult,
+    TaskError,
+    TaskSchema,
+    TasksCreatedResult,
+    TaskStatus,
+    TasksRunningResult,
+)
+from .simulation import compare_orders, recorded_latencies, simulate_run
+from .store import SQLiteTaskStore, TaskStore, import_json_tasks
+from .validation import (
+    AxialCodingOutput,
+    CategoryConsolidationOutput,
+    OpenCodingOutput,
+    RelatedOutput,
+    SelectiveCodingOutput,
+    reask_prompt,
+    validate_output,
+)
+from .worker import WorkerConfig, run_worker, run_workers
 
-
-class TaskSchema(BaseModel):
-    task_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    status: TaskStatus = Field(default=TaskStatus.PENDING)
-    input_text: str
-    output_text: Optional[str] = None
-
-
-class TasksCreatedResult(BaseModel):
-    created_at: datetime = Field(default_factory=datetime.now)
-    num_tasks_created: int = Field(default=0)
-
-
-class TasksRunningResult(BaseModel):
-    started_at: datetime = Field(default_factory=datetime.now)
-    ended_at: Optional[datetime] = None
-    num_tasks_started: int = Field(default=0)
-    num_tasks_completed: int = Field(default=0)
-    num_tasks_failed: int = Field(default=0)
-    num_tasks_skipped: int = Field(default=0)
+_ = load_dotenv(find_dotenv())
 
 
 class BaseAgent(ABC):
+    # Model used for every task of the agent; subclasses must set it
+    model: str
+    # Whether near-duplicate items under different contexts (e.g. posts) share one
+    # result; only safe when the prompt does not show the context. Exact duplicates
+    # (copypasta, bot messages) share one result across contexts either way
+    dedup_across_contexts: bool = True
+    # JSON shape every response must have; responses are then requested in JSON mode,
+    # validated on arrival and stored parsed in TaskSchema.output
+    output_schema: Optional[type[BaseModel]] = None
+    # Corrective re-asks of an invalid response before the task fails
+    max_reasks: int = 2
+    # Model tiers by input length for this agent type, escalated on invalid
+    # responses; None runs every task on `model`
+    routing: Optional[RoutingPolicy] = None
+
     def __init__(
         self,
         agent_type: AgentType,
         agent_id: Optional[str] = None,
         data_dir: Path = Path("data"),
         logs_dir: Path = Path("logs"),
+        log_buffer_size: int = 1000,
+        log_flush_interval: float = 1.0,
     ) -> None:
         self.data_dir = data_dir
         self.logs_dir = logs_dir
+        # Credentials of this agent's clients; None falls back to OPENAI_API_KEY /
+        # OPENAI_BASE_URL of the environment
+        self.api_key: Optional[str] = None
+        self.base_url: Optional[str] = None
+        # One lazily created client (and HTTP connection pool) per model
+        self._llms: dict[str, ChatOpenAI] = {}
+        self._http_clients: list[httpx.AsyncClient] = []
+        self._http_pool_size = 20
+        # Opt-in response cache consulted by run_task
+        self.response_cache: Optional[ResponseCache] = None
+        # Measurements of the run_tasks call in progress
+        self.metrics: Optional[RunMetrics] = None
 
+        config_error = None
         if agent_id is None:  # If no agent ID is provided, generate a new one
-            agent_id = str(uuid.uuid4())
-
             # Create a new agent config
             self.config = AgentConfig(
                 agent_type=agent_type,
@@ -76,177 +133,1213 @@ class BaseAgent(ABC):
             # Save the agent config to disk
             self._save_agent_config_to_disk()  # Save the agent config to disk
         else:  # If an agent ID is provided, load the agent config from disk
-            self.config = self._load_agent_config_from_disk(
-                agent_id
-            )  # Load the agent config from disk
-
-    @abstractmethod
-    def get_llm(self) -> ChatOpenAI: ...
-
-    async def create_tasks(self, input_texts: list[str]) -> TasksCreatedResult:
-        # Create a new task for each input text
-        tasks = [TaskSchema(input_text=input_text) for input_text in input_texts]
-        # Save the tasks to disk
-        for task in tasks:
-            # Save the task to disk
-            self._save_task_to_disk(task)
-        # Update the agent config with the new task IDs
-        self.config.task_ids = [task.task_id for task in tasks]
+            try:
+                self.config = self._load_agent_config_from_disk(agent_id)
+            except ValidationError as exc:
+                # Truncated by a crash under a version that wrote configs in place
+                config_error = exc
+                self.config = AgentConfig(agent_type=agent_type, agent_id=agent_id)
+
+        self.logger = AgentLogger(
+            self.logs_dir / f"{self.config.agent_id}.jsonl",
+            buffer_size=log_buffer_size,
+            flush_interval=log_flush_interval,
+        )
+        self.store = self._open_task_store()
+
+        if config_error is not None:
+            if not self.store.count():
+                raise ValueError(
+                    f"Agent config for agent ID {agent_id} is corrupt and its task store is empty"
+                ) from config_error
+            # Batch jobs still to collect are recorded on their tasks as well
+            self.config.batch_ids = sorted(
+                {task.batch_id for task in self.store.iter_tasks(TaskStatus.SUBMITTED)}
+            )
+            self.refresh_progress()
+            self._log(
+                f"Agent config was corrupt; rebuilt it from the task store: {config_error}",
+                level="warning",
+                event="agent_config_rebuilt",
+                num_tasks=self.config.num_tasks,
+            )
+
+        # Agents created before the task store kept one JSON file per task
+        if self.config.task_ids and self.store.count() == 0:
+            unreadable_files: list[Path] = []
+            num_imported = import_json_tasks(
+                self.store,
+                self.data_dir / "tasks",
+                self.config.task_ids,
+                unreadable_files=unreadable_files,
+            )
+            self.config.num_tasks = self.store.count()
+            self._save_agent_config_to_disk()
+            self._log(
+                f"Imported {num_imported} legacy task files"
+                + (
+                    f"; skipped {len(unreadable_files)} unreadable (truncated) files."
+                    if unreadable_files
+                    else "."
+                ),
+                level="warning" if unreadable_files else "info",
+                event="tasks_imported",
+                num_tasks=num_imported,
+                unreadable_files=[str(path) for path in unreadable_files] or None,
+            )
+
+    def get_llm(self, model: Optional[str] = None) -> ChatOpenAI:
+        # Clients are shared across tasks so connections (and TLS sessions) are reused
+        model = model or self.model
+        if model not in self._llms:
+            http_async_client = DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=self._http_pool_size,
+                    max_keepalive_connections=self._http_pool_size,
+                )
+            )
+            self._http_clients.append(http_async_client)
+            self._llms[model] = self._build_llm(model, http_async_client)
+        return self._llms[model]
+
+    def _build_llm(
+        self, model: str, http_async_client: httpx.AsyncClient
+    ) -> ChatOpenAI:
+        # Override to customise generation parameters; keep the given HTTP client
+        # and the agent's credentials
+        # Retries are handled by the scheduler, which sees every error
+        return ChatOpenAI(
+            model=model,
+            http_async_client=http_async_client,
+            **self._credentials(),
+            max_retries=0,
+            model_kwargs=(
+                {"response_format": {"type": "json_object"}}
+                if self.output_schema is not None
+                else {}
+            ),
+        )
+
+    def _credentials(self) -> dict[str, str]:
+        # The agent's API key and base URL; unset ones come from the environment
+        return {
+            name: value
+            for name, value in (("api_key", self.api_key), ("base_url", self.base_url))
+            if value is not None
+        }
+
+    async def aclose_llms(self) -> None:
+        # Close pooled connections; clients are recreated on the next get_llm call
+        self._llms.clear()
+        http_clients, self._http_clients = self._http_clients, []
+        for http_client in http_clients:
+            await http_client.aclose()
+
+    def close(self) -> None:
+        # Stops the logger's writer thread (and its exit hook) and closes the task
+        # store; safe to call more than once
+        self.logger.close()
+        self.store.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    async def create_tasks(self, input_texts: Iterable[str]) -> TasksCreatedResult:
+        # Create a new task for each input text and write them to the task store
+        num_tasks_created = self.store.put_many(
+            TaskSchema(input_text=input_text) for input_text in input_texts
+        )
+        self.store.flush()
+        # Update the agent config with the new task count
+        self.config.num_tasks = self.store.count()
         # Save the agent config to disk
         self._save_agent_config_to_disk()
         # Return the number of tasks created
-        return TasksCreatedResult(num_tasks_created=len(tasks))
+        return TasksCreatedResult(num_tasks_created=num_tasks_created)
+
+    async def create_tasks_from_inputs(
+        self, inputs_path: Path, deduplicator: Optional[Deduplicator] = None
+    ) -> TasksCreatedResult:
+        # Stream a compact JSONL input file (see src/agent/inputs.py): templates and
+        # contexts are stored once, and each item becomes a task referencing them.
+        # With a deduplicator, an item duplicating an earlier one becomes a DUPLICATE
+        # task that receives the earlier task's result instead of making its own call
+        def _tasks() -> Iterator[TaskSchema]:
+            for record in read_inputs(inputs_path):
+                if isinstance(record, TemplateRecord):
+                    self.store.put_blob(record.id, record.text)
+                elif isinstance(record, ContextRecord):
+                    self.store.put_blob(record.id, json.dumps(record.fields))
+                else:
+                    task = TaskSchema(
+                        template_id=record.template,
+                        context_id=record.context,
+                        input_fields=record.fields,
+                        source_id=record.id,
+                    )
+                    if deduplicator is not None:
+                        duplicate_of = deduplicator.add(
+                            task.task_id,
+                            "\n".join(record.fields.values()),
+                            scope=record.template,
+                            near_scope=(
+                                None
+                                if self.dedup_across_contexts
+                                else f"{record.template}\0{record.context}"
+                            ),
+                        )
+                        if duplicate_of is not None:
+                            task.status = TaskStatus.DUPLICATE
+                            task.duplicate_of = duplicate_of
+                    yield task
 
-    async def run_task(self, task: TaskSchema) -> TaskSchema:
+        num_tasks_created = self.store.put_many(_tasks())
+        self.store.flush()
+        self.config.num_tasks = self.store.count()
+        self._save_agent_config_to_disk()
+        tasks_created_result = TasksCreatedResult(
+            num_tasks_created=num_tasks_created,
+            num_duplicates=deduplicator.num_duplicates if deduplicator else 0,
+        )
+        if deduplicator is not None:
+            self._log(
+                f"Deduplicated {tasks_created_result.num_duplicates} of {num_tasks_created} items "
+                f"({deduplicator.num_exact_duplicates} exact, {deduplicator.num_near_duplicates} near); "
+                f"{tasks_created_result.num_duplicates} LLM calls saved.",
+                event="tasks_deduplicated",
+                num_tasks=num_tasks_created,
+                num_duplicates=tasks_created_result.num_duplicates,
+            )
+        return tasks_created_result
+
+    def render_input(self, task: TaskSchema) -> str:
+        if task.input_text is not None:
+            return task.input_text
+        template = self.store.get_blob(task.template_id)
+        context_fields = (
+            json.loads(self.store.get_blob(task.context_id)) if task.context_id else {}
+        )
+        return template.format(**context_fields, **task.input_fields)
+
+    def route(self, task: TaskSchema, input_text: str) -> str:
+        # Model of the task's first call
+        if self.routing is None:
+            return self.model
+        last_error = task.last_error
+        if (
+            task.model is not None
+            and last_error is not None
+            and last_error.kind == ErrorKind.INVALID_OUTPUT
+        ):
+            # Retried after the re-asks failed: start above the model that failed
+            return self.routing.escalate(task.model) or task.model
+        input_tokens = (
+            task.estimated_tokens
+            if task.estimated_tokens is not None
+            else count_tokens(input_text)
+        )
+        return self.routing.initial_model(input_tokens)
+
+    async def estimate_tasks(self, chunk_size: int = 1000) -> int:
+        """Count the prompt tokens of every pending task without an estimate yet.
+
+        Stored in TaskSchema.estimated_tokens, which orders tasks longest first and
+        routes them to a model tier without counting again. Returns how many tasks
+        were estimated.
+        """
+        # The store stays on the event loop (it is bound to its thread); only the
+        # tokenizer runs on a worker thread, a chunk at a time, so the loop is free
+        # between chunks
+        def _count(input_texts: list[str]) -> list[int]:
+            return [count_tokens(input_text) for input_text in input_texts]
+
+        async def _estimate(tasks: list[TaskSchema]) -> None:
+            counts = await asyncio.to_thread(
+                _count, [self.render_input(task) for task in tasks]
+            )
+            self.store.put_many(
+                task.model_copy(update={"estimated_tokens": num_tokens})
+                for task, num_tokens in zip(tasks, counts)
+            )
+
+        started_at = time.monotonic()
+        num_estimated = 0
+        chunk: list[TaskSchema] = []
+        for task in self.store.iter_tasks(TaskStatus.PENDING):
+            if task.estimated_tokens is not None:
+                continue
+            chunk.append(task)
+            if len(chunk) >= chunk_size:
+                await _estimate(chunk)
+                num_estimated += len(chunk)
+                chunk = []
+        if chunk:
+            await _estimate(chunk)
+            num_estimated += len(chunk)
+        self.store.flush()
+        if num_estimated:
+            self._log(
+                f"Estimated the prompt tokens of {num_estimated} tasks.",
+                event="tasks_estimated",
+                num_tasks=num_estimated,
+                elapsed_secs=time.monotonic() - started_at,
+            )
+        return num_estimated
+
+    async def run_task(
+        self,
+        task: TaskSchema,
+        throttle: Optional[Throttle] = None,
+        queue_wait: Optional[float] = None,
+    ) -> TaskSchema:
         # Skip execution if already completed
         if task.status == TaskStatus.COMPLETED:
             self._log(
                 f"Task {task.task_id} already completed. Skipping execution.",
-                level="info",
+                event="task_skipped",
+                task_id=task.task_id,
             )
             return task
 
-        llm = self.get_llm()
+        started_at = time.monotonic()
+        usage = {
+            "attempts": task.attempts,
+            "num_reasks": task.num_reasks,
+            "prompt_tokens": task.prompt_tokens,
+            "completion_tokens": task.completion_tokens,
+            "cost_usd": task.cost_usd,
+        }
 
+        def _add_usage(result: InvokeResult) -> None:
+            usage["attempts"] += 0 if result.from_cache else 1
+            usage["prompt_tokens"] += result.prompt_tokens
+            usage["completion_tokens"] += result.completion_tokens
+            usage["cost_usd"] += result.cost_usd
+
+        model = None
         try:
-            response = await llm.ainvoke(f"{task.input_text}")
-            output_text = getattr(response, "content", str(response))
-            task_completed = TaskSchema(
-                task_id=task.task_id,
-                status=TaskStatus.COMPLETED,
-                input_text=task.input_text,
-                output_text=output_text,
+            input_text = self.render_input(task)
+            model = self.route(task, input_text)
+            result = await self._invoke(input_text, throttle, self.output_schema, model)
+            _add_usage(result)
+            # Re-ask only this task, showing the model its response and what is wrong
+            num_reasks = 0
+            while result.validation_error is not None and num_reasks < self.max_reasks:
+                num_reasks += 1
+                if self.routing is not None:
+                    model = self.routing.escalate(model) or model
+                self._log(
+                    f"Task {task.task_id} returned an invalid response; re-asking ({num_reasks}/{self.max_reasks}) on {model}: {result.validation_error}",
+                    level="warning",
+                    event="task_reasked",
+                    task_id=task.task_id,
+                    reask=num_reasks,
+                    model=model,
+                    validation_error=result.validation_error,
+                )
+                result = await self._invoke(
+                    reask_prompt(
+                        input_text,
+                        result.output_text,
+                        result.validation_error,
+                        self.output_schema,
+                    ),
+                    throttle,
+                    self.output_schema,
+                    model,
+                )
+                _add_usage(result)
+            usage["num_reasks"] += num_reasks
+        except Exception as exc:
+            error = classify_error(exc)
+            failed_task = task.model_copy(
+                update={
+                    **usage,
+                    "status": TaskStatus.FAILED,
+                    "model": model or task.model,
+                    "output_text": str(exc),
+                    "attempts": usage["attempts"] + 1,
+                    "errors": [*task.errors, error],
+                }
             )
-            self._save_task_to_disk(task_completed)
+            # Persist failed state for visibility
+            self.store.put(failed_task)
             self._log(
-                f"Task {task_completed.task_id} completed successfully.", level="info"
+                f"Task {failed_task.task_id} failed: {str(exc)}",
+                level="error",
+                event="task_failed",
+                task_id=failed_task.task_id,
+                latency=time.monotonic() - started_at,
+                queue_wait=queue_wait,
+                error_class=error.error_class,
+                error_kind=error.kind.name,
+                attempt=failed_task.attempts,
             )
-            return task_completed
-        except Exception as exc:
-            failed_task = TaskSchema(
+            return failed_task
+
+        if result.validation_error is not None:
+            error = TaskError(
+                kind=ErrorKind.INVALID_OUTPUT,
+                error_class=self.output_schema.__name__,
+                message=result.validation_error,
+            )
+            # The last response is kept for inspection
+            invalid_task = task.model_copy(
+                update={
+                    **usage,
+                    "status": TaskStatus.FAILED,
+                    "model": model,
+                    "output_text": result.output_text,
+                    "errors": [*task.errors, error],
+                }
+            )
+            self.store.put(invalid_task)
+            self._log(
+                f"Task {task.task_id} failed: response still invalid after {usage['num_reasks'] - task.num_reasks} re-asks: {result.validation_error}",
+                level="error",
+                event="task_failed",
                 task_id=task.task_id,
-                status=TaskStatus.FAILED,
-                input_text=task.input_text,
-                output_text=str(exc),
+                latency=time.monotonic() - started_at,
+                queue_wait=queue_wait,
+                error_class=error.error_class,
+                error_kind=error.kind.name,
+                attempt=invalid_task.attempts,
             )
-            # Persist failed state for visibility
-            self._save_task_to_disk(failed_task)
-            self._log(f"Task {failed_task.task_id} failed: {str(exc)}", level="error")
-            return failed_task
+            return invalid_task
+
+        task_completed = task.model_copy(
+            update={
+                **usage,
+                "status": TaskStatus.COMPLETED,
+                "model": model,
+                "output_text": result.output_text,
+                "output": result.output,
+            }
+        )
+        self.store.put(task_completed)
+        self._log(
+            f"Task {task_completed.task_id} completed "
+            + ("from response cache." if result.from_cache else "successfully."),
+            event="task_completed",
+            task_id=task_completed.task_id,
+            latency=result.latency,
+            queue_wait=queue_wait,
+            from_cache=result.from_cache,
+            model=model,
+            estimated_tokens=task.estimated_tokens,
+            attempt=task_completed.attempts,
+            num_reasks=task_completed.num_reasks - task.num_reasks,
+            prompt_tokens=task_completed.prompt_tokens - task.prompt_tokens,
+            completion_tokens=task_completed.completion_tokens - task.completion_tokens,
+            cost_usd=task_completed.cost_usd - task.cost_usd,
+        )
+        return task_completed
+
+    async def run_packed_tasks(
+        self,
+        tasks: list[TaskSchema],
+        throttle: Optional[Throttle] = None,
+        queue_wait: Optional[float] = None,
+    ) -> list[TaskSchema]:
+        # Several tasks sharing a template and context in one request; tasks missing
+        # from the response, or whose output is invalid, are returned still pending so
+        # they can run (and be re-asked) on their own
+        item_ids = [f"item-{index + 1}" for index in range(len(tasks))]
+        template = self.store.get_blob(tasks[0].template_id)
+        context_fields = (
+            json.loads(self.store.get_blob(tasks[0].context_id))
+            if tasks[0].context_id
+            else {}
+        )
+        input_text = pack_prompt(
+            template,
+            context_fields,
+            [(item_id, task.input_fields) for item_id, task in zip(item_ids, tasks)],
+        )
+
+        # Routed by the packed prompt; invalid items are re-asked on their own
+        model = (
+            self.model
+            if self.routing is None
+            else self.routing.initial_model(count_tokens(input_text))
+        )
+        started_at = time.monotonic()
+        try:
+            result = await self._invoke(input_text, throttle, model=model)
+        except Exception as exc:
+            error = classify_error(exc)
+            failed_tasks = [
+                task.model_copy(
+                    update={
+                        "status": TaskStatus.FAILED,
+                        "output_text": str(exc),
+                        "attempts": task.attempts + 1,
+                        "errors": [*task.errors, error],
+                    }
+                )
+                for task in tasks
+            ]
+            self.store.put_many(failed_tasks)
+            self._log(
+                f"Packed request for {len(tasks)} tasks failed: {str(exc)}",
+                level="error",
+                event="pack_failed",
+                task_ids=[task.task_id for task in tasks],
+                latency=time.monotonic() - started_at,
+                queue_wait=queue_wait,
+                error_class=error.error_class,
+                error_kind=error.kind.name,
+            )
+            return failed_tasks
+
+        outputs = unpack_response(result.output_text, item_ids)
+        validated_outputs: dict[str, Optional[dict]] = {}
+        for item_id, output_text in outputs.items():
+            if self.output_schema is None:
+                validated_outputs[item_id] = None
+                continue
+            output, validation_error = validate_output(output_text, self.output_schema)
+            if validation_error is None:
+                validated_outputs[item_id] = output
+        results = []
+        for item_id, task in zip(item_ids, tasks):
+            usage = {
+                "prompt_tokens": task.prompt_tokens + result.prompt_tokens // len(tasks),
+                "completion_tokens": task.completion_tokens
+                + result.completion_tokens // len(tasks),
+                "cost_usd": task.cost_usd + result.cost_usd / len(tasks),
+            }
+            if item_id not in validated_outputs:
+                results.append(task.model_copy(update=usage))
+                continue
+            task_completed = task.model_copy(
+                update={
+                    "status": TaskStatus.COMPLETED,
+                    "model": model,
+                    "output_text": outputs[item_id],
+                    "output": validated_outputs[item_id],
+                    "attempts": task.attempts + (0 if result.from_cache else 1),
+                    **usage,
+                }
+            )
+            self.store.put(task_completed)
+            results.append(task_completed)
+        self._log(
+            f"Packed request completed {len(validated_outputs)}/{len(tasks)} tasks"
+            + (
+                f" ({len(outputs) - len(validated_outputs)} invalid)."
+                if len(validated_outputs) < len(outputs)
+                else "."
+            ),
+            level="info" if len(validated_outputs) == len(tasks) else "warning",
+            event="pack_completed",
+            task_ids=[task.task_id for task in tasks],
+            latency=result.latency,
+            queue_wait=queue_wait,
+            from_cache=result.from_cache,
+            model=model,
+            num_completed=len(validated_outputs),
+            prompt_tokens=result.prompt_tokens,
+            completion_tokens=result.completion_tokens,
+            cost_usd=result.cost_usd,
+        )
+        return results
+
+    async def _invoke(
+        self,
+        input_text: str,
+        throttle: Optional[Throttle] = None,
+        output_schema: Optional[type[BaseModel]] = None,
+        model: Optional[str] = None,
+    ) -> InvokeResult:
+        # With an output schema the response is validated, and cached only if valid
+        model = model or self.model
+        llm = self.get_llm(model)
+
+        # Serve identical prompts from the response cache without a network call
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = ResponseCache.make_key(llm._default_params, input_text)
+            cached_output_text = self.response_cache.get(cache_key)
+            if cached_output_text is not None:
+                result = InvokeResult(output_text=cached_output_text, from_cache=True)
+                if output_schema is not None:
+                    result.output, result.validation_error = validate_output(
+                        result.output_text, output_schema
+                    )
+                return result
+
+        requested_at = started_at = time.monotonic()
+        try:
+            if throttle is None:
+                response = await llm.ainvoke(input_text)
+            else:
+                async with throttle.slot(estimate_tokens(input_text)):
+                    started_at = time.monotonic()
+                    response = await llm.ainvoke(input_text)
+        except Exception:
+            if self.metrics is not None:
+                self.metrics.record_request(
+                    time.monotonic() - started_at,
+                    started_at - requested_at,
+                    failed=True,
+                )
+            raise
+
+        # Token usage as reported by the provider
+        usage = getattr(response, "usage_metadata", None) or {}
+        result = InvokeResult(
+            output_text=getattr(response, "content", str(response)),
+            latency=time.monotonic() - started_at,
+            prompt_tokens=usage.get("input_tokens", 0),
+            completion_tokens=usage.get("output_tokens", 0),
+        )
+        result.cost_usd = estimate_cost(
+            model, result.prompt_tokens, result.completion_tokens
+        )
+        if output_schema is not None:
+            result.output, result.validation_error = validate_output(
+                result.output_text, output_schema
+            )
+        if self.metrics is not None:
+            self.metrics.record_request(
+                result.latency,
+                started_at - requested_at,
+                result.prompt_tokens,
+                result.completion_tokens,
+                result.cost_usd,
+            )
+        if cache_key is not None and result.validation_error is None:
+            self.response_cache.put(cache_key, result.output_text)
+        return result
 
     async def run_tasks(
-        self, max_concurrent_requests: int = 20, request_gap: float = 0.2
+        self,
+        max_concurrent_requests: int = 20,
+        initial_concurrent_requests: int = 10,
+        adaptive_concurrency: bool = True,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        request_gap: Optional[float] = None,
+        use_cache: bool = False,
+        retry_policies: Optional[dict[ErrorKind, RetryPolicy]] = None,
+        retry_budget_ratio: float = 0.2,
+        pack_size: int = 1,
+        pack_token_budget: int = 4000,
+        metrics_interval: float = 10.0,
+        metrics_port: Optional[int] = None,
+        worker_id: Optional[str] = None,
+        lease_secs: float = 300.0,
+        claim_poll_interval: float = 5.0,
+        input_closed: Optional[asyncio.Event] = None,
+        on_task_completed: Optional[Callable[[TaskSchema], None]] = None,
+        skip_task: Optional[Callable[[TaskSchema], bool]] = None,
+        order: TaskOrder = TaskOrder.CREATED,
     ) -> TasksRunningResult:
+        # With input_closed (worker mode only) tasks may still be added while the run
+        # is in progress, e.g. by an upstream pipeline stage; the run ends once the
+        # event is set and no pending task is left. on_task_completed is called with
+        # every task completed by this run. skip_task is asked about each pending
+        # task just before it is dispatched; tasks it returns True for are not run
+        # (early stopping, see SaturationMonitor), and it must move them out of
+        # PENDING, or a worker-mode run would wait for them. With
+        # order=LONGEST_FIRST pending tasks are estimated first (estimate_tasks) and
+        # dispatched largest prompt first; tasks added during the run without an
+        # estimate come last. Packing groups consecutive tasks of one template and
+        # context, so it packs fewer tasks per request in that order
         tasks_running_result = TasksRunningResult()
+        if input_closed is not None and worker_id is None:
+            raise ValueError("input_closed requires worker_id")
+        if request_gap is not None:
+            warnings.warn(
+                "request_gap is deprecated; use requests_per_minute",
+                DeprecationWarning,
+                stacklevel=2,
+            )
+            # Request starts were spaced request_gap seconds apart
+            if requests_per_minute is None and request_gap > 0:
+                requests_per_minute = 60 / request_gap
 
-        if not self.config.task_ids:
+        num_tasks = self.store.count()
+        if not num_tasks and input_closed is None:
             return tasks_running_result
 
-        semaphore = asyncio.Semaphore(
-            max_concurrent_requests
-        )  # Limit concurrent network calls
-        progress = tqdm(
-            total=len(self.config.task_ids), desc="Running tasks", unit="task"
-        )
-        current_requests = 0
-        counter_lock = asyncio.Lock()
-        failure_times = deque()
-        failure_lock = asyncio.Lock()
-        backoff_event = asyncio.Event()
-        backoff_event.set()
-        backoff_in_progress = False
-        failure_threshold = 3
-        failure_window_secs = 60
-        backoff_sleep_secs = 5
-
-        async def _update_inflight(delta: int) -> None:
-            nonlocal current_requests
-            async with counter_lock:
-                current_requests += delta
-                progress.set_postfix({"inflight": current_requests})
-
-        async def _handle_failure_backoff(task_id: str) -> None:
-            nonlocal backoff_in_progress
-            now = datetime.now()
-            need_backoff = False
-
-            async with failure_lock:
-                failure_times.append(now)
-                while (
-                    failure_times
-                    and (now - failure_times[0]).total_seconds() > failure_window_secs
+        # Pending tasks are streamed from the store into a bounded queue drained by
+        # a fixed pool of workers, so memory stays flat regardless of the number of tasks.
+        # max_concurrent_requests is the ceiling; the adaptive limit decides how many
+        # workers may have a request inflight at once. Each queue entry is one request:
+        # a single task, or with pack_size > 1 up to pack_size tasks of the same
+        # template and context whose own fields fit in pack_token_budget, stamped with
+        # the time it was queued.
+        queue: asyncio.Queue[Optional[tuple[float, list[TaskSchema]]]] = asyncio.Queue(
+            maxsize=max_concurrent_requests * 2
+        )
+        concurrency = AdaptiveConcurrencyLimiter(
+            initial_limit=(
+                initial_concurrent_requests
+                if adaptive_concurrency
+                else max_concurrent_requests
+            ),
+            max_limit=max_concurrent_requests,
+            adaptive=adaptive_concurrency,
+        )
+        throttle = Throttle(
+            rate_limiter=RateLimiter(
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=tokens_per_minute,
+            ),
+            concurrency=concurrency,
+        )
+        retry_policies = {**DEFAULT_RETRY_POLICIES, **(retry_policies or {})}
+        retry_budget = RetryBudget(ratio=retry_budget_ratio)
+        scheduled_retries: set[asyncio.Task] = set()
+        feed_done = asyncio.Event()
+        metrics = RunMetrics()
+        progress = tqdm(total=num_tasks, desc="Running tasks", unit="task")
+
+        async def _put(tasks: list[TaskSchema]) -> None:
+            await queue.put((time.monotonic(), tasks))
+
+        by_priority = order == TaskOrder.LONGEST_FIRST
+
+        async def _pending_tasks() -> AsyncIterator[TaskSchema]:
+            if worker_id is None:
+                for task in self.store.iter_tasks(
+                    TaskStatus.PENDING, by_priority=by_priority
                 ):
-                    failure_times.popleft()
-                if len(failure_times) >= failure_threshold and not backoff_in_progress:
-                    backoff_in_progress = True
-                    need_backoff = True
-                    backoff_event.clear()
+                    yield task
+                return
+            # Worker mode: lease small batches from the shared store. Tasks leased by
+            # other workers are waited for, and claimed here once a lease lapses
+            while True:
+                tasks = self.store.claim(
+                    worker_id, max_concurrent_requests, lease_secs, by_priority
+                )
+                if tasks and input_closed is not None:
+                    progress.total = self.store.count()
+                for task in tasks:
+                    yield task
+                if tasks:
+                    continue
+                # Checked before the count: tasks are added before the input closes
+                closed = input_closed is None or input_closed.is_set()
+                if closed and not self.store.count(TaskStatus.PENDING):
+                    return
+                await asyncio.sleep(claim_poll_interval)
+
+        async def _renew_leases() -> None:
+            # Keeps leases on queued, inflight and retrying tasks of this worker alive
+            while True:
+                await asyncio.sleep(lease_secs / 3)
+                self.store.renew_leases(worker_id, lease_secs)
 
-            if need_backoff:
+        async def _feed() -> None:
+            pack: list[TaskSchema] = []
+            pack_tokens = 0
+            async for task in _pending_tasks():
+                if skip_task is not None and skip_task(task):
+                    tasks_running_result.num_tasks_skipped += 1
+                    progress.update(1)
+                    continue
+                tasks_running_result.num_tasks_started += 1
+                retry_budget.record_attempt()
+                if pack_size <= 1 or task.template_id is None:
+                    await _put([task])
+                    continue
+
+                task_tokens = estimate_tokens("".join(task.input_fields.values()))
+                if pack and (
+                    len(pack) >= pack_size
+                    or pack_tokens + task_tokens > pack_token_budget
+                    or (task.template_id, task.context_id)
+                    != (pack[0].template_id, pack[0].context_id)
+                ):
+                    await _put(pack)
+                    pack, pack_tokens = [], 0
+                pack.append(task)
+                pack_tokens += task_tokens
+            if pack:
+                await _put(pack)
+            feed_done.set()
+
+        async def _stop_when_drained() -> None:
+            # Workers stop once the store is exhausted and no retry is waiting
+            await feed_done.wait()
+            while True:
+                await queue.join()
+                if not scheduled_retries:
+                    break
+                await asyncio.wait(set(scheduled_retries))
+            for _ in range(max_concurrent_requests):
+                await queue.put(None)  # One stop signal per worker
+
+        async def _requeue_after(task: TaskSchema, delay: float) -> None:
+            await asyncio.sleep(delay)
+            await _put([task])
+
+        def _requeue(task: TaskSchema, delay: float) -> None:
+            # Requeued outside the workers so a full queue cannot block them
+            requeue = asyncio.create_task(_requeue_after(task, delay))
+            scheduled_retries.add(requeue)
+            requeue.add_done_callback(scheduled_retries.discard)
+
+        def _schedule_retry(task: TaskSchema) -> bool:
+            error = task.last_error
+            policy = retry_policies[error.kind]
+            # Each kind has its own limit: re-asks or earlier rate limits do not use
+            # up the attempts of a later timeout
+            num_attempts = task.num_errors(error.kind)
+            if num_attempts >= policy.max_attempts:
+                return False
+            if not retry_budget.try_spend():
                 self._log(
-                    f"Task {task_id} consecutive failures reached {len(failure_times)}; backing off {backoff_sleep_secs}s",
+                    f"Task {task.task_id} not retried: retry budget exhausted.",
                     level="warning",
+                    event="retry_budget_exhausted",
+                    task_id=task.task_id,
+                    error_class=error.error_class,
                 )
-                await asyncio.sleep(backoff_sleep_secs)
-                async with failure_lock:
-                    failure_times.clear()
-                    backoff_in_progress = False
-                    backoff_event.set()
+                return False
 
-        async def _run_single(task_id: str, index: int) -> None:
-            nonlocal tasks_running_result
-            await asyncio.sleep(index * request_gap)  # Stagger start times
+            delay = policy.delay(num_attempts, error.retry_after)
+            # Persist as pending so the retry survives a restart
+            task_retry = task.model_copy(update={"status": TaskStatus.PENDING})
+            self.store.put(task_retry)
+            _requeue(task_retry, delay)
+            metrics.record_backoff(delay)
+            self._log(
+                f"Task {task.task_id} attempt {task.attempts} failed ({error.kind.name}); retrying in {delay:.1f}s",
+                level="warning",
+                event="task_retry_scheduled",
+                task_id=task.task_id,
+                error_class=error.error_class,
+                attempt=task.attempts,
+                delay=delay,
+            )
+            return True
 
-            try:
-                task = self._load_task_from_disk(task_id)
-            except Exception as exc:
-                tasks_running_result.num_tasks_failed += 1
-                self._log(f"Load task {task_id} failed: {exc}", level="error")
-                progress.update(1)
-                return
+        async def _work() -> None:
+            while (item := await queue.get()) is not None:
+                enqueued_at, tasks = item
+                queue_wait = time.monotonic() - enqueued_at
+                for _ in tasks:
+                    metrics.record_queue_wait(queue_wait)
+                limit_before = concurrency.limit
+                if len(tasks) == 1:
+                    task_results = [
+                        await self.run_task(tasks[0], throttle, queue_wait)
+                    ]
+                else:
+                    task_results = await self.run_packed_tasks(
+                        tasks, throttle, queue_wait
+                    )
 
-            if task.status != TaskStatus.PENDING:
-                tasks_running_result.num_tasks_skipped += 1
+                tasks_running_result.num_task_reasks += sum(
+                    task_result.num_reasks - task.num_reasks
+                    for task, task_result in zip(tasks, task_results)
+                )
+                for task_result in task_results:
+                    if task_result.status == TaskStatus.COMPLETED:
+                        tasks_running_result.num_tasks_completed += 1
+                        progress.update(1)
+                        if on_task_completed is not None:
+                            on_task_completed(task_result)
+                    elif task_result.status == TaskStatus.FAILED:
+                        if _schedule_retry(task_result):
+                            tasks_running_result.num_task_retries += 1
+                        else:
+                            tasks_running_result.num_tasks_failed += 1
+                            progress.update(1)
+                    else:  # Missing from a packed response; run it on its own
+                        _requeue(task_result, 0)
+                if concurrency.limit < limit_before:
+                    self._log(
+                        f"Task {task_results[0].task_id} signalled overload; concurrency limit {limit_before} -> {concurrency.limit}",
+                        level="warning",
+                        event="concurrency_decreased",
+                        task_id=task_results[0].task_id,
+                        limit=concurrency.limit,
+                    )
+
+                progress.set_postfix(
+                    {"inflight": concurrency.inflight, "limit": concurrency.limit}
+                )
+                queue.task_done()
+
+        def _render_metrics() -> str:
+            return metrics.to_prometheus(
+                self.config.agent_id,
+                {
+                    "concurrency_limit": concurrency.limit,
+                    "inflight_requests": concurrency.inflight,
+                    "tasks_completed": tasks_running_result.num_tasks_completed,
+                    "tasks_failed": tasks_running_result.num_tasks_failed,
+                    "tasks_awaiting_retry": len(scheduled_retries),
+                },
+            )
+
+        async def _export_metrics() -> None:
+            # Periodic snapshot for tools that read files rather than scrape
+            while True:
+                await asyncio.sleep(metrics_interval)
+                await asyncio.to_thread(
+                    write_metrics_file, metrics_path, _render_metrics()
+                )
+
+        if by_priority:
+            await self.estimate_tasks()
+        # Tasks that are not pending are skipped without being loaded
+        tasks_running_result.num_tasks_skipped = num_tasks - self.store.count(
+            TaskStatus.PENDING
+        )
+        progress.update(tasks_running_result.num_tasks_skipped)
+        if worker_id is not None:
+            # Leases still held under this worker ID were left by a previous run that
+            # crashed before releasing them; reclaim them now rather than after they lapse
+            num_released = self.store.release_leases(worker_id)
+            if num_released:
                 self._log(
-                    f"Task {task.task_id} status {task.status.name}; skipping.",
-                    level="info",
+                    f"Released {num_released} leases left by a previous run of worker {worker_id}.",
+                    level="warning",
+                    event="stale_leases_released",
+                    worker_id=worker_id,
+                    num_tasks=num_released,
                 )
-                progress.update(1)
-                return
+            # Other workers complete the rest, so this progress bar may not fill
+            progress.set_description(f"Running tasks ({worker_id})")
 
-            tasks_running_result.num_tasks_started += 1
+        opened_response_cache = use_cache and self.response_cache is None
+        if opened_response_cache:
+            self.response_cache = self._open_response_cache()
+        if self.response_cache is not None:
+            cache_hits, cache_misses = self.response_cache.hits, self.response_cache.misses
 
-            await backoff_event.wait()
-            async with semaphore:
-                await _update_inflight(1)
-                task_result = await self.run_task(task)
-                await _update_inflight(-1)
+        # Size the shared connection pools to the number of workers
+        await self.aclose_llms()
+        self._http_pool_size = max_concurrent_requests
 
-            if task_result.status == TaskStatus.COMPLETED:
-                tasks_running_result.num_tasks_completed += 1
-            elif task_result.status == TaskStatus.FAILED:
-                tasks_running_result.num_tasks_failed += 1
-                await _handle_failure_backoff(task_result.task_id)
+        self.metrics = metrics
+        metrics_path = self.logs_dir / (
+            f"{self.config.agent_id}.prom"
+            if worker_id is None
+            else f"{self.config.agent_id}.{worker_id}.prom"
+        )
+        metrics_exporter = asyncio.create_task(_export_metrics())
+        lease_renewer = (
+            asyncio.create_task(_renew_leases()) if worker_id is not None else None
+        )
+        metrics_server = (
+            await serve_metrics(_render_metrics, metrics_port)
+            if metrics_port is not None
+            else None
+        )
+        try:
+            async with asyncio.TaskGroup() as task_group:
+                task_group.create_task(_feed())
+                task_group.create_task(_stop_when_drained())
+                for _ in range(max_concurrent_requests):
+                    task_group.create_task(_work())
+        finally:
+            metrics_exporter.cancel()
+            if metrics_server is not None:
+                metrics_server.close()
+            write_metrics_file(metrics_path, _render_metrics())
+            self.metrics = None
+            self.store.flush()
+            if lease_renewer is not None:
+                lease_renewer.cancel()
+                # Tasks this worker still holds (e.g. on cancellation) go back at once
+                self.store.release_leases(worker_id)
+            self.logger.flush()
+            await self.aclose_llms()
+            if self.response_cache is not None:
+                tasks_running_result.num_cache_hits = (
+                    self.response_cache.hits - cache_hits
+                )
+                tasks_running_result.num_cache_misses = (
+                    self.response_cache.misses - cache_misses
+                )
+            if opened_response_cache:
+                self.response_cache.close()
+                self.response_cache = None
 
-            progress.update(1)
+        tasks_running_result.num_duplicates_resolved = self.resolve_duplicates()
+        self.refresh_progress()
+        tasks_running_result.metrics = metrics.summary(
+            tasks_running_result.num_tasks_completed
+        )
+        tasks_running_result.ended_at = datetime.now()
+        progress.close()
+        return tasks_running_result
+
+    async def run_tasks_batch(
+        self,
+        transport: Optional[BatchTransport] = None,
+        max_requests_per_batch: int = 50_000,
+        max_bytes_per_batch: int = 190 * 1024 * 1024,
+        poll_interval: float = 60.0,
+        completion_window: str = "24h",
+    ) -> TasksRunningResult:
+        # Offline mode: pending tasks go through the provider's batch API instead of
+        # live requests; results land in the task store like those of run_tasks.
+        # Each request is routed like its first live call
+        transport = transport or OpenAIBatchTransport(
+            AsyncOpenAI(**self._credentials())
+        )
+        tasks_running_result = TasksRunningResult()
+        batch_dir = self.data_dir / "batches" / self.config.agent_id
+
+        model_params = self.get_llm()._default_params
+        await self.aclose_llms()
+
+        routed_models: dict[str, str] = {}
+
+        def _pending_requests() -> Iterator[tuple[str, str, str]]:
+            for task in self.store.iter_tasks(TaskStatus.PENDING):
+                input_text = self.render_input(task)
+                model = routed_models[task.task_id] = self.route(task, input_text)
+                yield task.task_id, input_text, model
 
-        await asyncio.gather(
-            *(
-                _run_single(task_id, idx)
-                for idx, task_id in enumerate(self.config.task_ids)
+        for path, task_ids in write_batch_files(
+            _pending_requests(),
+            model_params,
+            batch_dir,
+            max_requests=max_requests_per_batch,
+            max_bytes=max_bytes_per_batch,
+        ):
+            input_file_id = await transport.upload(path)
+            batch_id = await transport.create_batch(
+                input_file_id, BATCH_ENDPOINT, completion_window
             )
+            self.store.put_many(
+                self.store.get(task_id).model_copy(
+                    update={
+                        "status": TaskStatus.SUBMITTED,
+                        "batch_id": batch_id,
+                        "model": routed_models.pop(task_id),
+                    }
+                )
+                for task_id in task_ids
+            )
+            self.store.flush()
+            # Record the job before anything else can fail so a rerun collects it
+            self.config.batch_ids.append(batch_id)
+            self._save_agent_config_to_disk()
+            tasks_running_result.num_tasks_started += len(task_ids)
+            self._log(
+                f"Submitted batch {batch_id} with {len(task_ids)} tasks.",
+                event="batch_submitted",
+                batch_id=batch_id,
+                num_tasks=len(task_ids),
+            )
+
+        # Batches submitted by an earlier call are collected here as well
+        progress = tqdm(
+            total=self.store.count(TaskStatus.SUBMITTED),
+            desc="Collecting batches",
+            unit="task",
         )
+        while self.config.batch_ids:
+            for batch_id in list(self.config.batch_ids):
+                job = await transport.get_batch(batch_id)
+                if job.status not in TERMINAL_BATCH_STATUSES:
+                    continue
+                await self._collect_batch(
+                    job, transport, batch_dir, tasks_running_result, progress
+                )
+                self.config.batch_ids.remove(batch_id)
+                self._save_agent_config_to_disk()
+            if self.config.batch_ids:
+                await asyncio.sleep(poll_interval)
 
+        tasks_running_result.num_duplicates_resolved = self.resolve_duplicates()
         tasks_running_result.ended_at = datetime.now()
         progress.close()
         return tasks_running_result
 
+    async def _collect_batch(
+        self,
+        job: BatchJob,
+        transport: BatchTransport,
+        batch_dir: Path,
+        tasks_running_result: TasksRunningResult,
+        progress: tqdm,
+    ) -> None:
+        batch_dir.mkdir(parents=True, exist_ok=True)
+        for file_id in (job.output_file_id, job.error_file_id):
+            if file_id is None:
+                continue
+            result_path = batch_dir / f"{job.batch_id}-{file_id}.jsonl"
+            await transport.download(file_id, result_path)
+            with open(result_path, "r") as f:
+                for line in f:
+                    record = json.loads(line)
+                    task = self.store.get(record["custom_id"])
+                    if task.status != TaskStatus.SUBMITTED:
+                        continue  # Already collected
+                    output_text, error = parse_batch_result(record)
+                    output = None
+                    if error is None and self.output_schema is not None:
+                        # No re-ask offline; retry_failed re-runs these tasks live
+                        output, validation_error = validate_output(
+                            output_text, self.output_schema
+                        )
+                        if validation_error is not None:
+                            error = TaskError(
+                                kind=ErrorKind.INVALID_OUTPUT,
+                                error_class=self.output_schema.__name__,
+                                message=validation_error,
+                            )
+                    if error is None:
+                        task = task.model_copy(
+                            update={
+                                "status": TaskStatus.COMPLETED,
+                                "output_text": output_text,
+                                "output": output,
+                                "attempts": task.attempts + 1,
+                            }
+                        )
+                        tasks_running_result.num_tasks_completed += 1
+                    else:
+                        task = task.model_copy(
+                            update={
+                                "status": TaskStatus.FAILED,
+                                "output_text": output_text or error.message,
+                                "attempts": task.attempts + 1,
+                                "errors": [*task.errors, error],
+                            }
+                        )
+                        tasks_running_result.num_tasks_failed += 1
+                    self.store.put(task)
+                    progress.update(1)
+
+        # Requests without a result line: an expired or cancelled job leaves them
+        # unprocessed (back to pending), a failed job rejected them outright
+        leftover_tasks = [
+            task
+            for task in self.store.iter_tasks(TaskStatus.SUBMITTED)
+            if task.batch_id == job.batch_id
+        ]
+        for task in leftover_tasks:
+            if job.status == "failed":
+                error = TaskError(
+                    kind=ErrorKind.CLIENT,
+                    error_class="BatchJobFailed",
+                    message="; ".join(job.errors) or f"Batch {job.batch_id} failed",
+                )
+                task = task.model_copy(
+                    update={
+                        "status": TaskStatus.FAILED,
+                        "output_text": error.message,
+                        "errors": [*task.errors, error],
+                    }
+                )
+                tasks_running_result.num_tasks_failed += 1
+            else:
+                task = task.model_copy(update={"status": TaskStatus.PENDING})
+                tasks_running_result.num_tasks_skipped += 1
+            self.store.put(task)
+            progress.update(1)
+        self.store.flush()
+        self._log(
+            f"Collected batch {job.batch_id} ({job.status}); {len(leftover_tasks)} tasks without results.",
+            level="info" if not leftover_tasks else "warning",
+            event="batch_collected",
+            batch_id=job.batch_id,
+            batch_status=job.status,
+            num_leftover_tasks=len(leftover_tasks),
+        )
+
+    def resolve_duplicates(self) -> int:
+        # Copy each completed representative's result to the tasks that duplicate it.
+        # Duplicates of a skipped or failed representative take its status, so no
+        # duplicate waits forever; run_skipped / retry_failed make them duplicates again
+        def _resolved() -> Iterator[TaskSchema]:
+            for task in self.store.iter_tasks(TaskStatus.DUPLICATE):
+                representative = self.store.get(task.duplicate_of)
+                if representative.status == TaskStatus.COMPLETED:
+                    yield task.model_copy(
+                        update={
+                            "status": TaskStatus.COMPLETED,
+                            "output_text": representative.output_text,
+                            "output": representative.output,
+                        }
+                    )
+                elif representative.status in (TaskStatus.SKIPPED, TaskStatus.FAILED):
+                    yield task.model_copy(update={"status": representative.status})
+
+        num_resolved = self.store.put_many(_resolved())
+        self.store.flush()
+        return num_resolved
+
+    def refresh_progress(self) -> dict[str, int]:
+        # Task counts by status, read from the store all workers share
+        self.config.num_tasks = self.store.count()
+        self.config.task_counts = {
+            status.name: self.store.count(status) for status in TaskStatus
+        }
+        self._save_agent_config_to_disk()
+        return self.config.task_counts
+
+    async def retry_failed(self, **run_tasks_kwargs) -> TasksRunningResult:
+        # Re-queue failed tasks with fresh retry limits; their error history is kept.
+        # Failed duplicates wait for their representative's retry again
+        num_requeued = self.store.put_many(
+            task.model_copy(
+                update={
+                    "status": TaskStatus.PENDING,
+                    "attempts": 0,
+                    "retry_errors_from": len(task.errors),
+                }
+            )
+            if task.duplicate_of is None
+            else task.model_copy(update={"status": TaskStatus.DUPLICATE})
+            for task in self.store.iter_tasks(TaskStatus.FAILED)
+        )
+        self.store.flush()
+        self._log(
+            f"Re-queued {num_requeued} failed tasks.",
+            event="tasks_requeued",
+            num_tasks=num_requeued,
+        )
+        return await self.run_tasks(**run_tasks_kwargs)
+
+    async def run_skipped(self, **run_tasks_kwargs) -> TasksRunningResult:
+        # Run the tasks early stopping left out, e.g. when a saturation sample
+        # still turned up new concepts
+        num_requeued = self.store.put_many(
+            task.model_copy(
+                update={
+                    "status": TaskStatus.PENDING
+                    if task.duplicate_of is None
+                    else TaskStatus.DUPLICATE
+                }
+            )
+            for task in self.store.iter_tasks(TaskStatus.SKIPPED)
+        )
+        self.store.flush()
+        self._log(
+            f"Re-queued {num_requeued} skipped tasks.",
+            event="tasks_requeued",
+            num_tasks=num_requeued,
+        )
+        return await self.run_tasks(**run_tasks_kwargs)
+
     def _save_agent_config_to_disk(self) -> None:
         # Create the agents directory if it doesn't exist
         (self.data_dir / "agents").mkdir(parents=True, exist_ok=True)
-        # Save the agent config to disk
-        with open(self.data_dir / "agents" / f"{self.config.agent_id}.json", "w") as f:
+        # Write a temporary file and rename it over the config, so a crash leaves
+        # either the old or the new config; the name is per process for workers
+        path = self.data_dir / "agents" / f"{self.config.agent_id}.json"
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
             f.write(self.config.model_dump_json(indent=4))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
 
     def _load_agent_config_from_disk(self, agent_id: str) -> AgentConfig:
         assert (self.data_dir / "agents" / f"{agent_id}.json").exists(), (
@@ -257,36 +1350,73 @@ class BaseAgent(ABC):
             # model_validate_json expects a JSON string, not a Python dict
             return AgentConfig.model_validate_json(f.read())
 
-    def _save_task_to_disk(self, task: TaskSchema) -> None:
-        # Create the tasks directory if it doesn't exist
-        (self.data_dir / "tasks").mkdir(parents=True, exist_ok=True)
-        # Save the task to disk
-        with open(self.data_dir / "tasks" / f"{task.task_id}.json", "w") as f:
-            f.write(task.model_dump_json(indent=4))
-
-    def _load_task_from_disk(self, task_id: str) -> TaskSchema:
-        assert (self.data_dir / "tasks" / f"{task_id}.json").exists(), (
-            f"Task not found for task ID: {task_id}"
+    def _open_task_store(self, **store_kwargs) -> TaskStore:
+        # All tasks of this agent live in one indexed file
+        return SQLiteTaskStore(
+            self.data_dir / "tasks" / f"{self.config.agent_id}.db", **store_kwargs
         )
-        # Load the task from disk
-        with open(self.data_dir / "tasks" / f"{task_id}.json", "r") as f:
-            # model_validate_json expects a JSON string, not a Python dict
-            return TaskSchema.model_validate_json(f.read())
+
+    def _open_response_cache(self) -> ResponseCache:
+        # Shared by all agents so reruns with a new agent still hit
+        return ResponseCache(self.data_dir / "cache" / "responses.db")
 
     def _log(
-        self, message: str, level: Literal["info", "warning", "error"] = "info"
+        self,
+        message: str,
+        level: LogLevel = "info",
+        event: str = "message",
+        **fields,
     ) -> None:
-        # Persist agent-scoped logs to disk instead of printing to stdout
-        self.logs_dir.mkdir(parents=True, exist_ok=True)
-        timestamp = datetime.now().isoformat()
-        with open(
-            self.logs_dir / f"{self.config.agent_id}.log", "a", encoding="utf-8"
-        ) as f:
-            f.write(f"[{timestamp}] [{level.upper()}] {message}\n")
+        # Agent-scoped structured logs, written to disk off the event loop
+        self.logger.log(event, message, level, **fields)
 
     def _get_successful_tasks(self) -> list[TaskSchema]:
-        return [
-            self._load_task_from_disk(task_id)
-            for task_id in self.config.task_ids
-            if self._load_task_from_disk(task_id).status == TaskStatus.COMPLETED
-        ]
+        return list(self.store.iter_tasks(TaskStatus.COMPLETED))
+
+    def iter_extract_items(self) -> Iterator[ExtractItem]:
+        # Completed tasks streamed from the store, without rendering their prompts
+        for task in self.store.iter_tasks(TaskStatus.COMPLETED):
+            fields = (
+                json.loads(self.store.get_blob(task.context_id))
+                if task.context_id
+                else {}
+            )
+            fields.update(task.input_fields)
+            fields["task_id"] = task.task_id
+            if task.input_text is not None:
+                fields["input_text"] = task.input_text
+            # Outputs validated on arrival are already parsed; re-serialized they
+            # take the fast strict path
+            output_text = (
+                json.dumps(task.output, ensure_ascii=False)
+                if task.output is not None
+                else task.output_text
+            )
+            yield task.task_id, output_text, fields
+
+    def extract_results(
+        self,
+        output_path: Path,
+        extract_fn: ExtractFn = emit_parsed,
+        num_processes: Optional[int] = None,
+        chunk_size: int = 1000,
+    ) -> ExtractionResult:
+        """Parse every completed output and write the extracted records as JSON lines."""
+        result = extract_results(
+            self.iter_extract_items(),
+            output_path,
+            extract_fn,
+            num_processes=num_processes,
+            chunk_size=chunk_size,
+        )
+        self._log(
+            f"Extracted {result.num_records} records from {result.num_tasks} tasks "
+            f"into {output_path}.",
+            level="warning" if result.failures else "info",
+            event="results_extracted",
+            num_tasks=result.num_tasks,
+            num_records=result.num_records,
+            num_repaired=result.num_repaired,
+            failures=result.failures,
+        )
+        return result
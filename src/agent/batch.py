@@ -0,0 +1,265 @@
+import json
+import shutil
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import IO, Any, Callable, Iterable, Iterator, Optional
+
+import openai
+from pydantic import BaseModel, Field
+
+from .errors import kind_for_status
+from .schema import ErrorKind, TaskError
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+# Statuses after which a batch job no longer changes
+TERMINAL_BATCH_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+class BatchJob(BaseModel):
+    batch_id: str
+    status: str
+    output_file_id: Optional[str] = None
+    error_file_id: Optional[str] = None
+    errors: list[str] = Field(default_factory=list)
+
+
+class BatchTransport(ABC):
+    """Provider batch API: upload a JSONL request file, submit it, poll, download results."""
+
+    @abstractmethod
+    async def upload(self, path: Path) -> str: ...
+
+    @abstractmethod
+    async def create_batch(
+        self, input_file_id: str, endpoint: str, completion_window: str
+    ) -> str: ...
+
+    @abstractmethod
+    async def get_batch(self, batch_id: str) -> BatchJob: ...
+
+    @abstractmethod
+    async def download(self, file_id: str, path: Path) -> None: ...
+
+
+class OpenAIBatchTransport(BatchTransport):
+    def __init__(self, client: Optional[openai.AsyncOpenAI] = None) -> None:
+        self.client = client or openai.AsyncOpenAI()
+
+    async def upload(self, path: Path) -> str:
+        file = await self.client.files.create(file=path, purpose="batch")
+        return file.id
+
+    async def create_batch(
+        self, input_file_id: str, endpoint: str, completion_window: str
+    ) -> str:
+        batch = await self.client.batches.create(
+            input_file_id=input_file_id,
+            endpoint=endpoint,
+            completion_window=completion_window,
+        )
+        return batch.id
+
+    async def get_batch(self, batch_id: str) -> BatchJob:
+        batch = await self.client.batches.retrieve(batch_id)
+        return BatchJob(
+            batch_id=batch.id,
+            status=batch.status,
+            output_file_id=batch.output_file_id,
+            error_file_id=batch.error_file_id,
+            errors=[error.message or "" for error in (batch.errors.data or [])]
+            if batch.errors
+            else [],
+        )
+
+    async def download(self, file_id: str, path: Path) -> None:
+        # Result files can be hundreds of MB; stream them to disk
+        async with self.client.files.with_streaming_response.content(file_id) as response:
+            await response.stream_to_file(path)
+
+
+def _stub_responder(body: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model"),
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": "{}"},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+class LocalBatchTransport(BatchTransport):
+    """File-based stand-in for a batch service, for end-to-end runs without a provider.
+
+    Jobs are processed on the first poll after submission: `responder` maps each request
+    body to a chat completion body, and an exception it raises becomes an error line.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        responder: Callable[[dict[str, Any]], dict[str, Any]] = _stub_responder,
+    ) -> None:
+        self.root = root
+        self.responder = responder
+        (self.root / "files").mkdir(parents=True, exist_ok=True)
+        (self.root / "batches").mkdir(parents=True, exist_ok=True)
+
+    async def upload(self, path: Path) -> str:
+        file_id = f"file-{uuid.uuid4().hex}"
+        shutil.copyfile(path, self.root / "files" / file_id)
+        return file_id
+
+    async def create_batch(
+        self, input_file_id: str, endpoint: str, completion_window: str
+    ) -> str:
+        batch_id = f"batch-{uuid.uuid4().hex}"
+        self._write_job(
+            BatchJob(batch_id=batch_id, status="in_progress"), input_file_id
+        )
+        return batch_id
+
+    async def get_batch(self, batch_id: str) -> BatchJob:
+        with open(self.root / "batches" / f"{batch_id}.json", "r") as f:
+            state = json.load(f)
+        job = BatchJob.model_validate(state["job"])
+        if job.status == "in_progress":
+            job = self._process(job, state["input_file_id"])
+            self._write_job(job, state["input_file_id"])
+        return job
+
+    async def download(self, file_id: str, path: Path) -> None:
+        shutil.copyfile(self.root / "files" / file_id, path)
+
+    def _write_job(self, job: BatchJob, input_file_id: str) -> None:
+        with open(self.root / "batches" / f"{job.batch_id}.json", "w") as f:
+            json.dump({"job": job.model_dump(), "input_file_id": input_file_id}, f)
+
+    def _process(self, job: BatchJob, input_file_id: str) -> BatchJob:
+        output_file_id = f"file-{uuid.uuid4().hex}"
+        error_file_id = f"file-{uuid.uuid4().hex}"
+        num_errors = 0
+        with (
+            open(self.root / "files" / input_file_id, "r") as input_file,
+            open(self.root / "files" / output_file_id, "w") as output_file,
+            open(self.root / "files" / error_file_id, "w") as error_file,
+        ):
+            for line in input_file:
+                request = json.loads(line)
+                try:
+                    body = self.responder(request["body"])
+                except Exception as exc:
+                    num_errors += 1
+                    error_file.write(
+                        json.dumps(
+                            {
+                                "id": f"batch_req_{uuid.uuid4().hex}",
+                                "custom_id": request["custom_id"],
+                                "response": {"status_code": 500, "body": None},
+                                "error": {"code": "server_error", "message": str(exc)},
+                            }
+                        )
+                        + "\n"
+                    )
+                    continue
+                output_file.write(
+                    json.dumps(
+                        {
+                            "id": f"batch_req_{uuid.uuid4().hex}",
+                            "custom_id": request["custom_id"],
+                            "response": {"status_code": 200, "body": body},
+                            "error": None,
+                        }
+                    )
+                    + "\n"
+                )
+        return job.model_copy(
+            update={
+                "status": "completed",
+                "output_file_id": output_file_id,
+                "error_file_id": error_file_id if num_errors else None,
+            }
+        )
+
+
+def write_batch_files(
+    requests: Iterable[tuple[str, str, str]],
+    model_params: dict[str, Any],
+    batch_dir: Path,
+    max_requests: int = 50_000,
+    max_bytes: int = 190 * 1024 * 1024,
+) -> Iterator[tuple[Path, list[str]]]:
+    """Serialize `(task_id, input_text, model)` requests into batch files.
+
+    Yields each file with its task IDs as soon as it reaches the provider's
+    request-count or size limit, so files can be submitted while later ones are written.
+    """
+    body_params = {k: v for k, v in model_params.items() if k != "stream"}
+    batch_dir.mkdir(parents=True, exist_ok=True)
+
+    def _open_file() -> tuple[Path, IO[bytes]]:
+        path = batch_dir / f"requests-{uuid.uuid4().hex}.jsonl"
+        return path, open(path, "wb")
+
+    path, f = _open_file()
+    task_ids: list[str] = []
+    num_bytes = 0
+    try:
+        for task_id, input_text, model in requests:
+            line = (
+                json.dumps(
+                    {
+                        "custom_id": task_id,
+                        "method": "POST",
+                        "url": BATCH_ENDPOINT,
+                        "body": {
+                            **body_params,
+                            "model": model,
+                            "messages": [{"role": "user", "content": input_text}],
+                        },
+                    },
+                    ensure_ascii=False,
+                )
+                + "\n"
+            ).encode("utf-8")
+            if task_ids and (
+                len(task_ids) >= max_requests or num_bytes + len(line) > max_bytes
+            ):
+                f.close()
+                yield path, task_ids
+                path, f = _open_file()
+                task_ids, num_bytes = [], 0
+            f.write(line)
+            task_ids.append(task_id)
+            num_bytes += len(line)
+    finally:
+        f.close()
+
+    if task_ids:
+        yield path, task_ids
+    else:
+        path.unlink()
+
+
+def parse_batch_result(
+    record: dict[str, Any],
+) -> tuple[Optional[str], Optional[TaskError]]:
+    # One line of a batch output or error file -> (output_text, error)
+    response = record.get("response") or {}
+    status_code = response.get("status_code")
+    if record.get("error") is None and status_code == 200:
+        return response["body"]["choices"][0]["message"]["content"], None
+    return None, TaskError(
+        kind=kind_for_status(status_code) if status_code else ErrorKind.OTHER,
+        error_class="BatchRequestError",
+        message=json.dumps(record.get("error") or response.get("body")),
+        status_code=status_code,
+    )
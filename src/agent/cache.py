@@ -0,0 +1,119 @@
+import atexit
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+
+class ResponseCache:
+    """Persistent LLM response cache keyed by a hash of model, generation params and prompt.
+
+    Entries older than `max_age_secs` are dropped, and the least recently used entries
+    are evicted once the stored responses exceed `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = 1 << 30,
+        max_age_secs: float = 30 * 24 * 3600,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_secs = max_age_secs
+        self.hits = 0
+        self.misses = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at);
+            CREATE INDEX IF NOT EXISTS idx_responses_created_at ON responses (created_at);
+            """
+        )
+        self._conn.execute(
+            "DELETE FROM responses WHERE created_at < ?",
+            (time.time() - self.max_age_secs,),
+        )
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        self._closed = False
+        atexit.register(self.close)
+
+    @staticmethod
+    def make_key(model_params: dict[str, Any], input_text: str) -> str:
+        payload = json.dumps(
+            {"params": model_params, "input": input_text},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] < now - self.max_age_secs:
+            self.misses += 1
+            return None
+        self._conn.execute(
+            "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+        )
+        self.hits += 1
+        return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        previous = self._conn.execute(
+            "SELECT size FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        self._conn.execute(
+            """
+            INSERT OR REPLACE INTO responses (key, response, size, created_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (key, response, size, now, now),
+        )
+        self._total_bytes += size - (previous[0] if previous else 0)
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._conn.close()
+        self._closed = True
+        atexit.unregister(self.close)
+
+    def _evict(self) -> None:
+        # Drop least recently used entries until 90% of the budget is free again
+        target_bytes = int(self.max_bytes * 0.9)
+        self._conn.execute("BEGIN")
+        cursor = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at"
+        )
+        evicted_keys = []
+        for key, size in cursor:
+            if self._total_bytes <= target_bytes:
+                break
+            evicted_keys.append((key,))
+            self._total_bytes -= size
+        cursor.close()
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted_keys)
+        self._conn.execute("COMMIT")
@@ -2,11 +2,12 @@ import asyncio
 from pathlib import Path
 from typing import Optional
 
-from langchain_openai import ChatOpenAI
 from . import AgentType, BaseAgent
 
 
 class CodingAgent(BaseAgent):
+    model = "gpt-4o-mini"
+
     def __init__(
         self,
         agent_id: Optional[str] = None,
@@ -20,9 +21,6 @@ class CodingAgent(BaseAgent):
             data_dir=data_dir,
         )
 
-    def get_llm(self) -> ChatOpenAI:
-        return ChatOpenAI(model="gpt-4o-mini")
-
 
 if __name__ == "__main__":
     input_texts = [
@@ -0,0 +1,124 @@
+import hashlib
+import re
+import unicodedata
+import zlib
+from typing import Optional
+
+import numpy as np
+
+_URL_PATTERN = re.compile(r"https?://\S+|www\.\S+")
+_NON_WORD_PATTERN = re.compile(r"[\W_]+")
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def normalize_text(text: str) -> str:
+    # Case, punctuation, whitespace and link targets do not change what a comment says
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _URL_PATTERN.sub(" url ", text)
+    return _NON_WORD_PATTERN.sub(" ", text).strip()
+
+
+class Deduplicator:
+    """Streaming exact and near-duplicate detection over item texts.
+
+    Exact duplicates are found by a hash of the normalized text. Texts of at least
+    `min_words` words are also MinHashed over word shingles and indexed with LSH
+    (`num_bands` bands of `num_perm // num_bands` rows); a candidate from the index is a
+    near duplicate when its estimated Jaccard similarity reaches `threshold`. Only
+    representatives are kept in memory, so memory grows with the number of distinct
+    texts rather than the number of items.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        num_bands: int = 16,
+        shingle_size: int = 3,
+        min_words: int = 5,
+        seed: int = 1,
+    ) -> None:
+        if num_perm % num_bands:
+            raise ValueError("num_perm must be a multiple of num_bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.num_bands = num_bands
+        self.shingle_size = shingle_size
+        self.min_words = min_words
+        self.num_items = 0
+        self.num_exact_duplicates = 0
+        self.num_near_duplicates = 0
+
+        rng = np.random.default_rng(seed)
+        # Multipliers below 2**32 keep (hash * a + b) within uint64
+        self._a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._rows = num_perm // num_bands
+        self._exact_index: dict[bytes, str] = {}
+        self._bands: list[dict[int, str]] = [{} for _ in range(num_bands)]
+        self._signatures: dict[str, np.ndarray] = {}
+
+    @property
+    def num_duplicates(self) -> int:
+        return self.num_exact_duplicates + self.num_near_duplicates
+
+    def add(
+        self,
+        item_id: str,
+        text: str,
+        scope: str = "",
+        near_scope: Optional[str] = None,
+    ) -> Optional[str]:
+        """Index an item; returns the ID of the representative it duplicates, if any.
+
+        Items only match others with the same `scope`, e.g. the same prompt template.
+        Near duplicates must also share `near_scope` (by default `scope`), e.g. the
+        same post when a reply quoting a comment should not take over its labels.
+        """
+        if near_scope is None:
+            near_scope = scope
+        self.num_items += 1
+        normalized = normalize_text(text)
+        exact_key = hashlib.blake2b(
+            f"{scope}\0{normalized}".encode("utf-8"), digest_size=8
+        ).digest()
+        if (representative_id := self._exact_index.get(exact_key)) is not None:
+            self.num_exact_duplicates += 1
+            return representative_id
+        self._exact_index[exact_key] = item_id
+
+        words = normalized.split()
+        if len(words) < self.min_words:
+            return None
+        signature = self._signature(words)
+        band_keys = [
+            hash((near_scope, band, rows.tobytes()))
+            for band, rows in enumerate(signature.reshape(self.num_bands, self._rows))
+        ]
+        for band, band_key in enumerate(band_keys):
+            candidate_id = self._bands[band].get(band_key)
+            if candidate_id is None:
+                continue
+            similarity = float(np.mean(self._signatures[candidate_id] == signature))
+            if similarity >= self.threshold:
+                self.num_near_duplicates += 1
+                return candidate_id
+
+        self._signatures[item_id] = signature
+        for band, band_key in enumerate(band_keys):
+            self._bands[band].setdefault(band_key, item_id)
+        return None
+
+    def _signature(self, words: list[str]) -> np.ndarray:
+        shingles = {
+            " ".join(words[i : i + self.shingle_size])
+            for i in range(max(1, len(words) - self.shingle_size + 1))
+        }
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        permuted = (hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
@@ -0,0 +1,69 @@
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+import httpx
+import openai
+
+from .schema import ErrorKind, TaskError
+
+
+def classify_error(exc: BaseException) -> TaskError:
+    status_code = getattr(exc, "status_code", None)
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+
+    if isinstance(exc, openai.RateLimitError):
+        kind = ErrorKind.RATE_LIMIT
+    elif status_code is not None:
+        kind = kind_for_status(status_code)
+    elif isinstance(
+        exc, (openai.APITimeoutError, httpx.TimeoutException, asyncio.TimeoutError)
+    ):
+        kind = ErrorKind.TIMEOUT
+    elif isinstance(
+        exc, (openai.APIConnectionError, httpx.TransportError, ConnectionError)
+    ):
+        kind = ErrorKind.CONNECTION
+    else:
+        kind = ErrorKind.OTHER
+
+    return TaskError(
+        kind=kind,
+        error_class=type(exc).__name__,
+        message=str(exc),
+        status_code=status_code,
+        retry_after=parse_retry_after(headers),
+    )
+
+
+def kind_for_status(status_code: int) -> ErrorKind:
+    if status_code == 429:
+        return ErrorKind.RATE_LIMIT
+    if status_code in (408, 504):
+        return ErrorKind.TIMEOUT
+    if status_code >= 500:
+        return ErrorKind.SERVER
+    if 400 <= status_code < 500:
+        return ErrorKind.CLIENT
+    return ErrorKind.OTHER
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> Optional[float]:
+    # OpenAI sends retry-after-ms; the standard header is seconds or an HTTP date
+    if (retry_after_ms := headers.get("retry-after-ms")) is not None:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+    if (retry_after := headers.get("retry-after")) is not None:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    return None
@@ -0,0 +1,148 @@
+import json
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from json_repair import repair_json
+
+from .schema import ExtractionResult
+
+# (task id, output text, fields of the task's input: context fields, input fields and
+# `input_text` for tasks stored with a full prompt)
+ExtractItem = tuple[str, Optional[str], dict[str, Any]]
+# Maps a parsed output and its task's fields to the records to write; runs in worker
+# processes, so it must be a module-level function
+ExtractFn = Callable[[Any, dict[str, Any]], Iterable[Any]]
+
+_FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+
+class ParseOutcome(Enum):
+    STRICT = "strict"  # Valid JSON as returned
+    REPAIRED = "repaired"  # Needed json_repair
+    EMPTY = "empty"
+    INVALID = "invalid_json"  # Not even json_repair found a JSON value
+
+
+def parse_output(output_text: Optional[str]) -> tuple[Any, ParseOutcome]:
+    """Parse a model output, trying strict JSON before the much slower json_repair."""
+    text = (output_text or "").strip()
+    if fenced := _FENCE_PATTERN.search(text):
+        text = fenced.group(1).strip()
+    if not text:
+        return None, ParseOutcome.EMPTY
+    try:
+        return json.loads(text), ParseOutcome.STRICT
+    except json.JSONDecodeError:
+        pass
+    repaired = repair_json(text)
+    if not repaired or repaired == '""':
+        return None, ParseOutcome.INVALID
+    return json.loads(repaired), ParseOutcome.REPAIRED
+
+
+def emit_parsed(parsed: Any, fields: dict[str, Any]) -> Iterable[Any]:
+    return [parsed]
+
+
+def _extract_chunk(
+    items: list[ExtractItem], extract_fn: ExtractFn
+) -> tuple[list[str], Counter]:
+    # Returns serialized lines so the parent process only writes them
+    lines: list[str] = []
+    counts: Counter = Counter()
+    for _, output_text, fields in items:
+        parsed, outcome = parse_output(output_text)
+        counts[outcome.value] += 1
+        if parsed is None:
+            continue
+        try:
+            records = [
+                json.dumps(record, ensure_ascii=False)
+                for record in extract_fn(parsed, fields)
+            ]
+        except Exception as e:
+            # E.g. KeyError for a missing field, TypeError for a list instead of an object
+            counts[f"extract:{type(e).__name__}"] += 1
+            continue
+        counts["records"] += len(records)
+        lines.extend(records)
+    return lines, counts
+
+
+def _chunks(items: Iterable[ExtractItem], size: int) -> Iterator[list[ExtractItem]]:
+    chunk: list[ExtractItem] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def extract_results(
+    items: Iterable[ExtractItem],
+    output_path: Path,
+    extract_fn: ExtractFn = emit_parsed,
+    num_processes: Optional[int] = None,
+    chunk_size: int = 1000,
+) -> ExtractionResult:
+    """Parse outputs in a process pool and write the extracted records as JSON lines.
+
+    Items are read and written chunk by chunk with a bounded number of chunks in
+    flight, so memory stays flat however many tasks there are. Records keep the order
+    of `items`. The file is written next to `output_path` and renamed when complete.
+    """
+    num_processes = num_processes or os.cpu_count() or 1
+    started_at = time.perf_counter()
+    counts: Counter = Counter()
+    num_tasks = 0
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+
+    with open(tmp_path, "w") as f:
+
+        def _write(lines: list[str], chunk_counts: Counter) -> None:
+            counts.update(chunk_counts)
+            if lines:
+                f.write("\n".join(lines) + "\n")
+
+        if num_processes == 1:
+            for chunk in _chunks(items, chunk_size):
+                num_tasks += len(chunk)
+                _write(*_extract_chunk(chunk, extract_fn))
+        else:
+            with ProcessPoolExecutor(max_workers=num_processes) as executor:
+                pending: list[Future] = []
+                for chunk in _chunks(items, chunk_size):
+                    num_tasks += len(chunk)
+                    pending.append(executor.submit(_extract_chunk, chunk, extract_fn))
+                    if len(pending) >= 2 * num_processes:
+                        _write(*pending.pop(0).result())
+                for future in pending:
+                    _write(*future.result())
+    os.replace(tmp_path, output_path)
+
+    num_records = counts.pop("records", 0)
+    return ExtractionResult(
+        output_path=output_path,
+        num_tasks=num_tasks,
+        num_records=num_records,
+        num_strict=counts.pop(ParseOutcome.STRICT.value, 0),
+        num_repaired=counts.pop(ParseOutcome.REPAIRED.value, 0),
+        failures=dict(sorted(counts.items())),
+        elapsed_secs=time.perf_counter() - started_at,
+    )
+
+
+def read_jsonl(path: Path) -> Iterator[Any]:
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
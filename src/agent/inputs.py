@@ -0,0 +1,103 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import IO, Iterator, Literal, Optional, Union
+
+from pydantic import BaseModel, Field
+
+
+class TemplateRecord(BaseModel):
+    type: Literal["template"] = "template"
+    id: str
+    text: str
+
+
+class ContextRecord(BaseModel):
+    # Fields shared by many inputs, e.g. the post a comment belongs to
+    type: Literal["context"] = "context"
+    id: str
+    fields: dict[str, str]
+
+
+class ItemRecord(BaseModel):
+    # One prompt: template + context + its own fields, rendered at dispatch time
+    type: Literal["item"] = "item"
+    id: str
+    template: str
+    context: Optional[str] = None
+    fields: dict[str, str] = Field(default_factory=dict)
+
+
+InputRecord = Union[TemplateRecord, ContextRecord, ItemRecord]
+
+
+def content_id(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class InputWriter:
+    """Streams the compact JSONL input format.
+
+    Each template and context is written once, before the first item that references
+    it, so a reader can resolve references in a single pass.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.num_items = 0
+        self._written_ids: set[str] = set()
+        self._file: Optional[IO[str]] = None
+
+    def __enter__(self) -> "InputWriter":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "w", encoding="utf-8")
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._file.close()
+
+    def add_template(self, text: str) -> str:
+        template_id = f"template-{content_id(text)}"
+        self._write_once(TemplateRecord(id=template_id, text=text))
+        return template_id
+
+    def add_context(self, context_id: str, fields: dict[str, str]) -> str:
+        self._write_once(ContextRecord(id=context_id, fields=fields))
+        return context_id
+
+    def add_item(
+        self,
+        item_id: str,
+        template_id: str,
+        context_id: Optional[str] = None,
+        fields: Optional[dict[str, str]] = None,
+    ) -> None:
+        self._write(
+            ItemRecord(
+                id=item_id, template=template_id, context=context_id, fields=fields or {}
+            )
+        )
+        self.num_items += 1
+
+    def _write_once(self, record: Union[TemplateRecord, ContextRecord]) -> None:
+        if record.id in self._written_ids:
+            return
+        self._written_ids.add(record.id)
+        self._write(record)
+
+    def _write(self, record: InputRecord) -> None:
+        self._file.write(record.model_dump_json() + "\n")
+
+
+def read_inputs(path: Path) -> Iterator[InputRecord]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if data["type"] == "template":
+                yield TemplateRecord.model_validate(data)
+            elif data["type"] == "context":
+                yield ContextRecord.model_validate(data)
+            else:
+                yield ItemRecord.model_validate(data)
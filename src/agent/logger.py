@@ -0,0 +1,112 @@
+import atexit
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterator, Literal, Optional
+
+LogLevel = Literal["info", "warning", "error"]
+
+
+class AgentLogger:
+    """Buffered JSONL logger whose file writes happen on a background thread.
+
+    `log` only appends a record to an in-memory buffer, so callers on the event loop
+    never block on disk. The writer thread appends the buffer to the file every
+    `flush_interval` seconds, or as soon as `buffer_size` records are pending, and the
+    file stays open between writes. Pending records are written by `flush`, `close`
+    and at interpreter exit.
+    """
+
+    def __init__(
+        self, path: Path, buffer_size: int = 1000, flush_interval: float = 1.0
+    ) -> None:
+        self.path = path
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+
+        self._buffer: list[str] = []
+        self._lock = threading.Lock()
+        # Serializes file writes between the writer thread and explicit flushes
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._file = None
+        self._writer = threading.Thread(
+            target=self._run, name=f"agent-logger-{path.stem}", daemon=True
+        )
+        self._writer.start()
+        atexit.register(self.close)
+
+    def log(
+        self,
+        event: str,
+        message: str,
+        level: LogLevel = "info",
+        **fields: Any,
+    ) -> None:
+        record = {
+            "timestamp": datetime.now().isoformat(),
+            "level": level,
+            "event": event,
+            "message": message,
+            **{name: value for name, value in fields.items() if value is not None},
+        }
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._buffer.append(line)
+            num_pending = len(self._buffer)
+        if num_pending >= self.buffer_size:
+            self._wakeup.set()
+
+    def flush(self) -> None:
+        with self._write_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+            if not lines:
+                return
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write("".join(lines))
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join()
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        atexit.unregister(self.close)
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+def read_logs(
+    path: Path,
+    event: Optional[str] = None,
+    level: Optional[LogLevel] = None,
+    **fields: Any,
+) -> Iterator[dict[str, Any]]:
+    """Yield records of a JSONL log file matching every given filter.
+
+    For example, all rate-limit failures of an agent:
+    `read_logs(path, event="task_failed", error_class="RateLimitError")`.
+    """
+    filters = {"event": event, "level": level, **fields}
+    filters = {name: value for name, value in filters.items() if value is not None}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if all(record.get(name) == value for name, value in filters.items()):
+                yield record
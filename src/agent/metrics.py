@@ -0,0 +1,191 @@
+import asyncio
+import os
+import time
+from array import array
+from pathlib import Path
+from typing import Callable, Optional
+
+from .schema import RunMetricsSummary
+
+# USD per 1M (prompt, completion) tokens
+MODEL_PRICES: dict[str, tuple[float, float]] = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    # Unknown models are reported as free rather than guessed
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+
+def _percentile(values: array, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class RunMetrics:
+    """Request-level measurements of one run_tasks call.
+
+    Time is split into queue wait (task queued until a worker picks it up), throttle
+    wait (concurrency slot, rate-limit quota and Retry-After pauses), request latency
+    (the LLM call itself) and backoff (delays before retries).
+    """
+
+    def __init__(self) -> None:
+        self.started_at = time.monotonic()
+        self.latencies = array("d")
+        self.queue_waits = array("d")
+        self.num_requests = 0
+        self.num_failed_requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.throttle_wait_secs = 0.0
+        self.backoff_wait_secs = 0.0
+
+    def record_request(
+        self,
+        latency: float,
+        throttle_wait: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cost_usd: float = 0.0,
+        failed: bool = False,
+    ) -> None:
+        self.num_requests += 1
+        self.num_failed_requests += failed
+        self.latencies.append(latency)
+        self.throttle_wait_secs += throttle_wait
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cost_usd += cost_usd
+
+    def record_queue_wait(self, queue_wait: float) -> None:
+        self.queue_waits.append(queue_wait)
+
+    def record_backoff(self, delay: float) -> None:
+        self.backoff_wait_secs += delay
+
+    def summary(self, num_tasks_completed: int) -> RunMetricsSummary:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return RunMetricsSummary(
+            num_requests=self.num_requests,
+            num_failed_requests=self.num_failed_requests,
+            latency_p50=_percentile(self.latencies, 0.50),
+            latency_p95=_percentile(self.latencies, 0.95),
+            latency_p99=_percentile(self.latencies, 0.99),
+            queue_wait_p50=_percentile(self.queue_waits, 0.50),
+            queue_wait_p95=_percentile(self.queue_waits, 0.95),
+            queue_wait_p99=_percentile(self.queue_waits, 0.99),
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            tokens_per_sec=(self.prompt_tokens + self.completion_tokens) / elapsed,
+            cost_usd=self.cost_usd,
+            cost_per_1k_tasks=self.cost_usd / num_tasks_completed * 1000
+            if num_tasks_completed
+            else 0.0,
+            throttle_wait_secs=self.throttle_wait_secs,
+            backoff_wait_secs=self.backoff_wait_secs,
+        )
+
+    def to_prometheus(
+        self, agent_id: str, gauges: Optional[dict[str, float]] = None
+    ) -> str:
+        """Render in the Prometheus text exposition format."""
+        label = f'agent_id="{agent_id}"'
+        lines = []
+
+        def _metric(name: str, kind: str, value: float, help_text: str) -> None:
+            lines.append(f"# HELP agent_{name} {help_text}")
+            lines.append(f"# TYPE agent_{name} {kind}")
+            lines.append(f"agent_{name}{{{label}}} {value}")
+
+        def _summary(name: str, values: array, help_text: str) -> None:
+            lines.append(f"# HELP agent_{name} {help_text}")
+            lines.append(f"# TYPE agent_{name} summary")
+            for q in (0.5, 0.95, 0.99):
+                lines.append(
+                    f'agent_{name}{{{label},quantile="{q}"}} {_percentile(values, q)}'
+                )
+            lines.append(f"agent_{name}_sum{{{label}}} {sum(values)}")
+            lines.append(f"agent_{name}_count{{{label}}} {len(values)}")
+
+        _summary("request_latency_seconds", self.latencies, "LLM request latency.")
+        _summary(
+            "queue_wait_seconds", self.queue_waits, "Time from queued to picked up."
+        )
+        _metric("requests_total", "counter", self.num_requests, "LLM requests sent.")
+        _metric(
+            "failed_requests_total",
+            "counter",
+            self.num_failed_requests,
+            "LLM requests that raised.",
+        )
+        _metric(
+            "prompt_tokens_total", "counter", self.prompt_tokens, "Prompt tokens used."
+        )
+        _metric(
+            "completion_tokens_total",
+            "counter",
+            self.completion_tokens,
+            "Completion tokens used.",
+        )
+        _metric("cost_usd_total", "counter", self.cost_usd, "Estimated cost in USD.")
+        _metric(
+            "throttle_wait_seconds_total",
+            "counter",
+            self.throttle_wait_secs,
+            "Time spent waiting for concurrency slots, rate limits and Retry-After.",
+        )
+        _metric(
+            "backoff_wait_seconds_total",
+            "counter",
+            self.backoff_wait_secs,
+            "Delays scheduled before retries.",
+        )
+        for name, value in (gauges or {}).items():
+            _metric(name, "gauge", value, name.replace("_", " ").capitalize() + ".")
+        return "\n".join(lines) + "\n"
+
+
+def write_metrics_file(path: Path, text: str) -> None:
+    # Replace atomically so scrapers never read a half-written file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+async def serve_metrics(
+    render: Callable[[], str], port: int, host: str = "127.0.0.1"
+) -> asyncio.Server:
+    """Serve `render()` as Prometheus text on http://host:port/metrics."""
+
+    async def _handle(
+        reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = render().encode("utf-8")
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4\r\n"
+                + f"Content-Length: {len(body)}\r\n".encode()
+                + b"Connection: close\r\n\r\n"
+                + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(_handle, host, port)
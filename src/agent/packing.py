@@ -0,0 +1,60 @@
+import json
+from typing import Any, Optional
+
+from .extract import parse_output
+
+PACKED_FIELD_PLACEHOLDER = '(see the items under "Multiple Items" below)'
+
+PACK_INSTRUCTIONS = """
+## Multiple Items
+This request contains {num_items} items that share the context above. Apply the instructions above to each item independently; do not let one item influence the coding of another.
+
+{items}
+
+## Output Format (Multiple Items)
+Return ONLY a JSON object whose keys are the item ids ({item_ids}) and whose values are the JSON object described in "Output Format" above for that item. Include every item id exactly once.
+"""
+
+
+def pack_prompt(
+    template: str,
+    context_fields: dict[str, str],
+    items: list[tuple[str, dict[str, str]]],
+) -> str:
+    """Render one prompt for several items sharing a template and context.
+
+    The template is rendered once with the per-item fields replaced by a pointer to the
+    item list, so the instructions and shared context are sent once for all items.
+    """
+    item_field_names = {name for _, fields in items for name in fields}
+    shared_prompt = template.format(
+        **context_fields,
+        **{name: PACKED_FIELD_PLACEHOLDER for name in item_field_names},
+    )
+    item_blocks = "\n\n".join(
+        f"### Item `{item_id}`\n"
+        + "\n".join(f"- {name}: {value}" for name, value in fields.items())
+        for item_id, fields in items
+    )
+    return shared_prompt + PACK_INSTRUCTIONS.format(
+        num_items=len(items),
+        items=item_blocks,
+        item_ids=", ".join(f'"{item_id}"' for item_id, _ in items),
+    )
+
+
+def unpack_response(output_text: str, item_ids: list[str]) -> dict[str, str]:
+    # Map each item id found in the response to its own JSON output text
+    parsed = _parse_json_object(output_text)
+    if parsed is None:
+        return {}
+    return {
+        item_id: json.dumps(parsed[item_id], ensure_ascii=False)
+        for item_id in item_ids
+        if isinstance(parsed.get(item_id), (dict, list))
+    }
+
+
+def _parse_json_object(output_text: str) -> Optional[dict[str, Any]]:
+    parsed, _ = parse_output(output_text)
+    return parsed if isinstance(parsed, dict) else None
@@ -0,0 +1,339 @@
+import asyncio
+import functools
+import math
+import random
+import time
+import warnings
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import Enum, auto
+from typing import Any, AsyncIterator, Optional
+
+from pydantic import BaseModel, Field
+
+from .errors import classify_error
+from .schema import ErrorKind, TaskError
+
+# Errors that signal the provider is overloaded rather than a bad request
+OVERLOAD_ERROR_KINDS = (ErrorKind.RATE_LIMIT, ErrorKind.SERVER, ErrorKind.TIMEOUT)
+
+
+class RetryPolicy(BaseModel):
+    max_attempts: int  # Including the first attempt
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        # Exponential backoff with full jitter, never earlier than Retry-After
+        backoff = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return max(random.uniform(0, backoff), retry_after or 0.0)
+
+
+DEFAULT_RETRY_POLICIES: dict[ErrorKind, RetryPolicy] = {
+    ErrorKind.RATE_LIMIT: RetryPolicy(max_attempts=8, base_delay=2.0),
+    ErrorKind.SERVER: RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=30.0),
+    ErrorKind.TIMEOUT: RetryPolicy(max_attempts=4, base_delay=2.0),
+    ErrorKind.CONNECTION: RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=30.0),
+    ErrorKind.CLIENT: RetryPolicy(max_attempts=1),
+    # Already re-asked with a corrective prompt; see BaseAgent.max_reasks
+    ErrorKind.INVALID_OUTPUT: RetryPolicy(max_attempts=1),
+    ErrorKind.OTHER: RetryPolicy(max_attempts=2, base_delay=1.0, max_delay=10.0),
+}
+
+
+class RetryBudget:
+    """Earns `ratio` retries per first attempt, holding at most `max_balance` unspent.
+
+    During a provider outage nearly every request fails; the budget then runs dry and
+    failed tasks stay failed instead of multiplying the load on the provider.
+    """
+
+    def __init__(
+        self, ratio: float = 0.2, min_retries: int = 10, max_balance: int = 100
+    ) -> None:
+        self.ratio = ratio
+        self.max_balance = float(max(max_balance, min_retries))
+        self._balance = float(min_retries)
+
+    def record_attempt(self) -> None:
+        self._balance = min(self.max_balance, self._balance + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self._balance < 1.0:
+            return False
+        self._balance -= 1.0
+        return True
+
+
+def estimate_tokens(text: str) -> int:
+    # Rough upper bound for English prose with OpenAI tokenizers (~4 chars per token)
+    return max(1, math.ceil(len(text) / 4))
+
+
+@functools.cache
+def _encoding(name: str) -> Optional[Any]:
+    # tiktoken (installed with langchain-openai) downloads the BPE file on first use;
+    # offline and without a cached copy, token counts fall back to the estimate
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        warnings.warn(f"Tokenizer {name} unavailable ({e}); estimating token counts")
+        return None
+
+
+def count_tokens(text: str, encoding: str = "o200k_base") -> int:
+    # Exact count with a local tokenizer, where estimate_tokens is too coarse
+    tokenizer = _encoding(encoding)
+    if tokenizer is None:
+        return estimate_tokens(text)
+    return len(tokenizer.encode(text, disallowed_special=()))
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `rate` tokens per second.
+
+    A request larger than the bucket capacity is admitted once the bucket is full
+    and drives the balance negative, so oversized requests are delayed rather than starved.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        # The lock makes waiters queue in FIFO order
+        async with self._lock:
+            needed = min(amount, self.capacity)
+            while True:
+                self._refill()
+                if self._tokens >= needed:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((needed - self._tokens) / self.rate)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute quota shared by all workers of a run."""
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        burst_seconds: float = 1.0,
+    ) -> None:
+        # Providers enforce per-minute quotas over short windows, so only allow
+        # `burst_seconds` worth of quota to accumulate
+        self._request_bucket = (
+            TokenBucket(
+                rate=requests_per_minute / 60,
+                capacity=max(1.0, requests_per_minute / 60 * burst_seconds),
+            )
+            if requests_per_minute
+            else None
+        )
+        self._token_bucket = (
+            TokenBucket(
+                rate=tokens_per_minute / 60,
+                capacity=max(1.0, tokens_per_minute / 60 * burst_seconds),
+            )
+            if tokens_per_minute
+            else None
+        )
+
+    async def acquire(self, num_tokens: int) -> None:
+        if self._request_bucket is not None:
+            await self._request_bucket.acquire(1)
+        if self._token_bucket is not None:
+            await self._token_bucket.acquire(num_tokens)
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limit on inflight requests.
+
+    The limit grows by one after every window of `limit` successful requests whose p95
+    latency stays within `latency_tolerance` of the best p95 seen, and is cut by
+    `decrease_factor` on rate-limit, 5xx and timeout errors or a latency blow-up.
+    `Retry-After` hints pause all new requests until they expire.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int,
+        max_limit: int,
+        min_limit: int = 1,
+        adaptive: bool = True,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+        latency_window: int = 100,
+        rate_limit_pause_secs: float = 1.0,
+    ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = max(min_limit, min(initial_limit, max_limit))
+        self.adaptive = adaptive
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.rate_limit_pause_secs = rate_limit_pause_secs
+        self.inflight = 0
+
+        self._condition = asyncio.Condition()
+        self._resume_at = 0.0
+        self._latencies: deque[float] = deque(maxlen=latency_window)
+        self._baseline_p95: Optional[float] = None
+        self._successes_since_change = 0
+        self._overloads_since_change = 0
+        self._last_decrease_at = 0.0
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            while True:
+                pause = self._resume_at - time.monotonic()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), pause)
+                    except TimeoutError:
+                        pass
+                elif self.inflight < self.limit:
+                    break
+                else:
+                    await self._condition.wait()
+            self.inflight += 1
+
+    async def release(
+        self,
+        latency: float,
+        error: Optional[TaskError] = None,
+        cancelled: bool = False,
+    ) -> None:
+        # A cancelled call (shutdown, timeout, lost lease) says nothing about the
+        # provider, so it only frees its slot
+        async with self._condition:
+            self.inflight -= 1
+            now = time.monotonic()
+            if error is None and not cancelled:
+                self._on_success(latency, now)
+            elif error is not None and error.kind in OVERLOAD_ERROR_KINDS:
+                self._on_overload(error, now)
+            self._condition.notify_all()
+
+    def _on_success(self, latency: float, now: float) -> None:
+        self._latencies.append(latency)
+        self._successes_since_change += 1
+        if not self.adaptive or self._successes_since_change < self.limit:
+            return
+
+        healthy = self._overloads_since_change == 0
+        if len(self._latencies) >= 10:
+            p95 = sorted(self._latencies)[int(len(self._latencies) * 0.95) - 1]
+            # Let the baseline creep up so a permanently slower provider is tolerated
+            self._baseline_p95 = (
+                p95
+                if self._baseline_p95 is None
+                else min(p95, self._baseline_p95 * 1.01)
+            )
+            healthy = healthy and p95 <= self._baseline_p95 * self.latency_tolerance
+
+        if healthy:
+            self.limit = min(self.max_limit, self.limit + 1)
+        else:
+            self._decrease(now)
+        self._successes_since_change = 0
+        self._overloads_since_change = 0
+
+    def _on_overload(self, error: TaskError, now: float) -> None:
+        self._overloads_since_change += 1
+        if error.retry_after is not None:
+            self._resume_at = max(self._resume_at, now + error.retry_after)
+        elif error.kind == ErrorKind.RATE_LIMIT:
+            self._resume_at = max(self._resume_at, now + self.rate_limit_pause_secs)
+        if self.adaptive:
+            self._decrease(now)
+
+    def _decrease(self, now: float) -> None:
+        # Requests already inflight when the limit was cut fail together; count them once
+        cooldown = self._baseline_p95 or 1.0
+        if now - self._last_decrease_at < cooldown:
+            return
+        self.limit = max(self.min_limit, int(self.limit * self.decrease_factor))
+        self._last_decrease_at = now
+        self._successes_since_change = 0
+
+
+class Throttle:
+    """Gate around each network call: concurrency slot, then rate-limit quota."""
+
+    def __init__(
+        self, rate_limiter: RateLimiter, concurrency: AdaptiveConcurrencyLimiter
+    ) -> None:
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+
+    @asynccontextmanager
+    async def slot(self, num_tokens: int) -> AsyncIterator[None]:
+        await self.concurrency.acquire()
+        error = None
+        cancelled = False
+        started_at = time.monotonic()
+        try:
+            await self.rate_limiter.acquire(num_tokens)
+            started_at = time.monotonic()
+            yield
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        except Exception as exc:
+            error = classify_error(exc)
+            raise
+        finally:
+            await self.concurrency.release(
+                time.monotonic() - started_at, error, cancelled=cancelled
+            )
+
+
+class TaskOrder(Enum):
+    CREATED = auto()  # Order the tasks were created in
+    # Largest estimated prompt first, so no long task starts near the end of a run
+    # and sets its tail (longest processing time first)
+    LONGEST_FIRST = auto()
+
+
+class ModelTier(BaseModel):
+    model: str
+    # Longest input (in tokens) that starts on this tier; None for any length
+    max_input_tokens: Optional[int] = None
+
+
+class RoutingPolicy(BaseModel):
+    """Model tiers of an agent type, cheapest first.
+
+    A task starts on the first tier its input fits, and each re-ask after an invalid
+    response moves it one tier up; a task retried after failing validation starts
+    one tier above the model that failed.
+    """
+
+    tiers: list[ModelTier] = Field(min_length=1)
+
+    def initial_model(self, input_tokens: int) -> str:
+        for tier in self.tiers:
+            if tier.max_input_tokens is None or input_tokens <= tier.max_input_tokens:
+                return tier.model
+        return self.tiers[-1].model
+
+    def escalate(self, model: str) -> Optional[str]:
+        # None on the top tier, or for a model the policy does not know
+        models = [tier.model for tier in self.tiers]
+        if model not in models or model == models[-1]:
+            return None
+        return models[models.index(model) + 1]
@@ -0,0 +1,168 @@
+import uuid
+from enum import Enum, auto
+from pydantic import BaseModel, Field
+from typing import Any, Optional
+from datetime import datetime
+from pathlib import Path
+
+
+class AgentType(Enum):
+    OPEN_CODING = auto()
+    AXIAL_CODING = auto()
+    RELATED = auto()
+    SELECTIVE_CODING = auto()
+
+
+class AgentConfig(BaseModel):
+    agent_type: AgentType
+    agent_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    # Legacy per-file layout only; tasks now live in the agent's task store
+    task_ids: Optional[list[str]] = None
+    num_tasks: int = Field(default=0)
+    # Provider batch jobs submitted by run_tasks_batch and not yet collected
+    batch_ids: list[str] = Field(default_factory=list)
+    # Task counts by status name, refreshed by BaseAgent.refresh_progress
+    task_counts: dict[str, int] = Field(default_factory=dict)
+
+
+class TaskStatus(Enum):
+    PENDING = auto()
+    COMPLETED = auto()
+    FAILED = auto()
+    SUBMITTED = auto()  # Waiting in a provider batch job
+    DUPLICATE = auto()  # Waiting for the result of the task it duplicates
+    SKIPPED = auto()  # Left out by early stopping, e.g. once open coding saturates
+
+
+class ErrorKind(Enum):
+    RATE_LIMIT = auto()  # HTTP 429
+    SERVER = auto()  # HTTP 5xx
+    TIMEOUT = auto()
+    CONNECTION = auto()
+    CLIENT = auto()  # Other HTTP 4xx
+    INVALID_OUTPUT = auto()  # Response failed the agent's output schema after re-asks
+    OTHER = auto()
+
+
+class TaskError(BaseModel):
+    kind: ErrorKind
+    error_class: str
+    message: str
+    status_code: Optional[int] = None
+    retry_after: Optional[float] = None  # Seconds, from the Retry-After header
+    occurred_at: datetime = Field(default_factory=datetime.now)
+
+
+class TaskSchema(BaseModel):
+    task_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    status: TaskStatus = Field(default=TaskStatus.PENDING)
+    # Either the full prompt, or references rendered lazily by BaseAgent.render_input
+    input_text: Optional[str] = None
+    template_id: Optional[str] = None
+    context_id: Optional[str] = None
+    input_fields: dict[str, str] = Field(default_factory=dict)
+    source_id: Optional[str] = None  # ID of the input item, e.g. a comment
+    duplicate_of: Optional[str] = None  # Task whose result this task reuses
+    # Set when the output came from somewhere other than the LLM, e.g. a local classifier
+    resolved_by: Optional[str] = None
+    # Prompt tokens counted before the run, for longest-first ordering and routing
+    estimated_tokens: Optional[int] = None
+    model: Optional[str] = None  # Model of the last call, set by model routing
+    output_text: Optional[str] = None
+    # output_text parsed and validated against the agent's output schema
+    output: Optional[dict[str, Any]] = None
+    attempts: int = Field(default=0)  # Number of LLM calls made for this task
+    num_reasks: int = Field(default=0)  # Corrective re-asks after invalid responses
+    # Usage summed over all attempts; packed requests split it evenly between tasks
+    prompt_tokens: int = Field(default=0)
+    completion_tokens: int = Field(default=0)
+    cost_usd: float = Field(default=0.0)
+    batch_id: Optional[str] = None
+    errors: list[TaskError] = Field(default_factory=list)
+    # Errors before this index predate the last retry_failed and no longer count
+    # against the retry policies
+    retry_errors_from: int = Field(default=0)
+
+    @property
+    def last_error(self) -> Optional[TaskError]:
+        return self.errors[-1] if self.errors else None
+
+    def num_errors(self, kind: ErrorKind) -> int:
+        # Failed attempts of one error kind since the last retry_failed
+        recent_errors = self.errors[self.retry_errors_from :]
+        return sum(error.kind == kind for error in recent_errors)
+
+
+class TasksCreatedResult(BaseModel):
+    created_at: datetime = Field(default_factory=datetime.now)
+    num_tasks_created: int = Field(default=0)
+    num_duplicates: int = Field(default=0)  # Tasks that reuse another task's result
+
+
+class InvokeResult(BaseModel):
+    output_text: str
+    # With an output schema: the validated output, or why the response is invalid
+    output: Optional[dict[str, Any]] = None
+    validation_error: Optional[str] = None
+    from_cache: bool = False
+    latency: float = 0.0  # Seconds in the LLM call, excluding throttling
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+
+
+class RunMetricsSummary(BaseModel):
+    num_requests: int = 0
+    num_failed_requests: int = 0
+    latency_p50: float = 0.0
+    latency_p95: float = 0.0
+    latency_p99: float = 0.0
+    queue_wait_p50: float = 0.0
+    queue_wait_p95: float = 0.0
+    queue_wait_p99: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    tokens_per_sec: float = 0.0
+    cost_usd: float = 0.0
+    cost_per_1k_tasks: float = 0.0
+    throttle_wait_secs: float = 0.0  # Concurrency slots, rate limits, Retry-After
+    backoff_wait_secs: float = 0.0  # Delays before retries
+
+
+class TasksRunningResult(BaseModel):
+    started_at: datetime = Field(default_factory=datetime.now)
+    ended_at: Optional[datetime] = None
+    num_tasks_started: int = Field(default=0)
+    num_tasks_completed: int = Field(default=0)
+    num_tasks_failed: int = Field(default=0)
+    num_tasks_skipped: int = Field(default=0)
+    num_task_retries: int = Field(default=0)
+    num_task_reasks: int = Field(default=0)
+    num_cache_hits: int = Field(default=0)
+    num_cache_misses: int = Field(default=0)
+    num_duplicates_resolved: int = Field(default=0)
+    metrics: Optional[RunMetricsSummary] = None
+
+
+class SimulationResult(BaseModel):
+    """Replay of recorded task latencies under one dispatch order."""
+
+    order: str
+    num_tasks: int = 0
+    concurrency: int = 0
+    makespan_secs: float = 0.0  # First dispatch to last completion
+    # From the last dispatch to the last completion, when workers run out of tasks
+    tail_secs: float = 0.0
+    mean_completion_secs: float = 0.0
+    utilization: float = 0.0  # Busy worker time over concurrency * makespan
+
+
+class ExtractionResult(BaseModel):
+    output_path: Path
+    num_tasks: int = Field(default=0)
+    num_records: int = Field(default=0)
+    num_strict: int = Field(default=0)  # Outputs that parsed as strict JSON
+    num_repaired: int = Field(default=0)  # Outputs that needed json_repair
+    # Outputs lost by category: "empty", "invalid_json", "extract:<error class>"
+    failures: dict[str, int] = Field(default_factory=dict)
+    elapsed_secs: float = Field(default=0.0)
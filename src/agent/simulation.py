@@ -0,0 +1,90 @@
+import heapq
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from .logger import read_logs
+from .scheduler import TaskOrder, count_tokens
+from .schema import SimulationResult, TaskStatus
+
+if TYPE_CHECKING:
+    from . import BaseAgent
+
+
+def recorded_latencies(logs_dir: Path, agent_id: str) -> dict[str, float]:
+    """Latency of every task completed by the LLM, from the logs of an agent.
+
+    Reads `<agent_id>.jsonl` and the per-worker logs beside it. Cache hits are left
+    out; a task completed more than once keeps its last latency. The latency is that
+    of the call that completed the task, so re-asks before it are not counted.
+    """
+    latencies: dict[str, float] = {}
+    for path in sorted(logs_dir.glob(f"{agent_id}*.jsonl")):
+        for record in read_logs(path, event="task_completed"):
+            if not record.get("from_cache") and record.get("latency") is not None:
+                latencies[record["task_id"]] = record["latency"]
+    return latencies
+
+
+def simulate_run(
+    durations: list[float], concurrency: int, order: str = ""
+) -> SimulationResult:
+    """Dispatch tasks taking `durations` (in that order) to `concurrency` workers.
+
+    Each task goes to the first worker to become free, as in run_tasks with a
+    fixed concurrency limit and no rate limit, retries or throttling.
+    """
+    free_at = [0.0] * min(concurrency, len(durations))
+    heapq.heapify(free_at)
+    completions: list[float] = []
+    last_dispatch = 0.0
+    for duration in durations:
+        last_dispatch = heapq.heappop(free_at)
+        completions.append(last_dispatch + duration)
+        heapq.heappush(free_at, completions[-1])
+    makespan = max(completions, default=0.0)
+    return SimulationResult(
+        order=order,
+        num_tasks=len(durations),
+        concurrency=concurrency,
+        makespan_secs=makespan,
+        tail_secs=makespan - last_dispatch,
+        mean_completion_secs=sum(completions) / len(completions) if completions else 0.0,
+        utilization=sum(durations) / (concurrency * makespan) if makespan else 0.0,
+    )
+
+
+def compare_orders(
+    agent: "BaseAgent",
+    concurrency: int,
+    orders: Optional[list[TaskOrder]] = None,
+) -> list[SimulationResult]:
+    """Replay the recorded latencies of an agent's completed tasks in each order.
+
+    Estimates of tasks that have none are counted here and not stored. Only the
+    dispatch order is replayed: latencies were recorded on the models that ran the
+    tasks, so a different routing policy cannot be simulated from them.
+    """
+    latencies = recorded_latencies(agent.logs_dir, agent.config.agent_id)
+    tasks: list[tuple[int, float]] = []  # (estimated tokens, latency) in created order
+    for task in agent.store.iter_tasks(TaskStatus.COMPLETED):
+        if task.task_id not in latencies:
+            continue
+        estimated_tokens = (
+            task.estimated_tokens
+            if task.estimated_tokens is not None
+            else count_tokens(agent.render_input(task))
+        )
+        tasks.append((estimated_tokens, latencies[task.task_id]))
+
+    results = []
+    for order in orders or list(TaskOrder):
+        ordered = (
+            # Stable, so ties keep the created order as in the store
+            sorted(tasks, key=lambda task: -task[0])
+            if order == TaskOrder.LONGEST_FIRST
+            else tasks
+        )
+        results.append(
+            simulate_run([latency for _, latency in ordered], concurrency, order.name)
+        )
+    return results
@@ -0,0 +1,402 @@
+import atexit
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from pydantic import ValidationError
+
+from .schema import TaskSchema, TaskStatus
+
+
+class TaskStore(ABC):
+    """Persistence backend holding every task of a single agent."""
+
+    @abstractmethod
+    def put(self, task: TaskSchema) -> None: ...
+
+    @abstractmethod
+    def put_many(self, tasks: Iterable[TaskSchema]) -> int: ...
+
+    @abstractmethod
+    def insert_many(self, tasks: Iterable[TaskSchema]) -> int:
+        """Write only tasks whose task_id is not stored yet; returns how many were new."""
+
+    @abstractmethod
+    def get(self, task_id: str) -> TaskSchema: ...
+
+    @abstractmethod
+    def iter_task_ids(self, status: Optional[TaskStatus] = None) -> Iterator[str]: ...
+
+    @abstractmethod
+    def iter_tasks(
+        self, status: Optional[TaskStatus] = None, by_priority: bool = False
+    ) -> Iterator[TaskSchema]:
+        """Tasks in creation order, or by_priority: largest estimated_tokens first."""
+
+    @abstractmethod
+    def count(self, status: Optional[TaskStatus] = None) -> int: ...
+
+    @abstractmethod
+    def claim(
+        self, worker_id: str, limit: int, lease_secs: float, by_priority: bool = False
+    ) -> list[TaskSchema]:
+        """Lease up to `limit` pending tasks not leased by another live worker."""
+
+    @abstractmethod
+    def renew_leases(self, worker_id: str, lease_secs: float) -> int: ...
+
+    @abstractmethod
+    def release_leases(self, worker_id: str) -> int: ...
+
+    @abstractmethod
+    def put_blob(self, blob_id: str, body: str) -> None:
+        """Store a body shared by many tasks (prompt template, post context) once."""
+
+    @abstractmethod
+    def get_blob(self, blob_id: str) -> str: ...
+
+    @abstractmethod
+    def flush(self) -> None: ...
+
+    @abstractmethod
+    def close(self) -> None: ...
+
+
+class SQLiteTaskStore(TaskStore):
+    """All tasks of an agent in one SQLite file (WAL mode), indexed by task_id and status.
+
+    Writes are grouped into transactions and committed every `commit_every`
+    writes or `commit_interval` seconds, whichever comes first; `flush` forces a commit.
+
+    Several processes may share the file: `claim` leases pending tasks to one worker
+    until `lease_expires`, and a lease that is not renewed (the worker died) lapses so
+    another worker claims the task. Workers should use `commit_every=1`, since an open
+    transaction holds the write lock for every process.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        commit_every: int = 500,
+        commit_interval: float = 1.0,
+        page_size: int = 1000,
+        busy_timeout: float = 30.0,
+    ) -> None:
+        self.path = path
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.page_size = page_size
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode; transactions are opened explicitly so commits can be batched
+        self._conn = sqlite3.connect(
+            self.path, isolation_level=None, timeout=busy_timeout
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id TEXT NOT NULL UNIQUE,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                priority REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, seq);
+            CREATE TABLE IF NOT EXISTS blobs (
+                blob_id TEXT PRIMARY KEY,
+                body TEXT NOT NULL
+            );
+            """
+        )
+        # Stores created before leasing lack the lease columns
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")}
+        if "lease_owner" not in columns:
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN lease_owner TEXT")
+            self._conn.execute("ALTER TABLE tasks ADD COLUMN lease_expires REAL")
+        # ... and those created before longest-first ordering lack the priority column
+        if "priority" not in columns:
+            self._conn.execute(
+                "ALTER TABLE tasks ADD COLUMN priority REAL NOT NULL DEFAULT 0"
+            )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tasks_lease ON tasks (lease_owner)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks (status, priority DESC, seq)"
+        )
+        self._blob_cache: OrderedDict[str, str] = OrderedDict()
+        self._blob_cache_size = 1024
+        self._pending_writes = 0
+        self._last_commit = time.monotonic()
+        self._closed = False
+        atexit.register(self.close)
+
+    def put(self, task: TaskSchema) -> None:
+        self._begin()
+        self._write(task)
+        self._maybe_commit()
+
+    def put_many(self, tasks: Iterable[TaskSchema]) -> int:
+        num_written = 0
+        for task in tasks:
+            self._begin()
+            self._write(task)
+            num_written += 1
+            self._maybe_commit()
+        return num_written
+
+    def insert_many(self, tasks: Iterable[TaskSchema]) -> int:
+        num_inserted = 0
+        for task in tasks:
+            self._begin()
+            cursor = self._conn.execute(
+                """
+                INSERT INTO tasks (task_id, status, payload, priority) VALUES (?, ?, ?, ?)
+                ON CONFLICT (task_id) DO NOTHING
+                """,
+                (
+                    task.task_id,
+                    task.status.name,
+                    task.model_dump_json(),
+                    task.estimated_tokens or 0,
+                ),
+            )
+            num_inserted += cursor.rowcount
+            self._pending_writes += 1
+            self._maybe_commit()
+        return num_inserted
+
+    def get(self, task_id: str) -> TaskSchema:
+        row = self._conn.execute(
+            "SELECT payload FROM tasks WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"Task not found for task ID: {task_id}")
+        return TaskSchema.model_validate_json(row[0])
+
+    def iter_task_ids(self, status: Optional[TaskStatus] = None) -> Iterator[str]:
+        for _, task_id, _ in self._iter_rows(status, with_payload=False):
+            yield task_id
+
+    def iter_tasks(
+        self, status: Optional[TaskStatus] = None, by_priority: bool = False
+    ) -> Iterator[TaskSchema]:
+        rows = (
+            self._iter_rows_by_priority(status)
+            if by_priority
+            else self._iter_rows(status, with_payload=True)
+        )
+        for _, _, payload in rows:
+            yield TaskSchema.model_validate_json(payload)
+
+    def count(self, status: Optional[TaskStatus] = None) -> int:
+        if status is None:
+            row = self._conn.execute("SELECT COUNT(*) FROM tasks").fetchone()
+        else:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE status = ?", (status.name,)
+            ).fetchone()
+        return row[0]
+
+    def claim(
+        self, worker_id: str, limit: int, lease_secs: float, by_priority: bool = False
+    ) -> list[TaskSchema]:
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never
+        # select the same unleased rows
+        self.flush()
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._conn.execute(
+                f"""
+                SELECT seq, payload FROM tasks
+                WHERE status = ? AND (lease_expires IS NULL OR lease_expires < ?)
+                ORDER BY {"priority DESC, seq" if by_priority else "seq"} LIMIT ?
+                """,
+                (TaskStatus.PENDING.name, now, limit),
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE tasks SET lease_owner = ?, lease_expires = ? WHERE seq = ?",
+                [(worker_id, now + lease_secs, seq) for seq, _ in rows],
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return [TaskSchema.model_validate_json(payload) for _, payload in rows]
+
+    def renew_leases(self, worker_id: str, lease_secs: float) -> int:
+        self.flush()
+        cursor = self._conn.execute(
+            "UPDATE tasks SET lease_expires = ? WHERE lease_owner = ? AND status = ?",
+            (time.time() + lease_secs, worker_id, TaskStatus.PENDING.name),
+        )
+        return cursor.rowcount
+
+    def release_leases(self, worker_id: str) -> int:
+        # Leases of a worker that stops early are handed back without waiting to lapse
+        self.flush()
+        cursor = self._conn.execute(
+            "UPDATE tasks SET lease_owner = NULL, lease_expires = NULL WHERE lease_owner = ?",
+            (worker_id,),
+        )
+        return cursor.rowcount
+
+    def put_blob(self, blob_id: str, body: str) -> None:
+        self._begin()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO blobs (blob_id, body) VALUES (?, ?)", (blob_id, body)
+        )
+        self._pending_writes += 1
+        self._blob_cache.pop(blob_id, None)
+        self._maybe_commit()
+
+    def get_blob(self, blob_id: str) -> str:
+        # Consecutive tasks mostly share the same few templates and posts
+        if blob_id in self._blob_cache:
+            self._blob_cache.move_to_end(blob_id)
+            return self._blob_cache[blob_id]
+        row = self._conn.execute(
+            "SELECT body FROM blobs WHERE blob_id = ?", (blob_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"Blob not found: {blob_id}")
+        self._blob_cache[blob_id] = row[0]
+        if len(self._blob_cache) > self._blob_cache_size:
+            self._blob_cache.popitem(last=False)
+        return row[0]
+
+    def flush(self) -> None:
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+        self._pending_writes = 0
+        self._last_commit = time.monotonic()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self.flush()
+        self._conn.close()
+        self._closed = True
+        atexit.unregister(self.close)
+
+    def _begin(self) -> None:
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+
+    def _write(self, task: TaskSchema) -> None:
+        self._conn.execute(
+            """
+            INSERT INTO tasks (task_id, status, payload, priority) VALUES (?, ?, ?, ?)
+            ON CONFLICT (task_id) DO UPDATE SET
+                status = excluded.status,
+                payload = excluded.payload,
+                priority = excluded.priority,
+                -- A pending task (e.g. awaiting a retry) stays leased to its worker
+                lease_owner = CASE WHEN excluded.status = 'PENDING' THEN lease_owner END,
+                lease_expires = CASE WHEN excluded.status = 'PENDING' THEN lease_expires END
+            """,
+            (
+                task.task_id,
+                task.status.name,
+                task.model_dump_json(),
+                task.estimated_tokens or 0,
+            ),
+        )
+        self._pending_writes += 1
+
+    def _maybe_commit(self) -> None:
+        if (
+            self._pending_writes >= self.commit_every
+            or time.monotonic() - self._last_commit >= self.commit_interval
+        ):
+            self.flush()
+
+    def _iter_rows(
+        self, status: Optional[TaskStatus], with_payload: bool
+    ) -> Iterator[tuple[int, str, Optional[str]]]:
+        # Keyset pagination keeps memory flat and tolerates writes between pages
+        columns = "seq, task_id, payload" if with_payload else "seq, task_id, NULL"
+        last_seq = 0
+        while True:
+            if status is None:
+                rows = self._conn.execute(
+                    f"SELECT {columns} FROM tasks WHERE seq > ? ORDER BY seq LIMIT ?",
+                    (last_seq, self.page_size),
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    f"SELECT {columns} FROM tasks WHERE status = ? AND seq > ? ORDER BY seq LIMIT ?",
+                    (status.name, last_seq, self.page_size),
+                ).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_seq = rows[-1][0]
+
+    def _iter_rows_by_priority(
+        self, status: Optional[TaskStatus]
+    ) -> Iterator[tuple[int, str, str]]:
+        # Keyset pagination on (priority DESC, seq); a task whose priority changes
+        # between pages may be seen twice or not at all, as with a status change
+        last_key: Optional[tuple[float, int]] = None
+        while True:
+            conditions, params = [], []
+            if status is not None:
+                conditions.append("status = ?")
+                params.append(status.name)
+            if last_key is not None:
+                conditions.append("(priority < ? OR (priority = ? AND seq > ?))")
+                params.extend((last_key[0], last_key[0], last_key[1]))
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            rows = self._conn.execute(
+                f"SELECT seq, task_id, payload, priority FROM tasks {where} "
+                "ORDER BY priority DESC, seq LIMIT ?",
+                (*params, self.page_size),
+            ).fetchall()
+            if not rows:
+                return
+            for seq, task_id, payload, _ in rows:
+                yield seq, task_id, payload
+            last_key = (rows[-1][3], rows[-1][0])
+
+
+def import_json_tasks(
+    store: TaskStore,
+    tasks_dir: Path,
+    task_ids: Optional[Iterable[str]] = None,
+    unreadable_files: Optional[list[Path]] = None,
+) -> int:
+    """Import legacy `<tasks_dir>/<task_id>.json` files into `store`.
+
+    When `task_ids` is given (e.g. from a legacy agent config) tasks are imported in
+    that order and missing files are skipped; otherwise every JSON file in the directory is imported.
+    Files that do not parse (legacy files were written in place, so a crash could
+    truncate them) are skipped and appended to `unreadable_files` when given.
+    """
+    if task_ids is None:
+        task_files = sorted(tasks_dir.glob("*.json"))
+    else:
+        task_files = [tasks_dir / f"{task_id}.json" for task_id in task_ids]
+
+    def _read_tasks() -> Iterator[TaskSchema]:
+        for task_file in task_files:
+            if not task_file.exists():
+                continue
+            with open(task_file, "r") as f:
+                try:
+                    yield TaskSchema.model_validate_json(f.read())
+                except ValidationError:
+                    if unreadable_files is not None:
+                        unreadable_files.append(task_file)
+
+    num_imported = store.put_many(_read_tasks())
+    store.flush()
+    return num_imported
@@ -0,0 +1,90 @@
+import json
+from typing import Any, Optional
+
+from pydantic import BaseModel, ValidationError
+
+from .extract import parse_output
+
+REASK_INSTRUCTIONS = """
+
+## Previous Response
+{output_text}
+
+## Correction
+The previous response is not valid: {error}
+Return ONLY the corrected JSON object, matching this JSON schema:
+{schema}
+"""
+
+
+class OpenCodingOutput(BaseModel):
+    labels: list[str]
+
+
+class AxialCategory(BaseModel):
+    name: str
+    definition: str
+    theoretical_rationale: str
+    associated_subcategories: list[str]
+
+
+class AxialCodingOutput(BaseModel):
+    main_categories: list[AxialCategory]
+
+
+class ConsolidatedCategory(BaseModel):
+    # A main category without its subcategories, as consolidated for selective coding
+    name: str
+    definition: str
+    theoretical_rationale: str
+
+
+class CategoryConsolidationOutput(BaseModel):
+    main_categories: list[ConsolidatedCategory]
+
+
+class RelatedOutput(BaseModel):
+    related: bool
+
+
+class CoreCategory(BaseModel):
+    name: str
+    explanation: str
+
+
+class CategoryRelationship(BaseModel):
+    main_category: str
+    explanation: str
+
+
+class SelectiveCodingOutput(BaseModel):
+    core_category: CoreCategory
+    relationships: list[CategoryRelationship]
+
+
+def validate_output(
+    output_text: str, output_schema: type[BaseModel]
+) -> tuple[Optional[dict[str, Any]], Optional[str]]:
+    # (validated output, None) or (None, a short reason fit for the re-ask prompt)
+    parsed, outcome = parse_output(output_text)
+    if parsed is None:
+        return None, f"the response is not JSON ({outcome.value})"
+    try:
+        return output_schema.model_validate(parsed).model_dump(mode="json"), None
+    except ValidationError as e:
+        # Only the first few problems; the schema below states the full shape
+        return None, "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'response'}: {error['msg']}"
+            for error in e.errors()[:5]
+        )
+
+
+def reask_prompt(
+    input_text: str, output_text: str, error: str, output_schema: type[BaseModel]
+) -> str:
+    # The original prompt with the invalid response and what is wrong with it
+    return input_text + REASK_INSTRUCTIONS.format(
+        output_text=output_text[:2000],
+        error=error,
+        schema=json.dumps(output_schema.model_json_schema()),
+    )
@@ -0,0 +1,141 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import socket
+from typing import TYPE_CHECKING, Any, Optional
+
+from pydantic import BaseModel, Field
+
+from .logger import AgentLogger
+from .schema import TasksRunningResult
+
+if TYPE_CHECKING:
+    from . import BaseAgent
+
+
+def default_worker_id(index: int = 0) -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{index}"
+
+
+class WorkerConfig(BaseModel):
+    """One worker of a sharded run, with its own credentials and quota."""
+
+    worker_id: Optional[str] = None  # Defaults to <hostname>-<pid>-<index>
+    # Falls back to OPENAI_API_KEY / OPENAI_BASE_URL of the environment
+    api_key: Optional[str] = None
+    base_url: Optional[str] = None
+    max_concurrent_requests: int = 64
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    # Extra run_tasks arguments for this worker only
+    run_tasks_kwargs: dict[str, Any] = Field(default_factory=dict)
+
+
+def run_worker(
+    agent_cls: type["BaseAgent"],
+    agent_id: str,
+    worker: WorkerConfig,
+    agent_kwargs: Optional[dict[str, Any]] = None,
+    index: int = 0,
+    **run_tasks_kwargs,
+) -> TasksRunningResult:
+    """Run one worker in this process until no pending task of the agent is left.
+
+    The agent's task store must be reachable by every worker (same machine, or a
+    shared filesystem with working POSIX locks). Workers lease tasks from it, so any
+    number of them can start and stop at any time.
+    """
+    worker_id = worker.worker_id or default_worker_id(index)
+
+    agent = agent_cls(agent_id=agent_id, **(agent_kwargs or {}))
+    # Given to this agent's clients only, so workers sharing a process keep their own
+    agent.api_key = worker.api_key
+    agent.base_url = worker.base_url
+    # Commit every write so no worker holds the store's write lock while it waits
+    # on the network, and keep one log file per worker
+    agent.store.close()
+    agent.store = agent._open_task_store(commit_every=1)
+    agent.logger.close()
+    agent.logger = AgentLogger(agent.logs_dir / f"{agent_id}.{worker_id}.jsonl")
+    try:
+        return asyncio.run(
+            agent.run_tasks(
+                **{
+                    **run_tasks_kwargs,
+                    "max_concurrent_requests": worker.max_concurrent_requests,
+                    "requests_per_minute": worker.requests_per_minute,
+                    "tokens_per_minute": worker.tokens_per_minute,
+                    **worker.run_tasks_kwargs,
+                    "worker_id": worker_id,
+                }
+            )
+        )
+    finally:
+        agent.close()
+
+
+def _run_worker_process(
+    agent_cls: type["BaseAgent"],
+    agent_id: str,
+    worker: WorkerConfig,
+    agent_kwargs: Optional[dict[str, Any]],
+    index: int,
+    run_tasks_kwargs: dict[str, Any],
+    result_queue: multiprocessing.Queue,
+) -> None:
+    result = run_worker(
+        agent_cls, agent_id, worker, agent_kwargs, index, **run_tasks_kwargs
+    )
+    result_queue.put((index, result.model_dump_json()))
+
+
+def run_workers(
+    agent_cls: type["BaseAgent"],
+    agent_id: str,
+    workers: list[WorkerConfig],
+    agent_kwargs: Optional[dict[str, Any]] = None,
+    **run_tasks_kwargs,
+) -> list[Optional[TasksRunningResult]]:
+    """Run one local process per worker and wait for all of them.
+
+    `agent_cls` must be importable by the spawned processes (defined at module level).
+    A worker that crashes returns None; its leased tasks lapse after `lease_secs` and
+    are finished by the other workers.
+    """
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    processes = [
+        context.Process(
+            target=_run_worker_process,
+            args=(
+                agent_cls,
+                agent_id,
+                worker,
+                agent_kwargs,
+                index,
+                run_tasks_kwargs,
+                result_queue,
+            ),
+        )
+        for index, worker in enumerate(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    results: list[Optional[TasksRunningResult]] = [None] * len(workers)
+    num_alive = len(processes)
+    while num_alive:
+        try:
+            index, result_json = result_queue.get(timeout=1.0)
+            results[index] = TasksRunningResult.model_validate_json(result_json)
+        except queue.Empty:
+            pass
+        num_alive = sum(process.is_alive() for process in processes)
+    # Results put just before a process exited
+    while not result_queue.empty():
+        index, result_json = result_queue.get()
+        results[index] = TasksRunningResult.model_validate_json(result_json)
+    for process in processes:
+        process.join()
+    return results
@@ -0,0 +1,28 @@
+from .embeddings import (
+    EmbeddingStore,
+    EmbedFn,
+    normalize_label,
+    sentence_transformer_embedder,
+)
+from .incremental import (
+    ClusterModel,
+    ClusterState,
+    IncrementalConfig,
+    UpdateResult,
+    fit_cluster_model,
+    update_clusters,
+)
+from .pipeline import (
+    NOISE_CLUSTER,
+    ClusteringConfig,
+    ClusteringResult,
+    SweepResult,
+    cluster_labels,
+    cluster_points,
+    embedding_rows,
+    fit_pca,
+    load_labels,
+    project,
+    reduce_dimensions,
+    write_clusters,
+)
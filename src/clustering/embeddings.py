@@ -0,0 +1,232 @@
+import atexit
+import hashlib
+import os
+import re
+import sqlite3
+import unicodedata
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Sequence
+
+import numpy as np
+
+# Maps a batch of texts to a (len(texts), dim) float32 array
+EmbedFn = Callable[[list[str]], np.ndarray]
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_label(text: str) -> str:
+    # Labels that differ only in case or spacing share one embedding
+    text = unicodedata.normalize("NFKC", text)
+    return _WHITESPACE_PATTERN.sub(" ", text).strip().lower()
+
+
+def sentence_transformer_embedder(
+    model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+    batch_size: int = 256,
+    device: Optional[str] = None,
+    num_processes: int = 1,
+) -> EmbedFn:
+    """Embed function backed by sentence-transformers.
+
+    With `num_processes > 1` batches are encoded by a pool of worker processes (one per
+    CPU core or GPU), which is stopped at interpreter exit.
+    """
+    # Imported lazily: loading torch is slow and only needed when embedding new labels
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device=device)
+    pool = None
+    if num_processes > 1:
+        pool = model.start_multi_process_pool(
+            target_devices=[device or "cpu"] * num_processes
+        )
+        atexit.register(model.stop_multi_process_pool, pool)
+
+    def _embed(texts: list[str]) -> np.ndarray:
+        return np.asarray(
+            model.encode(
+                texts,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+                pool=pool,
+            ),
+            dtype=np.float32,
+        )
+
+    return _embed
+
+
+class EmbeddingStore:
+    """Persistent embeddings of one model: a float32 matrix file plus an SQLite index.
+
+    Row `i` of `vectors.f32` holds the embedding of the label whose index entry points at
+    row `i`; keys hash the model name and the normalized label. New rows are written
+    past the last indexed row before their index entries are committed, so a run that
+    dies mid-write leaves at most an unindexed tail, which the next write overwrites.
+    """
+
+    def __init__(self, root: Path, model_name: str, dim: int) -> None:
+        self.model_name = model_name
+        self.dim = dim
+        self.root = root / re.sub(r"[^\w.-]+", "_", model_name)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.root / "vectors.f32"
+        self.vectors_path.touch(exist_ok=True)
+
+        self._conn = sqlite3.connect(self.root / "index.db", isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS labels (
+                key TEXT PRIMARY KEY,
+                row INTEGER NOT NULL UNIQUE,
+                text TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.execute(
+            "INSERT OR IGNORE INTO meta (name, value) VALUES ('dim', ?)", (str(dim),)
+        )
+        stored_dim = int(
+            self._conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()[0]
+        )
+        if stored_dim != dim:
+            raise ValueError(f"{self.root} holds {stored_dim}-d embeddings, not {dim}-d")
+        self._matrix: Optional[np.memmap] = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(
+            f"{self.model_name}\0{normalize_label(text)}".encode("utf-8")
+        ).hexdigest()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Read-only memory-mapped view of every stored embedding, without copying."""
+        num_rows = len(self)
+        if self._matrix is None or self._matrix.shape[0] != num_rows:
+            self._matrix = (
+                np.memmap(
+                    self.vectors_path,
+                    dtype=np.float32,
+                    mode="r",
+                    shape=(num_rows, self.dim),
+                )
+                if num_rows
+                else np.empty((0, self.dim), dtype=np.float32)
+            )
+        return self._matrix
+
+    def lookup(self, texts: Sequence[str]) -> np.ndarray:
+        # Row of each text in `matrix`, or -1 when it has not been embedded
+        rows = np.full(len(texts), -1, dtype=np.int64)
+        keys = [self.key(text) for text in texts]
+        positions: dict[str, list[int]] = {}
+        for position, key in enumerate(keys):
+            positions.setdefault(key, []).append(position)
+        unique_keys = list(positions)
+        # Stay below SQLite's bound-parameter limit
+        for start in range(0, len(unique_keys), 900):
+            chunk = unique_keys[start : start + 900]
+            placeholders = ",".join("?" * len(chunk))
+            for key, row in self._conn.execute(
+                f"SELECT key, row FROM labels WHERE key IN ({placeholders})", chunk
+            ):
+                rows[positions[key]] = row
+        return rows
+
+    def embed(
+        self, texts: Sequence[str], embed_fn: EmbedFn, batch_size: int = 900
+    ) -> np.ndarray:
+        """Embed the texts not stored yet and return the row of every text.
+
+        New labels are embedded and committed `batch_size` at a time (at most 900, the
+        SQLite bound-parameter limit), so an interrupted run keeps finished batches.
+        """
+        rows = self.lookup(texts)
+        missing: dict[str, str] = {}
+        for text, row in zip(texts, rows):
+            if row < 0:
+                missing.setdefault(self.key(text), normalize_label(text))
+        missing_items = list(missing.items())
+        for start in range(0, len(missing_items), batch_size):
+            self._append(missing_items[start : start + batch_size], embed_fn)
+        return self.lookup(texts) if missing else rows
+
+    def get(
+        self, texts: Sequence[str], embed_fn: Optional[EmbedFn] = None
+    ) -> np.ndarray:
+        # Embeddings of the texts in order; a copy, unlike `matrix`
+        rows = (
+            self.embed(texts, embed_fn) if embed_fn is not None else self.lookup(texts)
+        )
+        if (rows < 0).any():
+            raise KeyError(f"{int((rows < 0).sum())} texts have not been embedded")
+        return self.matrix[rows]
+
+    def texts(self, rows: Optional[Iterable[int]] = None) -> list[str]:
+        # Normalized label of each row, in row order by default
+        if rows is None:
+            return [
+                text
+                for (text,) in self._conn.execute("SELECT text FROM labels ORDER BY row")
+            ]
+        by_row = dict(self._conn.execute("SELECT row, text FROM labels"))
+        return [by_row[row] for row in rows]
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._matrix = None
+        self._conn.close()
+        self._closed = True
+        atexit.unregister(self.close)
+
+    def _append(self, items: list[tuple[str, str]], embed_fn: EmbedFn) -> None:
+        vectors = np.ascontiguousarray(
+            embed_fn([text for _, text in items]), dtype=np.float32
+        )
+        if vectors.shape != (len(items), self.dim):
+            raise ValueError(
+                f"Expected {(len(items), self.dim)} embeddings, got {vectors.shape}"
+            )
+        # The write lock serializes concurrent writers across processes
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have stored some of these labels meanwhile
+            placeholders = ",".join("?" * len(items))
+            stored_keys = {
+                key
+                for (key,) in self._conn.execute(
+                    f"SELECT key FROM labels WHERE key IN ({placeholders})",
+                    [key for key, _ in items],
+                )
+            }
+            new_indices = [
+                index for index, (key, _) in enumerate(items) if key not in stored_keys
+            ]
+            first_row = len(self)
+            with open(self.vectors_path, "r+b") as f:
+                f.seek(first_row * self.dim * 4)
+                f.write(vectors[new_indices].tobytes())
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+            self._conn.executemany(
+                "INSERT INTO labels (key, row, text) VALUES (?, ?, ?)",
+                [
+                    (items[index][0], first_row + offset, items[index][1])
+                    for offset, index in enumerate(new_indices)
+                ],
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
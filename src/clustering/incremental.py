@@ -0,0 +1,309 @@
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+from sklearn.neighbors import NearestNeighbors
+
+from .embeddings import EmbedFn, EmbeddingStore, normalize_label
+from .pipeline import (
+    NOISE_CLUSTER,
+    ClusteringConfig,
+    cluster_points,
+    embedding_rows,
+    fit_pca,
+    project,
+)
+
+
+class IncrementalConfig(BaseModel):
+    # A new label joins its nearest cluster when within this multiple of the cluster's
+    # radius (95th percentile member distance to the centroid); otherwise it is noise
+    outlier_factor: float = 1.5
+    # Full recluster once the labels added since the last fit exceed this fraction of
+    # the fitted labels, or once this fraction of them were outliers
+    max_growth: float = 1.0
+    max_outlier_rate: float = 0.2
+    min_labels_for_drift: int = 100  # Outlier rate is ignored on fewer added labels
+    # Minimum member overlap (Jaccard) for a refitted cluster to keep an old id
+    min_id_overlap: float = 0.5
+
+
+class ClusterState(BaseModel):
+    labels: dict[str, int]  # Label -> cluster id, noise under -1
+    num_fitted: int  # Labels in the last full fit
+    num_added: int = 0  # Labels assigned incrementally since then
+    num_outliers: int = 0  # Of which left as noise
+    next_cluster_id: int = 0
+    clustering: ClusteringConfig = Field(default_factory=ClusteringConfig)
+
+
+class UpdateResult(BaseModel):
+    clusters: dict[int, list[str]]
+    # Clusters (noise excluded) whose members differ from before; their axial coding
+    # is stale. Includes clusters that no longer exist.
+    changed_cluster_ids: list[int]
+    num_new_labels: int
+    num_outliers: int
+    reclustered: bool
+
+
+class ClusterModel:
+    """Fitted clustering that new labels are assigned to without refitting.
+
+    Persists the PCA projection, cluster centroids and radii (`model.npz`) and the
+    label memberships (`state.json`) in `path`.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        pca_mean: np.ndarray,
+        pca_components: np.ndarray,
+        cluster_ids: np.ndarray,
+        centroids: np.ndarray,
+        radii: np.ndarray,
+        state: ClusterState,
+    ) -> None:
+        self.path = path
+        self.pca_mean = pca_mean
+        self.pca_components = pca_components
+        self.cluster_ids = cluster_ids
+        self.centroids = centroids
+        self.radii = radii
+        self.state = state
+        self._index = (
+            NearestNeighbors(n_neighbors=1).fit(centroids) if len(centroids) else None
+        )
+
+    @classmethod
+    def exists(cls, path: Path) -> bool:
+        return (path / "model.npz").exists() and (path / "state.json").exists()
+
+    @classmethod
+    def load(cls, path: Path) -> "ClusterModel":
+        arrays = np.load(path / "model.npz")
+        with open(path / "state.json", "r") as f:
+            state = ClusterState.model_validate_json(f.read())
+        return cls(path, **{name: arrays[name] for name in arrays.files}, state=state)
+
+    def save(self) -> None:
+        # Write then rename, so an interrupted save keeps the previous model
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / "model.npz.tmp", "wb") as f:
+            np.savez(
+                f,
+                pca_mean=self.pca_mean,
+                pca_components=self.pca_components,
+                cluster_ids=self.cluster_ids,
+                centroids=self.centroids,
+                radii=self.radii,
+            )
+        with open(self.path / "state.json.tmp", "w") as f:
+            f.write(self.state.model_dump_json())
+        os.replace(self.path / "model.npz.tmp", self.path / "model.npz")
+        os.replace(self.path / "state.json.tmp", self.path / "state.json")
+
+    @property
+    def clusters(self) -> dict[int, list[str]]:
+        clusters: dict[int, list[str]] = {}
+        for label, cluster in sorted(self.state.labels.items()):
+            clusters.setdefault(cluster, []).append(label)
+        return dict(sorted(clusters.items()))
+
+    @property
+    def drift(self) -> tuple[float, float]:
+        # (growth, outlier rate) since the last full fit
+        growth = self.state.num_added / max(self.state.num_fitted, 1)
+        outlier_rate = self.state.num_outliers / max(self.state.num_added, 1)
+        return growth, outlier_rate
+
+    def needs_recluster(self, config: IncrementalConfig) -> bool:
+        growth, outlier_rate = self.drift
+        return growth > config.max_growth or (
+            self.state.num_added >= config.min_labels_for_drift
+            and outlier_rate > config.max_outlier_rate
+        )
+
+    def assign(self, vectors: np.ndarray, outlier_factor: float) -> np.ndarray:
+        # Nearest centroid in the fitted PCA space, or noise when too far from it
+        if self._index is None:
+            return np.full(len(vectors), NOISE_CLUSTER, dtype=np.int64)
+        points = (vectors - self.pca_mean) @ self.pca_components.T
+        distances, nearest = self._index.kneighbors(points)
+        distances, nearest = distances[:, 0], nearest[:, 0]
+        return np.where(
+            distances <= self.radii[nearest] * outlier_factor,
+            self.cluster_ids[nearest],
+            NOISE_CLUSTER,
+        )
+
+
+def _centroids(
+    points: np.ndarray, assignments: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    cluster_ids = np.array(
+        sorted(set(assignments.tolist()) - {NOISE_CLUSTER}), dtype=np.int64
+    )
+    centroids = np.empty((len(cluster_ids), points.shape[1]), dtype=np.float32)
+    radii = np.empty(len(cluster_ids), dtype=np.float32)
+    for index, cluster in enumerate(cluster_ids):
+        members = points[assignments == cluster]
+        centroids[index] = members.mean(axis=0)
+        radii[index] = np.percentile(
+            np.linalg.norm(members - centroids[index], axis=1), 95
+        )
+    return cluster_ids, centroids, radii
+
+
+def _stable_ids(
+    assignments: np.ndarray,
+    labels: list[str],
+    previous: dict[str, int],
+    next_cluster_id: int,
+    min_overlap: float,
+) -> tuple[np.ndarray, int]:
+    # Give each refitted cluster the id of the old cluster it overlaps most, so
+    # unchanged clusters keep their ids (and their axial coding) across refits
+    new_members: dict[int, set[str]] = {}
+    for label, cluster in zip(labels, assignments.tolist()):
+        if cluster != NOISE_CLUSTER:
+            new_members.setdefault(cluster, set()).add(label)
+    old_members: dict[int, set[str]] = {}
+    for label, cluster in previous.items():
+        if cluster != NOISE_CLUSTER:
+            old_members.setdefault(cluster, set()).add(label)
+
+    # Candidate pairs share at least one label
+    pairs = set()
+    for new_id, members in new_members.items():
+        for label in members:
+            if (old_id := previous.get(label, NOISE_CLUSTER)) != NOISE_CLUSTER:
+                pairs.add((new_id, old_id))
+    scored = sorted(
+        (
+            (
+                len(new_members[new_id] & old_members[old_id])
+                / len(new_members[new_id] | old_members[old_id]),
+                -old_id,
+                -new_id,
+            )
+            for new_id, old_id in pairs
+        ),
+        reverse=True,
+    )
+    mapping: dict[int, int] = {NOISE_CLUSTER: NOISE_CLUSTER}
+    used_old_ids: set[int] = set()
+    for overlap, negative_old_id, negative_new_id in scored:
+        old_id, new_id = -negative_old_id, -negative_new_id
+        if overlap < min_overlap:
+            break
+        if new_id in mapping or old_id in used_old_ids:
+            continue
+        mapping[new_id] = old_id
+        used_old_ids.add(old_id)
+    for new_id in sorted(new_members):
+        if new_id not in mapping:
+            mapping[new_id] = next_cluster_id
+            next_cluster_id += 1
+    return np.array([mapping[cluster] for cluster in assignments.tolist()]), next_cluster_id
+
+
+def fit_cluster_model(
+    path: Path,
+    labels: list[str],
+    store: EmbeddingStore,
+    embed_fn: Optional[EmbedFn] = None,
+    config: Optional[ClusteringConfig] = None,
+    incremental_config: Optional[IncrementalConfig] = None,
+    previous: Optional[ClusterState] = None,
+) -> ClusterModel:
+    """Full clustering of `labels`, keeping the ids of clusters carried over from
+    `previous` and storing what incremental assignment needs."""
+    config = config or ClusteringConfig()
+    incremental_config = incremental_config or IncrementalConfig()
+    rows = embedding_rows(labels, store, embed_fn)
+    pca = fit_pca(store.matrix, rows, config)
+    points = project(pca, store.matrix, rows, config.chunk_size)
+    _, assignments = cluster_points(points, labels, config)
+
+    next_cluster_id = int(assignments.max(initial=NOISE_CLUSTER)) + 1
+    if previous is not None:
+        assignments, next_cluster_id = _stable_ids(
+            assignments,
+            labels,
+            previous.labels,
+            previous.next_cluster_id,
+            incremental_config.min_id_overlap,
+        )
+    cluster_ids, centroids, radii = _centroids(points, assignments)
+    return ClusterModel(
+        path,
+        pca_mean=pca.mean_.astype(np.float32),
+        pca_components=pca.components_.astype(np.float32),
+        cluster_ids=cluster_ids,
+        centroids=centroids,
+        radii=radii,
+        state=ClusterState(
+            labels=dict(zip(labels, assignments.tolist())),
+            num_fitted=len(labels),
+            next_cluster_id=next_cluster_id,
+            clustering=config,
+        ),
+    )
+
+
+def update_clusters(
+    model: ClusterModel,
+    labels: list[str],
+    store: EmbeddingStore,
+    embed_fn: Optional[EmbedFn] = None,
+    config: Optional[IncrementalConfig] = None,
+) -> tuple[ClusterModel, UpdateResult]:
+    """Assign labels not seen before to the fitted clusters; refit when drift is high.
+
+    The returned model is not saved; call `save()` once its results are written.
+    """
+    config = config or IncrementalConfig()
+    known = {normalize_label(label) for label in model.state.labels}
+    new_labels = []
+    for label in labels:
+        if (normalized := normalize_label(label)) not in known:
+            known.add(normalized)
+            new_labels.append(label)
+
+    previous = dict(model.state.labels)
+    num_outliers = 0
+    if new_labels:
+        rows = embedding_rows(new_labels, store, embed_fn)
+        assignments = model.assign(store.matrix[rows], config.outlier_factor)
+        num_outliers = int((assignments == NOISE_CLUSTER).sum())
+        model.state.labels.update(zip(new_labels, assignments.tolist()))
+        model.state.num_added += len(new_labels)
+        model.state.num_outliers += num_outliers
+
+    reclustered = model.needs_recluster(config)
+    if reclustered:
+        model = fit_cluster_model(
+            model.path,
+            sorted(model.state.labels),
+            store,
+            embed_fn,
+            model.state.clustering,
+            config,
+            previous=model.state,
+        )
+
+    changed = set()
+    for label, cluster in model.state.labels.items():
+        if previous.get(label) != cluster:
+            changed.update({cluster, previous.get(label, NOISE_CLUSTER)})
+    changed.discard(NOISE_CLUSTER)
+    return model, UpdateResult(
+        clusters=model.clusters,
+        changed_cluster_ids=sorted(changed),
+        num_new_labels=len(new_labels),
+        num_outliers=num_outliers,
+        reclustered=reclustered,
+    )
@@ -0,0 +1,250 @@
+import json
+from pathlib import Path
+from typing import Literal, Optional
+
+import hdbscan
+import numpy as np
+from joblib import Parallel, delayed
+from pydantic import BaseModel, Field
+from sklearn.decomposition import PCA
+from sklearn.metrics import silhouette_score
+
+from .embeddings import EmbedFn, EmbeddingStore, normalize_label
+
+NOISE_CLUSTER = -1
+
+
+class ClusteringConfig(BaseModel):
+    pca_components: int = 50
+    # PCA and HDBSCAN are fitted on at most this many labels; the rest are projected
+    # and assigned with the fitted models, which keeps 1M+ labels within memory
+    fit_sample: int = 100_000
+    min_cluster_sizes: list[int] = Field(default_factory=lambda: [10, 20, 40, 80])
+    min_samples: list[Optional[int]] = Field(default_factory=lambda: [None])
+    cluster_selection_method: Literal["eom", "leaf"] = "eom"
+    silhouette_sample: int = 10_000
+    random_state: int = 42
+    n_jobs: int = -1
+    chunk_size: int = 50_000
+
+
+class SweepResult(BaseModel):
+    min_cluster_size: int
+    min_samples: Optional[int]
+    num_clusters: int
+    noise_fraction: float
+    silhouette: Optional[float]  # On clustered points only; None with < 2 clusters
+
+
+class ClusteringResult(BaseModel):
+    # Cluster id -> labels, clusters numbered by decreasing size, noise under -1
+    clusters: dict[int, list[str]]
+    sweep: list[SweepResult]
+    best: SweepResult
+    num_labels: int
+
+
+def load_labels(path: Path) -> list[str]:
+    """Unique labels of an open coding result file, one per normalized form.
+
+    Reads the JSON lines written by `scripts/analyst/open-coding.py`, or a JSON list.
+    The first spelling seen is kept, and labels are returned in normalized order so
+    the pipeline's input does not depend on the order tasks completed in.
+    """
+    with open(path, "r") as f:
+        if path.suffix == ".jsonl":
+            labels = (json.loads(line) for line in f if line.strip())
+        else:
+            labels = json.load(f)
+        by_normalized: dict[str, str] = {}
+        for label in labels:
+            if isinstance(label, str) and label.strip():
+                by_normalized.setdefault(normalize_label(label), label)
+    return [by_normalized[key] for key in sorted(by_normalized)]
+
+
+def _sample_indices(num_rows: int, size: int, random_state: int) -> np.ndarray:
+    if num_rows <= size:
+        return np.arange(num_rows)
+    rng = np.random.default_rng(random_state)
+    return np.sort(rng.choice(num_rows, size=size, replace=False))
+
+
+def fit_pca(matrix: np.ndarray, rows: np.ndarray, config: ClusteringConfig) -> PCA:
+    sample_indices = _sample_indices(len(rows), config.fit_sample, config.random_state)
+    sample = matrix[rows[sample_indices]]
+    return PCA(
+        n_components=min(config.pca_components, *sample.shape),
+        random_state=config.random_state,
+    ).fit(sample)
+
+
+def project(
+    pca: PCA, matrix: np.ndarray, rows: np.ndarray, chunk_size: int = 50_000
+) -> np.ndarray:
+    # Chunk by chunk, so only the reduced matrix is held in memory
+    reduced = np.empty((len(rows), pca.n_components_), dtype=np.float32)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start : start + chunk_size]
+        reduced[start : start + len(chunk)] = pca.transform(matrix[chunk])
+    return reduced
+
+
+def reduce_dimensions(
+    matrix: np.ndarray, rows: np.ndarray, config: ClusteringConfig
+) -> np.ndarray:
+    # Fit PCA on a sample, then project every row from the memmap
+    return project(fit_pca(matrix, rows, config), matrix, rows, config.chunk_size)
+
+
+def _fit_candidate(
+    points: np.ndarray,
+    min_cluster_size: int,
+    min_samples: Optional[int],
+    config: ClusteringConfig,
+) -> tuple[SweepResult, hdbscan.HDBSCAN]:
+    clusterer = hdbscan.HDBSCAN(
+        min_cluster_size=min_cluster_size,
+        min_samples=min_samples,
+        cluster_selection_method=config.cluster_selection_method,
+        prediction_data=True,
+        core_dist_n_jobs=1,  # Candidates already run in parallel
+    ).fit(points)
+    assignments = clusterer.labels_
+    clustered = np.flatnonzero(assignments != NOISE_CLUSTER)
+    num_clusters = len(np.unique(assignments[clustered]))
+
+    silhouette = None
+    if num_clusters >= 2:
+        scored = clustered[
+            _sample_indices(
+                len(clustered), config.silhouette_sample, config.random_state
+            )
+        ]
+        silhouette = float(silhouette_score(points[scored], assignments[scored]))
+    return (
+        SweepResult(
+            min_cluster_size=min_cluster_size,
+            min_samples=min_samples,
+            num_clusters=num_clusters,
+            noise_fraction=1 - len(clustered) / len(points),
+            silhouette=silhouette,
+        ),
+        clusterer,
+    )
+
+
+def sweep(
+    points: np.ndarray, config: ClusteringConfig
+) -> list[tuple[SweepResult, hdbscan.HDBSCAN]]:
+    """Fit HDBSCAN for every parameter combination in parallel across cores."""
+    candidates = [
+        (min_cluster_size, min_samples)
+        for min_cluster_size in config.min_cluster_sizes
+        for min_samples in config.min_samples
+    ]
+    return Parallel(n_jobs=config.n_jobs)(
+        delayed(_fit_candidate)(points, min_cluster_size, min_samples, config)
+        for min_cluster_size, min_samples in candidates
+    )
+
+
+def _best(results: list[tuple[SweepResult, hdbscan.HDBSCAN]]) -> int:
+    # Highest silhouette; ties (and unscored candidates) go to fewer noise points,
+    # then to the earlier candidate, so the choice is deterministic
+    def _score(index: int) -> tuple:
+        result = results[index][0]
+        return (
+            result.silhouette if result.silhouette is not None else -2.0,
+            -result.noise_fraction,
+            -index,
+        )
+
+    return max(range(len(results)), key=_score)
+
+
+def _assign(
+    clusterer: hdbscan.HDBSCAN,
+    points: np.ndarray,
+    fit_indices: np.ndarray,
+    config: ClusteringConfig,
+) -> np.ndarray:
+    # Labels of the fitted sample come from the fit; the rest are predicted
+    assignments = np.empty(len(points), dtype=np.int64)
+    assignments[fit_indices] = clusterer.labels_
+    rest = np.setdiff1d(np.arange(len(points)), fit_indices, assume_unique=True)
+    for start in range(0, len(rest), config.chunk_size):
+        chunk = rest[start : start + config.chunk_size]
+        assignments[chunk], _ = hdbscan.approximate_predict(clusterer, points[chunk])
+    return assignments
+
+
+def _renumber(assignments: np.ndarray, labels: list[str]) -> dict[int, list[str]]:
+    # Cluster ids by decreasing size, ties by first label, so reruns give equal ids
+    members: dict[int, list[str]] = {}
+    for label, cluster in zip(labels, assignments.tolist()):
+        members.setdefault(cluster, []).append(label)
+    noise = members.pop(NOISE_CLUSTER, [])
+    ordered = sorted(members.values(), key=lambda labels: (-len(labels), labels[0]))
+    clusters = {index: labels for index, labels in enumerate(ordered)}
+    if noise:
+        clusters[NOISE_CLUSTER] = noise
+    return clusters
+
+
+def cluster_points(
+    points: np.ndarray, labels: list[str], config: ClusteringConfig
+) -> tuple[ClusteringResult, np.ndarray]:
+    """Select and fit HDBSCAN on reduced points; also returns each point's cluster."""
+    fit_indices = _sample_indices(len(points), config.fit_sample, config.random_state)
+    results = sweep(points[fit_indices], config)
+    best, clusterer = results[_best(results)]
+
+    assignments = _assign(clusterer, points, fit_indices, config)
+    clusters = _renumber(assignments, labels)
+    cluster_of = {
+        label: cluster for cluster, members in clusters.items() for label in members
+    }
+    result = ClusteringResult(
+        clusters=clusters,
+        sweep=[result for result, _ in results],
+        best=best,
+        num_labels=len(labels),
+    )
+    return result, np.array([cluster_of[label] for label in labels], dtype=np.int64)
+
+
+def cluster_labels(
+    labels: list[str],
+    store: EmbeddingStore,
+    embed_fn: Optional[EmbedFn] = None,
+    config: Optional[ClusteringConfig] = None,
+) -> ClusteringResult:
+    """Embed (new labels only), reduce with PCA, select and fit HDBSCAN, assign all."""
+    config = config or ClusteringConfig()
+    rows = embedding_rows(labels, store, embed_fn)
+    points = reduce_dimensions(store.matrix, rows, config)
+    return cluster_points(points, labels, config)[0]
+
+
+def embedding_rows(
+    labels: list[str], store: EmbeddingStore, embed_fn: Optional[EmbedFn] = None
+) -> np.ndarray:
+    rows = (
+        store.embed(labels, embed_fn) if embed_fn is not None else store.lookup(labels)
+    )
+    if (rows < 0).any():
+        raise KeyError(f"{int((rows < 0).sum())} labels have not been embedded")
+    return rows
+
+
+def write_clusters(path: Path, clusters: dict[int, list[str]]) -> None:
+    # Same layout the axial coding input generator reads: {"<cluster id>": [labels]}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(
+            {str(cluster): members for cluster, members in sorted(clusters.items())},
+            f,
+            indent=4,
+            ensure_ascii=False,
+        )
@@ -0,0 +1,3 @@
+from .plan import AxialUnit, item_tokens, plan_axial_units, split_by_tokens
+from .run import reduce_categories, run_axial_coding, run_round, run_selective_coding
+from .stage import AxialCodingStage, load_centroids
@@ -0,0 +1,141 @@
+import json
+import math
+from typing import Any, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+from src.agent import count_tokens
+
+
+class AxialUnit(BaseModel):
+    """One axial coding call: a whole cluster, a part of an oversized one, or a pack
+    of small clusters."""
+
+    cluster_ids: list[str]
+    labels: dict[str, list[str]]  # Cluster ID -> its labels in this call
+    part: int = 0
+    num_parts: int = 1  # > 1 when the cluster was split; the parts are reduced after
+
+    def render(self, template: str) -> str:
+        if len(self.cluster_ids) > 1:
+            # Packed: labels stay grouped by cluster
+            return template.format(
+                cluster_label=", ".join(self.cluster_ids),
+                subcategories=json.dumps(self.labels, indent=4),
+            )
+        cluster_id = self.cluster_ids[0]
+        cluster_label = (
+            f"{cluster_id} (part {self.part + 1} of {self.num_parts})"
+            if self.num_parts > 1
+            else cluster_id
+        )
+        return template.format(
+            cluster_label=cluster_label,
+            subcategories=json.dumps(self.labels[cluster_id], indent=4),
+        )
+
+
+def item_tokens(item: Any) -> int:
+    # Tokens an item adds to a JSON list rendered with indent=4
+    return count_tokens(json.dumps(item, indent=4)) + 2
+
+
+def split_by_tokens(items: list[Any], costs: list[int], budget: int) -> list[list[Any]]:
+    """Consecutive runs of items of roughly equal size, each within `budget` tokens.
+
+    The number of runs is the fewest that fit, and they are balanced so the last
+    one is not a small remainder. An item over the budget gets a run of its own.
+    """
+    total = sum(costs)
+    target = total / max(math.ceil(total / budget), 1)
+    runs: list[list[Any]] = [[]]
+    run_tokens = 0
+    for item, cost in zip(items, costs):
+        if runs[-1] and (run_tokens + cost > budget or run_tokens >= target):
+            runs.append([])
+            run_tokens = 0
+        runs[-1].append(item)
+        run_tokens += cost
+    return runs
+
+
+def _neighbour_order(
+    cluster_ids: list[str], centroids: Optional[dict[str, np.ndarray]]
+) -> list[str]:
+    # Greedy nearest-neighbour chain through the centroids, so consecutive clusters
+    # are related; cluster order when centroids are missing
+    if not centroids or any(cluster_id not in centroids for cluster_id in cluster_ids):
+        return cluster_ids
+    points = np.stack([centroids[cluster_id] for cluster_id in cluster_ids])
+    remaining = np.ones(len(cluster_ids), dtype=bool)
+    order = [0]
+    remaining[0] = False
+    for _ in range(len(cluster_ids) - 1):
+        distances = np.linalg.norm(points - points[order[-1]], axis=1)
+        distances[~remaining] = np.inf
+        order.append(int(distances.argmin()))
+        remaining[order[-1]] = False
+    return [cluster_ids[index] for index in order]
+
+
+def plan_axial_units(
+    clusters: dict[str, list[str]],
+    template: str,
+    max_prompt_tokens: int = 8000,
+    pack_below_tokens: Optional[int] = None,
+    max_pack_clusters: int = 8,
+    centroids: Optional[dict[str, np.ndarray]] = None,
+) -> list[AxialUnit]:
+    """Token-budgeted axial coding calls for `clusters` (noise excluded by the caller).
+
+    Clusters whose labels exceed the prompt budget are split into balanced parts.
+    Clusters below `pack_below_tokens` (a quarter of the budget by default) are packed
+    up to `max_pack_clusters` per call, nearest centroids together when `centroids`
+    are given. Every other cluster is one call, as before.
+    """
+    budget = max_prompt_tokens - count_tokens(
+        template.format(cluster_label="", subcategories="")
+    )
+    if budget <= 0:
+        raise ValueError(f"The template alone exceeds {max_prompt_tokens} tokens")
+    pack_below_tokens = budget // 4 if pack_below_tokens is None else pack_below_tokens
+
+    units: list[AxialUnit] = []
+    small: dict[str, int] = {}
+    for cluster_id, labels in clusters.items():
+        costs = [item_tokens(label) for label in labels]
+        total = sum(costs)
+        if total <= pack_below_tokens:
+            small[cluster_id] = total
+        elif total <= budget:
+            units.append(AxialUnit(cluster_ids=[cluster_id], labels={cluster_id: labels}))
+        else:
+            parts = split_by_tokens(labels, costs, budget)
+            units.extend(
+                AxialUnit(
+                    cluster_ids=[cluster_id],
+                    labels={cluster_id: part_labels},
+                    part=part,
+                    num_parts=len(parts),
+                )
+                for part, part_labels in enumerate(parts)
+            )
+
+    pack: list[str] = []
+    pack_tokens = 0
+    for cluster_id in _neighbour_order(list(small), centroids):
+        # The cluster ID key and braces cost a few tokens on top of the labels
+        cost = small[cluster_id] + count_tokens(f'"{cluster_id}": [],')
+        if pack and (
+            len(pack) >= max_pack_clusters or pack_tokens + cost > budget
+        ):
+            units.append(
+                AxialUnit(cluster_ids=pack, labels={c: clusters[c] for c in pack})
+            )
+            pack, pack_tokens = [], 0
+        pack.append(cluster_id)
+        pack_tokens += cost
+    if pack:
+        units.append(AxialUnit(cluster_ids=pack, labels={c: clusters[c] for c in pack}))
+    return units
@@ -0,0 +1,215 @@
+import json
+from typing import Any, Optional
+
+import numpy as np
+
+from src.agent import BaseAgent, TaskSchema, TaskStatus, content_id, count_tokens
+from src.pipeline import derived_task_id, task_output
+
+from .plan import item_tokens, plan_axial_units, split_by_tokens
+
+
+async def run_round(agent: BaseAgent, prompts: list[str], **run_tasks_kwargs) -> list[Any]:
+    """Run one task per prompt and return the outputs in order.
+
+    Task IDs derive from the prompt, so identical prompts share one call and a rerun
+    reuses every output already completed; tasks that failed before are retried.
+    """
+    task_ids = [
+        derived_task_id(agent.config.agent_id, content_id(prompt)) for prompt in prompts
+    ]
+    agent.store.insert_many(
+        TaskSchema(task_id=task_id, input_text=prompt)
+        for task_id, prompt in zip(task_ids, prompts)
+    )
+    agent.store.put_many(
+        task.model_copy(update={"status": TaskStatus.PENDING, "attempts": 0})
+        for task in map(agent.store.get, set(task_ids))
+        if task.status == TaskStatus.FAILED
+    )
+    agent.store.flush()
+    if agent.store.count(TaskStatus.PENDING):
+        await agent.run_tasks(**run_tasks_kwargs)
+
+    tasks = [agent.store.get(task_id) for task_id in task_ids]
+    num_failed = sum(task.status != TaskStatus.COMPLETED for task in tasks)
+    if num_failed:
+        raise RuntimeError(
+            f"{num_failed} of {len(tasks)} tasks of agent {agent.config.agent_id} "
+            f"did not complete; rerun to retry them"
+        )
+    return [task_output(task) for task in tasks]
+
+
+def _categories(output: Any) -> list[dict]:
+    return output.get("main_categories", []) if isinstance(output, dict) else []
+
+
+async def reduce_categories(
+    agent: BaseAgent,
+    groups: dict[str, list[dict]],
+    template: str,
+    max_prompt_tokens: int = 8000,
+    merge_when_fits: bool = True,
+    budget: Optional[int] = None,
+    max_levels: int = 4,
+    **run_tasks_kwargs,
+) -> dict[str, list[dict]]:
+    """Merge each group's categories with the reduce `template`, as a tree.
+
+    A group over the token budget is split into runs that are merged in parallel,
+    and the merged runs are merged again at the next level until the group fits one
+    prompt. With `merge_when_fits` that last prompt is always made (the partial
+    results of one cluster must be merged); otherwise a group is returned as soon as
+    it fits. Every level of every group is one round of calls, so latency grows with
+    the depth of the tree rather than the size of the largest group. No prompt ever
+    exceeds the budget: a group still over it after `max_levels` (the merges are not
+    shrinking it), or a single category over it, raises RuntimeError.
+    """
+    if budget is None:
+        budget = max_prompt_tokens - count_tokens(
+            template.format(cluster_label="", main_categories="")
+        )
+    results: dict[str, list[dict]] = {}
+    pending = dict(groups)
+    level = 0
+    while pending:
+        calls: list[tuple[str, bool, list[dict]]] = []  # (group, final, categories)
+        carried: dict[str, list[dict]] = {}
+        for key, categories in pending.items():
+            costs = [item_tokens(category) for category in categories]
+            if sum(costs) <= budget:
+                if merge_when_fits:
+                    calls.append((key, True, categories))
+                else:
+                    results[key] = categories
+                continue
+            if max(costs) > budget:
+                raise RuntimeError(
+                    f"A category of {key} alone takes {max(costs)} tokens, over the "
+                    f"budget of {budget}"
+                )
+            if level >= max_levels:
+                raise RuntimeError(
+                    f"Categories of {key} still take {sum(costs)} tokens after "
+                    f"{max_levels} levels of merging, over the budget of {budget}; "
+                    f"raise max_prompt_tokens or max_levels"
+                )
+            for run in split_by_tokens(categories, costs, budget):
+                if len(run) == 1:
+                    # Nothing to merge it with at this level
+                    carried.setdefault(key, []).extend(run)
+                else:
+                    calls.append((key, False, run))
+
+        outputs = await run_round(
+            agent,
+            [
+                template.format(
+                    cluster_label=key, main_categories=json.dumps(categories, indent=4)
+                )
+                for key, _, categories in calls
+            ],
+            **run_tasks_kwargs,
+        )
+        pending = carried
+        for (key, final, _), output in zip(calls, outputs):
+            if final:
+                results[key] = _categories(output)
+            else:
+                pending.setdefault(key, []).extend(_categories(output))
+        level += 1
+    return results
+
+
+async def run_axial_coding(
+    agent: BaseAgent,
+    clusters: dict[str, list[str]],
+    template: str,
+    reduce_template: str,
+    max_prompt_tokens: int = 8000,
+    centroids: Optional[dict[str, np.ndarray]] = None,
+    **run_tasks_kwargs,
+) -> list[dict]:
+    """Axial code `clusters` within a prompt token budget (see `plan_axial_units`).
+
+    Every planned call runs in one parallel round; the parts of split clusters are
+    then merged by `reduce_categories`. Returns one record per whole cluster, pack
+    or merged cluster: `{"cluster_ids": [...], "main_categories": [...]}`.
+    """
+    units = plan_axial_units(clusters, template, max_prompt_tokens, centroids=centroids)
+    outputs = await run_round(
+        agent, [unit.render(template) for unit in units], **run_tasks_kwargs
+    )
+    records: list[dict] = []
+    parts: dict[str, list[dict]] = {}
+    for unit, output in zip(units, outputs):
+        if unit.num_parts > 1:
+            parts.setdefault(unit.cluster_ids[0], []).extend(_categories(output))
+        else:
+            records.append(
+                {"cluster_ids": unit.cluster_ids, "main_categories": _categories(output)}
+            )
+    merged = await reduce_categories(
+        agent, parts, reduce_template, max_prompt_tokens, **run_tasks_kwargs
+    )
+    records.extend(
+        {"cluster_ids": [cluster_id], "main_categories": categories}
+        for cluster_id, categories in merged.items()
+    )
+    agent._log(
+        f"Axial coded {len(clusters)} clusters in {len(units)} calls "
+        f"({len(parts)} clusters split and merged, "
+        f"{sum(len(unit.cluster_ids) > 1 for unit in units)} packs).",
+        event="axial_coding_planned",
+        num_clusters=len(clusters),
+        num_calls=len(units),
+        num_split=len(parts),
+        num_packs=sum(len(unit.cluster_ids) > 1 for unit in units),
+    )
+    return records
+
+
+async def run_selective_coding(
+    reduce_agent: BaseAgent,
+    selective_agent: BaseAgent,
+    categories: list[dict],
+    reduce_template: str,
+    selective_template: str,
+    max_prompt_tokens: int = 8000,
+    **run_tasks_kwargs,
+) -> Any:
+    """Selective coding over every main category, however many there are.
+
+    Categories that do not fit one selective coding prompt are first consolidated
+    by `reduce_agent` with `reduce_template`, then `selective_agent` makes one call.
+    Subcategories are dropped before consolidating, so the reduce prompt and the
+    agent's output schema must not ask for them (see 04-selective_coding_reduce.md
+    and CategoryConsolidationOutput).
+    """
+    # Subcategories are not needed to find the core category
+    categories = [
+        {key: value for key, value in category.items() if key != "associated_subcategories"}
+        for category in categories
+    ]
+    budget = max_prompt_tokens - count_tokens(
+        selective_template.format(main_categories="")
+    )
+    consolidated = await reduce_categories(
+        reduce_agent,
+        {"selective coding": categories},
+        reduce_template,
+        merge_when_fits=False,
+        budget=budget,
+        **run_tasks_kwargs,
+    )
+    (output,) = await run_round(
+        selective_agent,
+        [
+            selective_template.format(
+                main_categories=json.dumps(consolidated["selective coding"], indent=4)
+            )
+        ],
+        **run_tasks_kwargs,
+    )
+    return output
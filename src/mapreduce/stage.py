@@ -0,0 +1,103 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import numpy as np
+
+from src.agent import BaseAgent
+from src.clustering import NOISE_CLUSTER, ClusterModel
+from src.pipeline import Pipeline, Stage, StageConfig
+
+from .run import run_axial_coding
+
+
+def load_centroids(model_dir: Path) -> Optional[dict[str, np.ndarray]]:
+    # Cluster ID -> centroid of a saved incremental clustering, for packing
+    if not ClusterModel.exists(model_dir):
+        return None
+    model = ClusterModel.load(model_dir)
+    return {
+        str(cluster_id): centroid
+        for cluster_id, centroid in zip(model.cluster_ids.tolist(), model.centroids)
+    }
+
+
+class AxialCodingStage(Stage):
+    """Axial codes the clusters of its upstream stage once they are final.
+
+    Takes `(cluster_id, labels)` items like `clusters_handoff`, but plans the calls
+    with `run_axial_coding`: oversized clusters are split and merged, small related
+    ones packed. Writes one JSON line per record to `output_path` and emits the
+    records.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        agent_cls: type[BaseAgent],
+        template: str,
+        reduce_template: str,
+        output_path: Path,
+        upstream: str,
+        config: Optional[StageConfig] = None,
+        max_prompt_tokens: int = 8000,
+        model_dir: Optional[Path] = None,
+    ) -> None:
+        super().__init__(name, upstream)
+        self.agent_cls = agent_cls
+        self.template = template
+        self.reduce_template = reduce_template
+        self.output_path = output_path
+        self.config = config or StageConfig()
+        self.max_prompt_tokens = max_prompt_tokens
+        # Clustering model whose centroids decide which small clusters are packed
+        self.model_dir = model_dir
+        self.agent: Optional[BaseAgent] = None
+        self._clusters: dict[str, list[str]] = {}
+        self._records: Optional[list[dict]] = None
+
+    def open(self, pipeline: Pipeline) -> None:
+        self.agent = self.agent_cls(
+            agent_id=pipeline.manifest.agent_ids.get(self.name),
+            data_dir=pipeline.data_dir,
+            logs_dir=pipeline.logs_dir,
+        )
+        pipeline.manifest.agent_ids[self.name] = self.agent.config.agent_id
+
+    def accept(self, item: tuple[int, list[str]]) -> None:
+        cluster_id, labels = item
+        if cluster_id != NOISE_CLUSTER:
+            self._clusters[str(cluster_id)] = labels
+
+    async def run(self, input_closed: asyncio.Event) -> None:
+        # Clusters only become final when clustering finishes
+        await input_closed.wait()
+        self._records = await run_axial_coding(
+            self.agent,
+            self._clusters,
+            self.template,
+            self.reduce_template,
+            self.max_prompt_tokens,
+            centroids=load_centroids(self.model_dir) if self.model_dir else None,
+            max_concurrent_requests=self.config.max_concurrent_requests,
+            initial_concurrent_requests=self.config.initial_concurrent_requests,
+            requests_per_minute=self.config.requests_per_minute,
+            tokens_per_minute=self.config.tokens_per_minute,
+            use_cache=self.config.use_cache,
+        )
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.output_path, "w") as f:
+            for record in self._records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        for record in self._records:
+            self.emit(record)
+
+    def completed_items(self) -> Iterator[Any]:
+        if self._records is None and self.output_path.exists():
+            with open(self.output_path, "r") as f:
+                self._records = [json.loads(line) for line in f if line.strip()]
+        return iter(self._records or [])
+
+    def close(self) -> None:
+        self.agent.close()
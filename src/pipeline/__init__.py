@@ -0,0 +1,15 @@
+from .engine import (
+    AgentStage,
+    Handoff,
+    Pipeline,
+    PipelineManifest,
+    Stage,
+    StageConfig,
+)
+from .stages import (
+    ClusteringStage,
+    clusters_handoff,
+    derived_task_id,
+    relevant_comments_handoff,
+    task_output,
+)
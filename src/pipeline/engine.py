@@ -0,0 +1,288 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterable, Iterator, Optional
+
+from pydantic import BaseModel, Field
+
+from src.agent import BaseAgent, Deduplicator, TaskSchema, TaskStatus
+from src.saturation import SaturationMonitor
+
+# Turns one item completed upstream into tasks of the downstream stage's agent; it
+# must return the same task_ids for the same item so a replayed item adds nothing
+Handoff = Callable[[BaseAgent, Any], Iterable[TaskSchema]]
+
+
+class StageConfig(BaseModel):
+    """Concurrency budget and run_tasks options of one agent stage."""
+
+    max_concurrent_requests: int = 32
+    initial_concurrent_requests: int = 8
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    pack_size: int = 1
+    use_cache: bool = False
+    # How often a stage whose input is still open looks for new tasks
+    poll_interval: float = 1.0
+
+
+class PipelineManifest(BaseModel):
+    pipeline_id: str
+    # Stage name -> ID of the agent holding the stage's tasks
+    agent_ids: dict[str, str] = Field(default_factory=dict)
+    # Source stages whose input file has been turned into tasks
+    inputs_created: list[str] = Field(default_factory=list)
+    completed_stages: list[str] = Field(default_factory=list)
+
+    @staticmethod
+    def path(pipeline_id: str, data_dir: Path = Path("data")) -> Path:
+        return data_dir / "pipelines" / f"{pipeline_id}.json"
+
+    @classmethod
+    def load(cls, pipeline_id: str, data_dir: Path = Path("data")) -> "PipelineManifest":
+        return cls.model_validate_json(cls.path(pipeline_id, data_dir).read_text())
+
+    def stage_agent_id(self, stage: str) -> str:
+        if stage not in self.agent_ids:
+            raise ValueError(f"Pipeline {self.pipeline_id} has no agent for stage {stage}")
+        return self.agent_ids[stage]
+
+
+class Stage(ABC):
+    """A node of the pipeline: consumes items of its upstream stage, emits its own."""
+
+    def __init__(self, name: str, upstream: Optional[str] = None) -> None:
+        self.name = name
+        self.upstream = upstream
+        self.downstream: list["Stage"] = []
+
+    def open(self, pipeline: "Pipeline") -> None:
+        """Called once before the run, e.g. to open or create the stage's agent."""
+
+    @abstractmethod
+    def accept(self, item: Any) -> None:
+        """Take one item completed upstream. Items may be delivered more than once."""
+
+    @abstractmethod
+    async def run(self, input_closed: asyncio.Event) -> None:
+        """Process items until `input_closed` is set and everything accepted is done."""
+
+    def completed_items(self) -> Iterator[Any]:
+        """Everything this stage has completed, replayed downstream after it finishes."""
+        return iter(())
+
+    def close(self) -> None: ...
+
+    def emit(self, item: Any) -> None:
+        for stage in self.downstream:
+            stage.accept(item)
+
+
+class AgentStage(Stage):
+    """Runs the tasks of one BaseAgent, handing each completed task downstream at once.
+
+    A source stage (no upstream) creates its tasks from `inputs_path`; any other stage
+    gets them from `handoff`. Completed tasks are emitted as TaskSchema objects.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        agent_cls: type[BaseAgent],
+        config: Optional[StageConfig] = None,
+        upstream: Optional[str] = None,
+        handoff: Optional[Handoff] = None,
+        inputs_path: Optional[Path] = None,
+        deduplicator: Optional[Callable[[], Deduplicator]] = None,
+        prefilter: Optional[
+            Callable[[BaseAgent, Callable[[TaskSchema], None]], Awaitable[Any]]
+        ] = None,
+        saturation: Optional[Callable[[BaseAgent], SaturationMonitor]] = None,
+    ) -> None:
+        super().__init__(name, upstream)
+        if (upstream is None) == (inputs_path is None):
+            raise ValueError(f"Stage {name} needs exactly one of upstream and inputs_path")
+        if upstream is not None and handoff is None:
+            raise ValueError(f"Stage {name} has an upstream stage but no handoff")
+        self.agent_cls = agent_cls
+        self.config = config or StageConfig()
+        self.handoff = handoff
+        self.inputs_path = inputs_path
+        self.deduplicator = deduplicator
+        # Resolves pending tasks without the LLM before the run (e.g. prefilter_tasks);
+        # called with the agent and emit, which it must pass every resolved task to
+        self.prefilter = prefilter
+        # Creates a monitor that stops the stage early once its output saturates
+        self.saturation = saturation
+        self.agent: Optional[BaseAgent] = None
+        self._pipeline: Optional["Pipeline"] = None
+
+    def open(self, pipeline: "Pipeline") -> None:
+        self._pipeline = pipeline
+        self.agent = self.agent_cls(
+            agent_id=pipeline.manifest.agent_ids.get(self.name),
+            data_dir=pipeline.data_dir,
+            logs_dir=pipeline.logs_dir,
+        )
+        pipeline.manifest.agent_ids[self.name] = self.agent.config.agent_id
+
+    def accept(self, item: Any) -> None:
+        # Tasks are written straight to the store, where the running stage claims them
+        self.agent.store.insert_many(self.handoff(self.agent, item))
+
+    async def run(self, input_closed: asyncio.Event) -> None:
+        manifest = self._pipeline.manifest
+        if self.inputs_path is not None and self.name not in manifest.inputs_created:
+            await self.agent.create_tasks_from_inputs(
+                self.inputs_path,
+                self.deduplicator() if self.deduplicator is not None else None,
+            )
+            manifest.inputs_created.append(self.name)
+            self._pipeline.save_manifest()
+        if self.prefilter is not None:
+            await self.prefilter(self.agent, self.emit)
+
+        monitor = self.saturation(self.agent) if self.saturation is not None else None
+        on_task_completed = self.emit
+        if monitor is not None:
+            await monitor.start()
+
+            def on_task_completed(task: TaskSchema) -> None:
+                self.emit(task)
+                monitor.observe(task)
+
+        try:
+            await self.agent.run_tasks(
+                max_concurrent_requests=self.config.max_concurrent_requests,
+                initial_concurrent_requests=self.config.initial_concurrent_requests,
+                requests_per_minute=self.config.requests_per_minute,
+                tokens_per_minute=self.config.tokens_per_minute,
+                pack_size=self.config.pack_size,
+                use_cache=self.config.use_cache,
+                worker_id=f"pipeline-{self.name}",
+                claim_poll_interval=self.config.poll_interval,
+                input_closed=input_closed,
+                on_task_completed=on_task_completed,
+                skip_task=monitor.skip_task if monitor is not None else None,
+            )
+        finally:
+            if monitor is not None:
+                await monitor.close()
+
+    def completed_items(self) -> Iterator[TaskSchema]:
+        # Includes duplicates resolved at the end of the run and tasks completed
+        # before a restart
+        return self.agent.store.iter_tasks(TaskStatus.COMPLETED)
+
+    def close(self) -> None:
+        self.agent.close()
+
+
+class Pipeline:
+    """DAG of stages that run concurrently, with streaming handoff between them.
+
+    Every stage starts at once. A stage's input closes when its upstream stage has
+    finished and replayed its completed items, so a stage never finishes early, and
+    items lost between an emit and a crash are delivered again on the next run.
+    Agent IDs and finished stages are kept in `data/pipelines/<pipeline_id>.json`:
+    rerunning with the same ID resumes every stage where it stopped.
+    """
+
+    def __init__(
+        self,
+        pipeline_id: str,
+        stages: list[Stage],
+        data_dir: Path = Path("data"),
+        logs_dir: Path = Path("logs"),
+    ) -> None:
+        self.pipeline_id = pipeline_id
+        self.stages = {stage.name: stage for stage in stages}
+        self.data_dir = data_dir
+        self.logs_dir = logs_dir
+        for stage in stages:
+            if stage.upstream is not None:
+                if stage.upstream not in self.stages:
+                    raise ValueError(
+                        f"Stage {stage.name}: unknown upstream stage {stage.upstream}"
+                    )
+                self.stages[stage.upstream].downstream.append(stage)
+        self._check_acyclic()
+        self.manifest_path = PipelineManifest.path(pipeline_id, data_dir)
+        self.manifest = (
+            PipelineManifest.load(pipeline_id, data_dir)
+            if self.manifest_path.exists()
+            else PipelineManifest(pipeline_id=pipeline_id)
+        )
+
+    async def run(self) -> PipelineManifest:
+        for stage in self.stages.values():
+            stage.open(self)
+        self.save_manifest()
+
+        input_closed = {name: asyncio.Event() for name in self.stages}
+        for stage in self.stages.values():
+            if stage.upstream is None:
+                input_closed[stage.name].set()
+
+        async def _run_stage(stage: Stage) -> None:
+            if stage.name not in self.manifest.completed_stages:
+                await stage.run(input_closed[stage.name])
+            # Downstream stages that are not finished yet get every completed item
+            # again; handoffs ignore the ones they already turned into tasks
+            pending_downstream = [
+                downstream
+                for downstream in stage.downstream
+                if downstream.name not in self.manifest.completed_stages
+            ]
+            if pending_downstream:
+                await self._replay(stage, pending_downstream)
+            if stage.name not in self.manifest.completed_stages:
+                self.manifest.completed_stages.append(stage.name)
+                self.save_manifest()
+            for downstream in stage.downstream:
+                input_closed[downstream.name].set()
+
+        try:
+            async with asyncio.TaskGroup() as task_group:
+                for stage in self.stages.values():
+                    task_group.create_task(_run_stage(stage))
+        finally:
+            self.save_manifest()
+            for stage in self.stages.values():
+                stage.close()
+        return self.manifest
+
+    @staticmethod
+    async def _replay(
+        stage: Stage, downstream: list[Stage], yield_every: int = 1000
+    ) -> None:
+        # On the event loop, since stores are bound to their thread; other stages
+        # keep running in between
+        for index, item in enumerate(stage.completed_items()):
+            for downstream_stage in downstream:
+                downstream_stage.accept(item)
+            if index % yield_every == yield_every - 1:
+                await asyncio.sleep(0)
+
+    def _check_acyclic(self) -> None:
+        for stage in self.stages.values():
+            seen = {stage.name}
+            upstream = stage.upstream
+            while upstream is not None:
+                if upstream in seen:
+                    raise ValueError(f"Pipeline stages form a cycle at {upstream}")
+                seen.add(upstream)
+                upstream = self.stages[upstream].upstream
+
+    def save_manifest(self) -> None:
+        # Same write-then-rename as agent configs
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_name(
+            f"{self.manifest_path.name}.{os.getpid()}.tmp"
+        )
+        with open(tmp_path, "w") as f:
+            f.write(self.manifest.model_dump_json(indent=4))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
@@ -0,0 +1,262 @@
+import asyncio
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from src.agent import BaseAgent, TaskSchema, TaskStatus, content_id, parse_output
+from src.clustering import (
+    NOISE_CLUSTER,
+    ClusterModel,
+    ClusteringConfig,
+    EmbedFn,
+    EmbeddingStore,
+    IncrementalConfig,
+    fit_cluster_model,
+    normalize_label,
+    sentence_transformer_embedder,
+    update_clusters,
+    write_clusters,
+)
+
+from .engine import AgentStage, Handoff, Stage
+
+
+def derived_task_id(*parts: str) -> str:
+    # Same parts, same ID: replayed handoffs do not create tasks twice
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, "\0".join(parts)))
+
+
+def task_output(task: TaskSchema) -> Optional[Any]:
+    # Validated output when the agent has an output schema, else the parsed text
+    if task.output is not None:
+        return task.output
+    return parse_output(task.output_text or "")[0]
+
+
+def relevant_comments_handoff(upstream: AgentStage, template: str) -> Handoff:
+    """Comments judged related upstream become tasks with `template` downstream.
+
+    The downstream task keeps the upstream task's context (post) and fields, so a
+    comment judged irrelevant never costs an open coding call.
+    """
+    template_id = f"template-{content_id(template)}"
+    # Blobs known to be in the downstream store, for this process
+    copied_blobs: set[str] = set()
+
+    def _handoff(agent: BaseAgent, task: TaskSchema) -> list[TaskSchema]:
+        output = task_output(task)
+        if not isinstance(output, dict) or output.get("related") is not True:
+            return []
+        if template_id not in copied_blobs:
+            agent.store.put_blob(template_id, template)
+            copied_blobs.add(template_id)
+        if task.context_id is not None and task.context_id not in copied_blobs:
+            agent.store.put_blob(
+                task.context_id, upstream.agent.store.get_blob(task.context_id)
+            )
+            copied_blobs.add(task.context_id)
+        fields = dict(task.input_fields)
+        if task.input_text is not None:
+            # Tasks created with a full prompt carry no fields to re-render
+            fields.setdefault("content", task.input_text)
+        return [
+            TaskSchema(
+                task_id=derived_task_id(agent.config.agent_id, task.task_id),
+                template_id=template_id,
+                context_id=task.context_id,
+                input_fields=fields,
+                source_id=task.source_id or task.task_id,
+            )
+        ]
+
+    return _handoff
+
+
+def clusters_handoff(upstream: "ClusteringStage", template: str) -> Handoff:
+    """One task per cluster (noise excluded), listing its labels in `template`.
+
+    The task ID derives from the cluster's stable ID (see `update_clusters`), so a
+    cluster keeps one task across runs: an unchanged cluster keeps its coded result,
+    and a cluster whose members changed is reset and coded again. Tasks of clusters
+    that no longer exist are marked SKIPPED, so neither they nor their results are
+    handed downstream.
+    """
+    # Clustering model whose vanished clusters have been skipped, for this process
+    swept_model: list[Optional[ClusterModel]] = [None]
+
+    def _skip_vanished_clusters(agent: BaseAgent) -> None:
+        model = upstream.model
+        if model is None or model is swept_model[0]:
+            return
+        task_ids = {
+            derived_task_id(agent.config.agent_id, "cluster", str(cluster_id))
+            for cluster_id in model.clusters
+        }
+        # Also drops tasks keyed on a cluster's members by earlier versions
+        num_skipped = agent.store.put_many(
+            task.model_copy(update={"status": TaskStatus.SKIPPED})
+            for task in agent.store.iter_tasks()
+            if task.task_id not in task_ids and task.status != TaskStatus.SKIPPED
+        )
+        agent.store.flush()
+        swept_model[0] = model
+        if num_skipped:
+            agent._log(
+                f"Skipped {num_skipped} tasks of clusters that no longer exist.",
+                event="stale_clusters_skipped",
+                num_tasks=num_skipped,
+            )
+
+    def _handoff(
+        agent: BaseAgent, cluster: tuple[int, list[str]]
+    ) -> list[TaskSchema]:
+        _skip_vanished_clusters(agent)
+        cluster_id, members = cluster
+        if cluster_id == NOISE_CLUSTER:
+            return []
+        task = TaskSchema(
+            task_id=derived_task_id(agent.config.agent_id, "cluster", str(cluster_id)),
+            input_text=template.format(
+                cluster_label=cluster_id, subcategories=json.dumps(members, indent=4)
+            ),
+            source_id=str(cluster_id),
+        )
+        try:
+            existing = agent.store.get(task.task_id)
+        except KeyError:
+            return [task]
+        if existing.input_text != task.input_text or existing.status == TaskStatus.SKIPPED:
+            # Members changed since it was coded, or the cluster came back
+            agent.store.put(task)
+        return []
+
+    return _handoff
+
+
+class ClusteringStage(Stage):
+    """Clusters the labels of completed open coding tasks while open coding runs.
+
+    The first fit happens once `min_labels` unique labels have arrived, and new labels
+    are assigned incrementally every `update_every` labels (refitting when drift is
+    high, see `update_clusters`), so only a cheap update is left when the input
+    closes. The final clusters are written to `output_path` and emitted downstream as
+    `(cluster_id, labels)` pairs. Embedding and clustering run on one worker thread.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        upstream: str,
+        model_dir: Path,
+        output_path: Path,
+        embeddings_dir: Path,
+        embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
+        embedding_dim: int = 384,
+        device: Optional[str] = None,
+        config: Optional[ClusteringConfig] = None,
+        incremental_config: Optional[IncrementalConfig] = None,
+        min_labels: int = 2000,
+        update_every: int = 2000,
+        poll_interval: float = 5.0,
+    ) -> None:
+        super().__init__(name, upstream)
+        self.model_dir = model_dir
+        self.output_path = output_path
+        self.embeddings_dir = embeddings_dir
+        self.embedding_model = embedding_model
+        self.embedding_dim = embedding_dim
+        self.device = device
+        self.config = config or ClusteringConfig()
+        self.incremental_config = incremental_config or IncrementalConfig()
+        self.min_labels = min_labels
+        self.update_every = update_every
+        self.poll_interval = poll_interval
+
+        self._labels: dict[str, str] = {}  # Normalized -> first spelling
+        self._num_clustered = 0
+        self._model: Optional[ClusterModel] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        # Created on the worker thread, which owns their SQLite connections
+        self._store: Optional[EmbeddingStore] = None
+        self._embed_fn: Optional[EmbedFn] = None
+
+    def accept(self, task: TaskSchema) -> None:
+        output = task_output(task)
+        labels = output.get("labels", []) if isinstance(output, dict) else []
+        for label in labels:
+            if isinstance(label, str) and label.strip():
+                self._labels.setdefault(normalize_label(label), label)
+
+    async def run(self, input_closed: asyncio.Event) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            closed = input_closed.is_set()
+            num_new = len(self._labels) - self._num_clustered
+            threshold = self.update_every if self._model else self.min_labels
+            if num_new and (closed or num_new >= threshold):
+                labels = sorted(self._labels.values(), key=normalize_label)
+                await loop.run_in_executor(self._executor, self._update, labels)
+                self._num_clustered = len(labels)
+            if closed:
+                break
+            try:
+                await asyncio.wait_for(input_closed.wait(), self.poll_interval)
+            except TimeoutError:
+                pass
+        if self._model is None and ClusterModel.exists(self.model_dir):
+            # Nothing new since the last run
+            self._model = ClusterModel.load(self.model_dir)
+        if self._model is not None:
+            write_clusters(self.output_path, self._model.clusters)
+
+    @property
+    def model(self) -> Optional[ClusterModel]:
+        # The clustering whose clusters are handed downstream, once there is one
+        return self._model
+
+    def completed_items(self) -> Iterator[tuple[int, list[str]]]:
+        if self._model is None and ClusterModel.exists(self.model_dir):
+            self._model = ClusterModel.load(self.model_dir)
+        if self._model is None:
+            return iter(())
+        return iter(self._model.clusters.items())
+
+    def close(self) -> None:
+        self._executor.submit(self._close_store).result()
+        self._executor.shutdown()
+
+    def _update(self, labels: list[str]) -> None:
+        if self._store is None:
+            self._store = EmbeddingStore(
+                self.embeddings_dir, self.embedding_model, self.embedding_dim
+            )
+        if self._embed_fn is None and (self._store.lookup(labels) < 0).any():
+            self._embed_fn = sentence_transformer_embedder(
+                self.embedding_model, device=self.device
+            )
+        if self._model is None and ClusterModel.exists(self.model_dir):
+            self._model = ClusterModel.load(self.model_dir)
+        if self._model is None:
+            self._model = fit_cluster_model(
+                self.model_dir,
+                labels,
+                self._store,
+                self._embed_fn,
+                self.config,
+                self.incremental_config,
+            )
+        else:
+            self._model, _ = update_clusters(
+                self._model,
+                labels,
+                self._store,
+                self._embed_fn,
+                self.incremental_config,
+            )
+        self._model.save()
+
+    def _close_store(self) -> None:
+        if self._store is not None:
+            self._store.close()
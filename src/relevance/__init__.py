@@ -0,0 +1,11 @@
+from .prefilter import (
+    CalibrationBin,
+    PrefilterResult,
+    RelevanceClassifier,
+    RelevanceReport,
+    ThresholdPoint,
+    prefilter_tasks,
+    relevance_text,
+    threshold_table,
+    training_examples,
+)
@@ -0,0 +1,310 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import joblib
+import numpy as np
+from pydantic import BaseModel
+from sklearn.calibration import CalibratedClassifierCV, calibration_curve
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import brier_score_loss, roc_auc_score
+from sklearn.model_selection import train_test_split
+
+from src.agent import BaseAgent, TaskSchema, TaskStatus, parse_output
+from src.clustering import EmbedFn, sentence_transformer_embedder
+
+
+def relevance_text(fields: dict[str, Any]) -> str:
+    # What the classifier sees: the post title for context, then the comment
+    if "content" not in fields and "input_text" in fields:
+        return fields["input_text"]
+    return f"{fields.get('post_title', '')}\n\n{fields.get('content', '')}".strip()
+
+
+class CalibrationBin(BaseModel):
+    mean_predicted: float
+    fraction_relevant: float
+
+
+class ThresholdPoint(BaseModel):
+    threshold: float
+    # Comments with p(relevant) <= threshold resolved as irrelevant
+    reject_coverage: float  # Fraction of all comments resolved
+    reject_precision: float  # Fraction of those that are truly irrelevant
+    reject_recall_loss: float  # Fraction of relevant comments wrongly resolved
+    # Comments with p(relevant) >= threshold resolved as relevant
+    accept_coverage: float
+    accept_precision: float
+
+
+class RelevanceReport(BaseModel):
+    num_train: int
+    num_test: int
+    relevant_rate: float
+    roc_auc: float
+    brier_score: float
+    calibration: list[CalibrationBin]
+    thresholds: list[ThresholdPoint]
+
+
+class PrefilterResult(BaseModel):
+    num_tasks: int = 0
+    num_rejected: int = 0  # Resolved as irrelevant without an LLM call
+    num_accepted: int = 0  # Resolved as relevant without an LLM call
+    num_uncertain: int = 0  # Left pending for the LLM
+
+
+def _task_fields(agent: BaseAgent, task: TaskSchema) -> dict[str, Any]:
+    if task.input_text is not None:
+        return {"input_text": task.input_text}
+    fields = (
+        json.loads(agent.store.get_blob(task.context_id)) if task.context_id else {}
+    )
+    fields.update(task.input_fields)
+    return fields
+
+
+def training_examples(agent: BaseAgent) -> tuple[list[str], np.ndarray]:
+    """Texts and labels of the tasks a RelatedAgent has completed with the LLM."""
+    texts, labels = [], []
+    for task in agent.store.iter_tasks(TaskStatus.COMPLETED):
+        if task.resolved_by is not None:
+            continue  # Never learn from the classifier's own decisions
+        output = task.output or parse_output(task.output_text)[0]
+        related = output.get("related") if isinstance(output, dict) else None
+        if isinstance(related, bool):
+            texts.append(relevance_text(_task_fields(agent, task)))
+            labels.append(int(related))
+    return texts, np.array(labels, dtype=np.int64)
+
+
+def threshold_table(
+    labels: np.ndarray, probabilities: np.ndarray, step: float = 0.01
+) -> list[ThresholdPoint]:
+    points = []
+    num_relevant = max(int(labels.sum()), 1)
+    for threshold in np.arange(step, 1.0, step):
+        rejected = probabilities <= threshold
+        accepted = probabilities >= threshold
+        points.append(
+            ThresholdPoint(
+                threshold=round(float(threshold), 6),
+                reject_coverage=float(rejected.mean()),
+                reject_precision=(
+                    float((labels[rejected] == 0).mean()) if rejected.any() else 1.0
+                ),
+                reject_recall_loss=float(labels[rejected].sum() / num_relevant),
+                accept_coverage=float(accepted.mean()),
+                accept_precision=(
+                    float((labels[accepted] == 1).mean()) if accepted.any() else 1.0
+                ),
+            )
+        )
+    return points
+
+
+class RelevanceClassifier:
+    """Linear model over sentence embeddings, predicting p(relevant) for a comment.
+
+    Comments at or below `reject_threshold` are resolved as irrelevant and those at or
+    above `accept_threshold` as relevant; either threshold may be None to disable that
+    side. Probabilities are calibrated (sigmoid, cross-validated) so thresholds read
+    as confidence levels.
+    """
+
+    def __init__(
+        self,
+        model: CalibratedClassifierCV,
+        embedding_model: str,
+        reject_threshold: Optional[float] = None,
+        accept_threshold: Optional[float] = None,
+        report: Optional[RelevanceReport] = None,
+    ) -> None:
+        self.model = model
+        self.embedding_model = embedding_model
+        self.reject_threshold = reject_threshold
+        self.accept_threshold = accept_threshold
+        self.report = report
+        self._embed_fn: Optional[EmbedFn] = None
+
+    @classmethod
+    def train(
+        cls,
+        texts: list[str],
+        labels: np.ndarray,
+        embed_fn: EmbedFn,
+        embedding_model: str,
+        test_size: float = 0.2,
+        random_state: int = 42,
+    ) -> "RelevanceClassifier":
+        """Fit on a stratified split and report calibration and precision/recall on the rest."""
+        vectors = embed_fn(texts)
+        train_x, test_x, train_y, test_y = train_test_split(
+            vectors,
+            labels,
+            test_size=test_size,
+            stratify=labels,
+            random_state=random_state,
+        )
+        model = CalibratedClassifierCV(
+            LogisticRegression(max_iter=1000, class_weight="balanced"),
+            method="sigmoid",
+            cv=5,
+        )
+        model.fit(train_x, train_y)
+        probabilities = model.predict_proba(test_x)[:, 1]
+        fraction_relevant, mean_predicted = calibration_curve(
+            test_y, probabilities, n_bins=10
+        )
+        report = RelevanceReport(
+            num_train=len(train_y),
+            num_test=len(test_y),
+            relevant_rate=float(labels.mean()),
+            roc_auc=float(roc_auc_score(test_y, probabilities)),
+            brier_score=float(brier_score_loss(test_y, probabilities)),
+            calibration=[
+                CalibrationBin(mean_predicted=predicted, fraction_relevant=observed)
+                for predicted, observed in zip(
+                    mean_predicted.tolist(), fraction_relevant.tolist()
+                )
+            ],
+            thresholds=threshold_table(test_y, probabilities),
+        )
+        classifier = cls(model, embedding_model, report=report)
+        classifier._embed_fn = embed_fn
+        return classifier
+
+    def choose_thresholds(
+        self, min_precision: float = 0.98, min_coverage: float = 0.01
+    ) -> tuple[Optional[float], Optional[float]]:
+        """Widest thresholds whose held-out precision reaches `min_precision`.
+
+        A side whose best threshold resolves less than `min_coverage` of the comments
+        is disabled.
+        """
+        rejects = [
+            point.threshold
+            for point in self.report.thresholds
+            if point.reject_precision >= min_precision
+            and point.reject_coverage >= min_coverage
+        ]
+        self.reject_threshold = max(rejects) if rejects else None
+        # Above the reject threshold, so no comment is claimed by both sides
+        accepts = [
+            point.threshold
+            for point in self.report.thresholds
+            if point.accept_precision >= min_precision
+            and point.accept_coverage >= min_coverage
+            and (self.reject_threshold is None or point.threshold > self.reject_threshold)
+        ]
+        self.accept_threshold = min(accepts) if accepts else None
+        return self.reject_threshold, self.accept_threshold
+
+    def predict_proba(self, texts: list[str]) -> np.ndarray:
+        if self._embed_fn is None:
+            self._embed_fn = sentence_transformer_embedder(self.embedding_model)
+        return self.model.predict_proba(self._embed_fn(texts))[:, 1]
+
+    def decide(self, probability: float) -> Optional[bool]:
+        # True/False when confident enough, None for the LLM to judge
+        if self.reject_threshold is not None and probability <= self.reject_threshold:
+            return False
+        if self.accept_threshold is not None and probability >= self.accept_threshold:
+            return True
+        return None
+
+    def save(self, path: Path) -> None:
+        path.mkdir(parents=True, exist_ok=True)
+        joblib.dump(
+            {
+                "model": self.model,
+                "embedding_model": self.embedding_model,
+                "reject_threshold": self.reject_threshold,
+                "accept_threshold": self.accept_threshold,
+            },
+            path / "model.joblib",
+        )
+        if self.report is not None:
+            (path / "report.json").write_text(self.report.model_dump_json(indent=4))
+
+    @classmethod
+    def load(cls, path: Path) -> "RelevanceClassifier":
+        state = joblib.load(path / "model.joblib")
+        report_path = path / "report.json"
+        report = (
+            RelevanceReport.model_validate_json(report_path.read_text())
+            if report_path.exists()
+            else None
+        )
+        return cls(**state, report=report)
+
+
+async def prefilter_tasks(
+    agent: BaseAgent,
+    classifier: RelevanceClassifier,
+    batch_size: int = 256,
+    on_resolved: Optional[Callable[[TaskSchema], None]] = None,
+) -> PrefilterResult:
+    """Resolve the pending tasks the classifier is confident about, without the LLM.
+
+    Tasks are scored in batches on a worker thread; resolved tasks are stored as
+    completed with the same output an LLM answer would have, and `resolved_by` naming
+    the classifier. Uncertain tasks stay pending for run_tasks.
+    """
+    result = PrefilterResult()
+    resolved_by = f"prefilter:{classifier.embedding_model}"
+    loop = asyncio.get_running_loop()
+
+    async def _score(batch: list[TaskSchema]) -> None:
+        texts = [relevance_text(_task_fields(agent, task)) for task in batch]
+        probabilities = await loop.run_in_executor(
+            None, classifier.predict_proba, texts
+        )
+        resolved = []
+        for task, probability in zip(batch, probabilities.tolist()):
+            related = classifier.decide(probability)
+            if related is None:
+                result.num_uncertain += 1
+                continue
+            output = {"related": related}
+            resolved.append(
+                task.model_copy(
+                    update={
+                        "status": TaskStatus.COMPLETED,
+                        "output_text": json.dumps(output),
+                        "output": output,
+                        "resolved_by": resolved_by,
+                    }
+                )
+            )
+            if related:
+                result.num_accepted += 1
+            else:
+                result.num_rejected += 1
+        agent.store.put_many(resolved)
+        if on_resolved is not None:
+            for task in resolved:
+                on_resolved(task)
+
+    batch: list[TaskSchema] = []
+    for task in agent.store.iter_tasks(TaskStatus.PENDING):
+        result.num_tasks += 1
+        batch.append(task)
+        if len(batch) >= batch_size:
+            await _score(batch)
+            batch = []
+    if batch:
+        await _score(batch)
+    agent.store.flush()
+    agent._log(
+        f"Pre-filter resolved {result.num_rejected + result.num_accepted} of "
+        f"{result.num_tasks} pending tasks ({result.num_rejected} irrelevant, "
+        f"{result.num_accepted} relevant); {result.num_uncertain} left for the LLM.",
+        event="tasks_prefiltered",
+        num_tasks=result.num_tasks,
+        num_rejected=result.num_rejected,
+        num_accepted=result.num_accepted,
+        num_uncertain=result.num_uncertain,
+    )
+    return result
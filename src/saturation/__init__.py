@@ -0,0 +1,8 @@
+from .monitor import (
+    ConceptIndex,
+    SaturationConfig,
+    SaturationMonitor,
+    SaturationPoint,
+    SaturationReport,
+    stratified_sample,
+)
@@ -0,0 +1,353 @@
+import asyncio
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from src.agent import BaseAgent, TaskSchema, TaskStatus, parse_output
+from src.clustering import (
+    EmbedFn,
+    EmbeddingStore,
+    normalize_label,
+    sentence_transformer_embedder,
+)
+
+
+class SaturationConfig(BaseModel):
+    # A label whose cosine similarity to every known concept is below this is new
+    novelty_threshold: float = 0.8
+    # Completed comments the discovery rate is averaged over
+    window: int = 1000
+    # New concepts per comment below which coding counts as saturated, once the
+    # rate has stayed below it for `patience` more comments
+    min_discovery_rate: float = 0.02
+    patience: int = 2000
+    min_comments: int = 5000
+    # Fraction of the remaining comments still coded after saturation, as a check;
+    # proportional to each post's share. 0 stops dispatching at once
+    sample_fraction: float = 0.0
+    # Comments whose labels are embedded and scored together
+    batch_size: int = 64
+
+
+class SaturationPoint(BaseModel):
+    num_comments: int
+    num_labels: int
+    num_concepts: int
+    discovery_rate: float  # New concepts per comment over the last `window` comments
+
+
+class SaturationReport(BaseModel):
+    agent_id: str
+    config: SaturationConfig
+    curve: list[SaturationPoint] = Field(default_factory=list)
+    saturated_at: Optional[int] = None  # Completed comments when saturation was reached
+    num_sampled: int = 0
+    num_skipped: int = 0
+    # New concepts per comment among the comments completed after saturation
+    sample_discovery_rate: Optional[float] = None
+
+
+class ConceptIndex:
+    """Exact nearest-neighbour search over unit-normalized concept embeddings.
+
+    Only labels that were new when added are kept (one representative per concept), so
+    the index grows with the number of concepts rather than the number of labels.
+    """
+
+    def __init__(self, dim: int, capacity: int = 1024) -> None:
+        self._vectors = np.empty((capacity, dim), dtype=np.float32)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def max_similarity(
+        self, vectors: np.ndarray, start: int = 0, chunk_size: int = 65536
+    ) -> np.ndarray:
+        # Cosine similarity of each (normalized) vector to its nearest concept from
+        # position `start` on
+        best = np.full(len(vectors), -1.0, dtype=np.float32)
+        for chunk_start in range(start, self._size, chunk_size):
+            chunk = self._vectors[chunk_start : min(chunk_start + chunk_size, self._size)]
+            np.maximum(best, (vectors @ chunk.T).max(axis=1), out=best)
+        return best
+
+    def add(self, vector: np.ndarray) -> None:
+        if self._size == len(self._vectors):
+            self._vectors = np.concatenate([self._vectors, np.empty_like(self._vectors)])
+        self._vectors[self._size] = vector
+        self._size += 1
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _task_labels(task: TaskSchema) -> list[str]:
+    output = task.output if task.output is not None else parse_output(task.output_text or "")[0]
+    labels = output.get("labels", []) if isinstance(output, dict) else []
+    return [label for label in labels if isinstance(label, str) and label.strip()]
+
+
+def _hash_unit(text: str) -> float:
+    # Deterministic stand-in for a random draw, so a rerun picks the same sample
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:15], 16) / 16**15
+
+
+def stratified_sample(
+    strata: dict[str, list[str]], fraction: float
+) -> set[str]:
+    """Proportional stratified sample of task IDs, `fraction` of them in total.
+
+    Each stratum gets the floor of its share and the seats left over go to the
+    largest remainders, so posts with a single remaining comment are still drawn.
+    """
+    total = sum(len(task_ids) for task_ids in strata.values())
+    num_seats = round(total * fraction)
+    shares = {key: len(task_ids) * fraction for key, task_ids in strata.items()}
+    seats = {key: int(share) for key, share in shares.items()}
+    leftover = sorted(
+        strata,
+        key=lambda key: (seats[key] - shares[key], _hash_unit(key)),
+    )
+    for key in leftover[: num_seats - sum(seats.values())]:
+        seats[key] += 1
+    sample = set()
+    for key, task_ids in strata.items():
+        sample.update(sorted(task_ids, key=_hash_unit)[: seats[key]])
+    return sample
+
+
+class SaturationMonitor:
+    """Tracks how often completed open coding tasks still produce new concepts.
+
+    Each label of a completed task is embedded (through the shared EmbeddingStore
+    cache) and compared with the concepts seen so far; a label with no concept within
+    `novelty_threshold` cosine similarity is a new concept. Once the rolling discovery
+    rate has stayed below `min_discovery_rate`, the remaining pending comments are
+    marked SKIPPED, except for a stratified `sample_fraction` that is still coded to
+    check the decision. Pass `observe` as run_tasks' on_task_completed and `skip_task`
+    as its skip_task; `start` replays earlier completions so a resumed run keeps its
+    curve. Monitors one process: with several workers the others do not see the
+    completions of this one.
+    """
+
+    def __init__(
+        self,
+        agent: BaseAgent,
+        config: Optional[SaturationConfig] = None,
+        embeddings_dir: Path = Path("data") / "embeddings",
+        embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2",
+        embedding_dim: int = 384,
+        device: Optional[str] = None,
+        report_path: Optional[Path] = None,
+    ) -> None:
+        self.agent = agent
+        self.config = config or SaturationConfig()
+        self.embeddings_dir = embeddings_dir
+        self.embedding_model = embedding_model
+        self.embedding_dim = embedding_dim
+        self.device = device
+        self.report_path = report_path or (
+            agent.data_dir / "saturation" / f"{agent.config.agent_id}.json"
+        )
+        self.report = SaturationReport(
+            agent_id=agent.config.agent_id, config=self.config
+        )
+
+        self._index = ConceptIndex(embedding_dim)
+        self._seen: set[str] = set()  # Normalized labels already scored
+        self._window: deque[int] = deque(maxlen=self.config.window)
+        self._num_comments = 0
+        self._num_labels = 0
+        self._below_since: Optional[int] = None
+        self._at_saturation: Optional[tuple[int, int]] = None  # (comments, concepts)
+        # Pending tasks still to be coded after saturation; None before saturation
+        self._sample: Optional[set[str]] = None
+        self._buffer: list[list[str]] = []
+        self._inflight: set[asyncio.Future] = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="saturation")
+        # Created on the worker thread, which owns the store's SQLite connection
+        self._store: Optional[EmbeddingStore] = None
+        self._embed_fn: Optional[EmbedFn] = None
+
+    @property
+    def saturated(self) -> bool:
+        return self.report.saturated_at is not None
+
+    async def start(self) -> None:
+        """Replay the labels of tasks completed before this run, in store order."""
+        batch: list[list[str]] = []
+        for task in self.agent.store.iter_tasks(TaskStatus.COMPLETED):
+            batch.append(_task_labels(task))
+            if len(batch) >= self.config.batch_size * 16:
+                await self._process_async(batch, replay=True)
+                batch = []
+        if batch:
+            await self._process_async(batch, replay=True)
+        if self.agent.store.count(TaskStatus.SKIPPED):
+            # An earlier run saturated and skipped the rest; what is pending is its sample
+            if not self.saturated:
+                self.report.saturated_at = self._num_comments
+                self._at_saturation = (self._num_comments, len(self._index))
+            self._sample = {
+                task.task_id for task in self.agent.store.iter_tasks(TaskStatus.PENDING)
+            }
+        elif self.saturated:
+            # Saturated by tasks completed without a monitor, or before a crash
+            self._skip_remaining()
+
+    def observe(self, task: TaskSchema) -> None:
+        self._buffer.append(_task_labels(task))
+        if len(self._buffer) >= self.config.batch_size:
+            batch, self._buffer = self._buffer, []
+            future = asyncio.ensure_future(self._process_async(batch))
+            self._inflight.add(future)
+            future.add_done_callback(self._inflight.discard)
+
+    def skip_task(self, task: TaskSchema) -> bool:
+        if self._sample is None or task.task_id in self._sample:
+            return False
+        # Tasks added after saturation (e.g. by a pipeline handoff) are still pending
+        self.agent.store.put(task.model_copy(update={"status": TaskStatus.SKIPPED}))
+        return True
+
+    async def close(self) -> SaturationReport:
+        """Score what is still buffered, write the report and free the embedder."""
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            await self._process_async(batch)
+        if self._inflight:
+            await asyncio.gather(*self._inflight)
+        if self._at_saturation is not None:
+            num_comments, num_concepts = self._at_saturation
+            if self._num_comments > num_comments:
+                self.report.sample_discovery_rate = (
+                    len(self._index) - num_concepts
+                ) / (self._num_comments - num_comments)
+                if self.report.sample_discovery_rate >= self.config.min_discovery_rate:
+                    self.agent._log(
+                        f"Comments coded after saturation still found "
+                        f"{self.report.sample_discovery_rate:.3f} new concepts per comment; "
+                        f"run_skipped() codes the skipped ones.",
+                        level="warning",
+                        event="saturation_unconfirmed",
+                        sample_discovery_rate=self.report.sample_discovery_rate,
+                    )
+        self.report_path.parent.mkdir(parents=True, exist_ok=True)
+        self.report_path.write_text(self.report.model_dump_json(indent=4))
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close_store)
+        self._executor.shutdown()
+        return self.report
+
+    async def _process_async(self, batch: list[list[str]], replay: bool = False) -> None:
+        reached = await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._process, batch
+        )
+        # Back on the event loop, which owns the task store
+        if reached and not replay:
+            self._skip_remaining()
+
+    def _process(self, batch: list[list[str]]) -> bool:
+        # Runs on the worker thread; returns whether saturation was reached just now
+        new_labels = []
+        for labels in batch:
+            for label in labels:
+                normalized = normalize_label(label)
+                if normalized not in self._seen:
+                    self._seen.add(normalized)
+                    new_labels.append(normalized)
+        is_new = self._novel(new_labels) if new_labels else {}
+
+        reached = False
+        for labels in batch:
+            num_new = 0
+            for label in labels:
+                num_new += is_new.pop(normalize_label(label), False)
+            self._window.append(num_new)
+            self._num_comments += 1
+            self._num_labels += len(labels)
+            if self.saturated or self._num_comments < self.config.min_comments:
+                continue
+            if len(self._window) < self._window.maxlen:
+                continue
+            if sum(self._window) / len(self._window) >= self.config.min_discovery_rate:
+                self._below_since = None
+            elif self._below_since is None:
+                self._below_since = self._num_comments
+            elif self._num_comments - self._below_since >= self.config.patience:
+                self.report.saturated_at = self._num_comments
+                self._at_saturation = (self._num_comments, len(self._index))
+                reached = True
+
+        self.report.curve.append(
+            SaturationPoint(
+                num_comments=self._num_comments,
+                num_labels=self._num_labels,
+                num_concepts=len(self._index),
+                discovery_rate=sum(self._window) / max(len(self._window), 1),
+            )
+        )
+        return reached
+
+    def _novel(self, labels: list[str]) -> dict[str, bool]:
+        if self._store is None:
+            self._store = EmbeddingStore(
+                self.embeddings_dir, self.embedding_model, self.embedding_dim
+            )
+        if self._embed_fn is None and (self._store.lookup(labels) < 0).any():
+            self._embed_fn = sentence_transformer_embedder(
+                self.embedding_model, device=self.device
+            )
+        vectors = _unit(self._store.get(labels, self._embed_fn))
+        similarity = self._index.max_similarity(vectors)
+        is_new = {}
+        first_new = len(self._index)
+        for label, vector, best in zip(labels, vectors, similarity.tolist()):
+            # Also compare with the concepts this batch has added
+            if len(self._index) > first_new:
+                best = max(
+                    best, float(self._index.max_similarity(vector[None], first_new)[0])
+                )
+            is_new[label] = best < self.config.novelty_threshold
+            if is_new[label]:
+                self._index.add(vector)
+        return is_new
+
+    def _skip_remaining(self) -> None:
+        strata: dict[str, list[str]] = {}
+        for task in self.agent.store.iter_tasks(TaskStatus.PENDING):
+            strata.setdefault(task.context_id or "", []).append(task.task_id)
+        sample = stratified_sample(strata, self.config.sample_fraction)
+        self.report.num_sampled = len(sample)
+        self.report.num_skipped = self.agent.store.put_many(
+            task.model_copy(update={"status": TaskStatus.SKIPPED})
+            for task in self.agent.store.iter_tasks(TaskStatus.PENDING)
+            if task.task_id not in sample
+        )
+        self.agent.store.flush()
+        # Set after the store is updated: run_tasks only skips tasks no longer pending
+        self._sample = sample
+        point = self.report.curve[-1]
+        self.agent._log(
+            f"Open coding saturated after {point.num_comments} comments "
+            f"({point.num_concepts} concepts, {point.discovery_rate:.3f} new per comment); "
+            f"skipping {self.report.num_skipped} comments, still coding a sample of "
+            f"{self.report.num_sampled}.",
+            event="saturation_reached",
+            num_comments=point.num_comments,
+            num_concepts=point.num_concepts,
+            discovery_rate=point.discovery_rate,
+            num_sampled=self.report.num_sampled,
+            num_skipped=self.report.num_skipped,
+        )
+
+    def _close_store(self) -> None:
+        if self._store is not None:
+            self._store.close()
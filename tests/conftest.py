@@ -0,0 +1,26 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+import pytest
+
+from stub_server import StubServer
+
+
+@pytest.fixture
+def with_stub_server(monkeypatch) -> Callable[..., Any]:
+    """Run `main(server)` on a fresh event loop next to a local stub OpenAI server."""
+
+    def _run(main: Callable[[StubServer], Awaitable[Any]], **server_kwargs) -> Any:
+        async def _main() -> Any:
+            server = StubServer(**server_kwargs)
+            await server.start()
+            monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+            monkeypatch.setenv("OPENAI_API_KEY", "stub")
+            try:
+                return await main(server)
+            finally:
+                await server.close()
+
+        return asyncio.run(_main())
+
+    return _run
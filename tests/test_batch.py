@@ -0,0 +1,69 @@
+import asyncio
+
+import openai
+import pytest
+
+from src.agent import (
+    AgentType,
+    BaseAgent,
+    LocalBatchTransport,
+    ModelTier,
+    RoutingPolicy,
+    TaskStatus,
+)
+
+
+class StubAgent(BaseAgent):
+    model = "gpt-4o-mini"
+
+
+class RoutedAgent(StubAgent):
+    routing = RoutingPolicy(
+        tiers=[
+            ModelTier(model="gpt-4o-mini", max_input_tokens=100),
+            ModelTier(model="gpt-4o"),
+        ]
+    )
+
+
+def test_batch_requests_are_routed_like_live_calls(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    requested_models: dict[str, str] = {}
+
+    def _responder(body: dict) -> dict:
+        requested_models[body["messages"][0]["content"]] = body["model"]
+        return {"choices": [{"message": {"role": "assistant", "content": "{}"}}]}
+
+    agent = RoutedAgent(AgentType.OPEN_CODING, data_dir=tmp_path, logs_dir=tmp_path)
+    short, long = "Short comment", "word " * 1000
+    asyncio.run(agent.create_tasks([short, long]))
+    result = asyncio.run(
+        agent.run_tasks_batch(
+            transport=LocalBatchTransport(tmp_path / "provider", _responder),
+            poll_interval=0,
+        )
+    )
+    assert result.num_tasks_completed == 2
+    assert requested_models == {short: "gpt-4o-mini", long: "gpt-4o"}
+    assert {
+        task.input_text: task.model
+        for task in agent.store.iter_tasks(TaskStatus.COMPLETED)
+    } == requested_models
+    agent.close()
+
+
+def test_batch_mode_uses_the_agent_credentials(tmp_path, monkeypatch, with_stub_server):
+    agent = StubAgent(AgentType.OPEN_CODING, data_dir=tmp_path, logs_dir=tmp_path)
+    asyncio.run(agent.create_tasks(["Comment"]))
+
+    async def _main(server):
+        monkeypatch.delenv("OPENAI_API_KEY")
+        monkeypatch.setenv("OPENAI_BASE_URL", "http://127.0.0.1:9/v1")
+        agent.api_key, agent.base_url = "key", server.base_url
+        # The stub server only serves chat completions, so the upload is a 404 there
+        with pytest.raises(openai.NotFoundError):
+            await agent.run_tasks_batch()
+        return server.num_connections
+
+    assert with_stub_server(_main) >= 1
+    agent.close()
@@ -0,0 +1,44 @@
+from src.agent import ResponseCache
+
+
+def test_evicts_least_recently_used_entries_over_budget(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.db", max_bytes=350)
+    for index in range(3):
+        cache.put(f"key-{index}", "x" * 100)
+    # Reading key-0 makes key-1 the least recently used entry
+    assert cache.get("key-0") == "x" * 100
+    cache.put("key-3", "x" * 100)
+    assert cache.get("key-1") is None
+    assert all(cache.get(f"key-{index}") for index in (0, 2, 3))
+    cache.close()
+
+
+def test_eviction_frees_a_tenth_of_the_budget(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.db", max_bytes=1000)
+    for index in range(11):
+        cache.put(f"key-{index}", "x" * 100)
+    # 1100 bytes over a 1000-byte budget: drop down to 900 bytes
+    assert [cache.get(f"key-{index}") is None for index in range(3)] == [True] * 2 + [False]
+    cache.close()
+
+
+def test_replacing_an_entry_counts_its_size_once(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.db", max_bytes=300)
+    for _ in range(5):
+        cache.put("key-0", "x" * 100)
+    cache.put("key-1", "x" * 100)
+    assert cache.get("key-0") is not None
+    cache.close()
+
+
+def test_entries_expire_and_survive_reopening(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.db")
+    cache.put("key-0", "response")
+    cache.close()
+    cache = ResponseCache(tmp_path / "cache.db")
+    assert cache.get("key-0") == "response"
+    cache.close()
+    cache = ResponseCache(tmp_path / "cache.db", max_age_secs=0)
+    assert cache.get("key-0") is None
+    assert (cache.hits, cache.misses) == (0, 1)
+    cache.close()
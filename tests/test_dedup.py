@@ -0,0 +1,111 @@
+import asyncio
+
+from src.agent import (
+    AgentType,
+    BaseAgent,
+    Deduplicator,
+    ErrorKind,
+    InputWriter,
+    RetryPolicy,
+    TaskStatus,
+)
+from scripts.invoke.open_coding import OpenCodingAgent
+
+COMMENT = "The new update broke the search page for everyone on mobile again"
+QUOTING_REPLY = COMMENT + " today"
+OTHER_QUOTING_REPLY = COMMENT + " tonight"
+
+
+class StubAgent(BaseAgent):
+    model = "gpt-4o-mini"
+
+
+def _write_inputs(path, comments: list[tuple[int, str]]) -> None:
+    # comments: (post index, content)
+    with InputWriter(path) as writer:
+        template_id = writer.add_template("Post: {post_title}\nComment: {content}")
+        context_ids = [
+            writer.add_context(f"POST_{index}", {"post_title": f"Post {index}"})
+            for index in range(max(post for post, _ in comments) + 1)
+        ]
+        for index, (post, content) in enumerate(comments):
+            writer.add_item(
+                f"COMMENT_{index}", template_id, context_ids[post], {"content": content}
+            )
+
+
+def _create_tasks(agent: BaseAgent, tmp_path, comments: list[tuple[int, str]]) -> int:
+    inputs_path = tmp_path / "inputs.jsonl"
+    _write_inputs(inputs_path, comments)
+    result = asyncio.run(agent.create_tasks_from_inputs(inputs_path, Deduplicator()))
+    return result.num_duplicates
+
+
+def test_open_coding_dedups_exact_copies_across_posts(tmp_path):
+    agent = OpenCodingAgent(data_dir=tmp_path / "data", logs_dir=tmp_path / "logs")
+    # Copypasta: the same comment twice under each of two posts
+    comments = [(0, COMMENT), (0, COMMENT), (1, COMMENT.upper() + "!"), (1, COMMENT)]
+    assert _create_tasks(agent, tmp_path, comments) == 3
+    assert agent.store.count(TaskStatus.PENDING) == 1
+    agent.close()
+
+
+def test_open_coding_matches_near_duplicates_only_within_a_post(tmp_path):
+    agent = OpenCodingAgent(data_dir=tmp_path / "data", logs_dir=tmp_path / "logs")
+    comments = [(0, COMMENT), (0, QUOTING_REPLY), (1, OTHER_QUOTING_REPLY)]
+    assert _create_tasks(agent, tmp_path, comments) == 1
+    representatives = list(agent.store.iter_tasks(TaskStatus.PENDING))
+    assert [task.source_id for task in representatives] == ["COMMENT_0", "COMMENT_2"]
+    agent.close()
+
+
+def test_near_duplicates_match_across_posts_by_default(tmp_path):
+    agent = StubAgent(
+        AgentType.OPEN_CODING, data_dir=tmp_path / "data", logs_dir=tmp_path / "logs"
+    )
+    comments = [(0, COMMENT), (1, OTHER_QUOTING_REPLY)]
+    assert _create_tasks(agent, tmp_path, comments) == 1
+    agent.close()
+
+
+def test_duplicates_follow_a_skipped_representative(tmp_path, with_stub_server):
+    agent = StubAgent(
+        AgentType.OPEN_CODING, data_dir=tmp_path / "data", logs_dir=tmp_path / "logs"
+    )
+    _create_tasks(agent, tmp_path, [(0, COMMENT), (0, COMMENT), (1, COMMENT)])
+    (representative,) = agent.store.iter_tasks(TaskStatus.PENDING)
+    agent.store.put(representative.model_copy(update={"status": TaskStatus.SKIPPED}))
+    assert agent.resolve_duplicates() == 2
+    assert agent.store.count(TaskStatus.SKIPPED) == 3
+
+    async def _main(server):
+        await agent.run_skipped()
+        return server.num_requests
+
+    # Only the representative is run, and its result reaches the duplicates
+    assert with_stub_server(_main) == 1
+    assert agent.store.count(TaskStatus.COMPLETED) == 3
+    agent.close()
+
+
+def test_duplicates_follow_a_failed_representative(tmp_path, with_stub_server):
+    agent = StubAgent(
+        AgentType.OPEN_CODING, data_dir=tmp_path / "data", logs_dir=tmp_path / "logs"
+    )
+    _create_tasks(agent, tmp_path, [(0, COMMENT), (0, COMMENT), (1, COMMENT)])
+    no_retries = {ErrorKind.SERVER: RetryPolicy(max_attempts=1)}
+
+    async def _fail(server):
+        return await agent.run_tasks(retry_policies=no_retries)
+
+    result = with_stub_server(_fail, server_error_rate=1.0)
+    assert result.num_duplicates_resolved == 2
+    assert agent.store.count(TaskStatus.FAILED) == 3
+
+    async def _retry(server):
+        await agent.retry_failed()
+        return server.num_requests
+
+    assert with_stub_server(_retry) == 1
+    assert agent.store.count(TaskStatus.COMPLETED) == 3
+    agent.close()
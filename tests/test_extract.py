@@ -0,0 +1,24 @@
+from src.agent import ParseOutcome, parse_output
+
+
+def test_parse_output_prefers_strict_json():
+    assert parse_output('{"related": true}') == ({"related": True}, ParseOutcome.STRICT)
+    assert parse_output('```json\n{"related": false}\n```') == (
+        {"related": False},
+        ParseOutcome.STRICT,
+    )
+
+
+def test_parse_output_repairs_malformed_json():
+    parsed, outcome = parse_output('{"codes": ["a", "b",], "related": true')
+    assert outcome is ParseOutcome.REPAIRED
+    assert parsed == {"codes": ["a", "b"], "related": True}
+    parsed, outcome = parse_output("{'related': True}")
+    assert outcome is ParseOutcome.REPAIRED
+    assert parsed == {"related": True}
+
+
+def test_parse_output_reports_empty_and_invalid():
+    assert parse_output(None) == (None, ParseOutcome.EMPTY)
+    assert parse_output("  ``` ```  ") == (None, ParseOutcome.EMPTY)
+    assert parse_output("I cannot help with that.") == (None, ParseOutcome.INVALID)
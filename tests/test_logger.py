@@ -0,0 +1,18 @@
+import threading
+
+from src.agent import AgentType, BaseAgent
+
+
+class StubAgent(BaseAgent):
+    model = "gpt-4o-mini"
+
+
+def test_closed_agents_stop_their_log_writers(tmp_path):
+    num_threads = threading.active_count()
+    for _ in range(5):
+        with StubAgent(
+            AgentType.OPEN_CODING, data_dir=tmp_path, logs_dir=tmp_path
+        ) as agent:
+            agent.logger.log("ping", "Ping")
+    assert threading.active_count() == num_threads
+    assert (tmp_path / f"{agent.config.agent_id}.jsonl").read_text().count("ping") == 1
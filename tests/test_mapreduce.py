@@ -0,0 +1,149 @@
+import asyncio
+import json
+
+import pytest
+
+from src.agent import AgentType, BaseAgent
+from src.mapreduce import (
+    item_tokens,
+    reduce_categories,
+    run_selective_coding,
+    split_by_tokens,
+)
+
+TEMPLATE = "Merge the categories of {cluster_label}:\n{main_categories}"
+
+
+class ReduceAgent(BaseAgent):
+    model = "gpt-4o-mini"
+
+
+def _category(index: int) -> dict:
+    return {"name": f"Category {index}", "definition": "A definition. " * 10}
+
+
+def test_split_by_tokens_balances_runs_within_budget():
+    runs = split_by_tokens(list(range(10)), [10] * 10, budget=40)
+    # The fewest runs that fit, in order
+    assert len(runs) == 3
+    assert all(len(run) * 10 <= 40 for run in runs)
+    assert [item for run in runs for item in run] == list(range(10))
+
+
+def test_split_by_tokens_gives_oversized_item_its_own_run():
+    runs = split_by_tokens(["a", "big", "b"], [10, 100, 10], budget=40)
+    assert runs == [["a"], ["big"], ["b"]]
+
+
+def test_reduce_categories_merges_tree_until_group_fits(tmp_path, with_stub_server):
+    merged = {"main_categories": [_category(0)]}
+    categories = [_category(index) for index in range(12)]
+    budget = 3 * item_tokens(_category(0))
+
+    async def _main(server):
+        agent = ReduceAgent(
+            AgentType.AXIAL_CODING, data_dir=tmp_path, logs_dir=tmp_path
+        )
+        result = await reduce_categories(
+            agent, {"cluster": categories}, TEMPLATE, budget=budget
+        )
+        return result, server.num_requests
+
+    result, num_requests = with_stub_server(_main, reply=json.dumps(merged))
+    # 12 categories -> 4 runs of 3 -> 4 merged categories -> 2 runs -> 2 -> 1 final.
+    # The stub merges every run into the same category, and identical prompts share
+    # one call: both second-level runs and the final merge are the same prompt
+    assert result == {"cluster": merged["main_categories"]}
+    assert num_requests == 4 + 1
+
+
+def test_reduce_categories_raises_instead_of_oversized_prompt(
+    tmp_path, with_stub_server
+):
+    # Every merge returns as many categories as it was given
+    categories = [_category(index) for index in range(4)]
+    budget = 2 * item_tokens(_category(0))
+
+    async def _main(server):
+        agent = ReduceAgent(
+            AgentType.AXIAL_CODING, data_dir=tmp_path, logs_dir=tmp_path
+        )
+        await reduce_categories(
+            agent, {"cluster": categories}, TEMPLATE, budget=budget, max_levels=2
+        )
+
+    with pytest.raises(RuntimeError, match="after 2 levels"):
+        with_stub_server(
+            _main, reply=json.dumps({"main_categories": categories[:2]})
+        )
+
+
+def test_reduce_categories_rejects_category_over_budget(tmp_path, with_stub_server):
+    categories = [_category(0), {"name": "Huge", "definition": "word " * 500}]
+
+    async def _main(server):
+        agent = ReduceAgent(
+            AgentType.AXIAL_CODING, data_dir=tmp_path, logs_dir=tmp_path
+        )
+        await reduce_categories(agent, {"cluster": categories}, TEMPLATE, budget=200)
+
+    with pytest.raises(RuntimeError, match="alone takes"):
+        with_stub_server(_main)
+
+
+def test_selective_coding_consolidates_until_categories_fit(tmp_path, with_stub_server):
+    # Every merge only pairs up its categories, so the 32 categories are still over
+    # the budget after the first consolidation round and need a second one
+    categories = [
+        {**_category(index), "associated_subcategories": ["A subcategory"]}
+        for index in range(32)
+    ]
+    reduce_calls: list[list[dict]] = []
+    selected: list[dict] = []
+
+    def _reply(prompt: str) -> str:
+        header, main_categories = prompt.split("\n", 1)
+        given = json.loads(main_categories)
+        if header.startswith("Find"):
+            selected.extend(given)
+            return json.dumps({"core_category": {"name": "Core"}})
+        reduce_calls.append(given)
+        merged = [
+            {
+                "name": " + ".join(category["name"] for category in pair),
+                "definition": "Merged.",
+            }
+            for pair in (given[start : start + 2] for start in range(0, len(given), 2))
+        ]
+        return json.dumps({"main_categories": merged})
+
+    async def _main(server):
+        reduce_agent = ReduceAgent(
+            AgentType.SELECTIVE_CODING, data_dir=tmp_path, logs_dir=tmp_path
+        )
+        selective_agent = ReduceAgent(
+            AgentType.SELECTIVE_CODING, data_dir=tmp_path, logs_dir=tmp_path
+        )
+        return await asyncio.wait_for(
+            run_selective_coding(
+                reduce_agent,
+                selective_agent,
+                categories,
+                TEMPLATE,
+                "Find the core category of:\n{main_categories}",
+                max_prompt_tokens=4 * item_tokens(_category(0)),
+            ),
+            timeout=60,
+        )
+
+    assert with_stub_server(_main, reply=_reply) == {"core_category": {"name": "Core"}}
+    second_round = [
+        call for call in reduce_calls if any(" + " in c["name"] for c in call)
+    ]
+    assert second_round and len(second_round) < len(reduce_calls)
+    assert not any(
+        "associated_subcategories" in category for call in reduce_calls for category in call
+    )
+    # Every category reaches the selective coding prompt, merged into another or not
+    names = " + ".join(category["name"] for category in selected).split(" + ")
+    assert sorted(names) == sorted(category["name"] for category in categories)
@@ -0,0 +1,22 @@
+from src.agent import pack_prompt, unpack_response
+
+
+def test_pack_prompt_renders_shared_context_once():
+    prompt = pack_prompt(
+        "Post: {post}\nComment: {comment}",
+        {"post": "A post"},
+        [("a", {"comment": "First"}), ("b", {"comment": "Second"})],
+    )
+    assert prompt.count("A post") == 1
+    assert "### Item `a`\n- comment: First" in prompt
+    assert '"a", "b"' in prompt
+
+
+def test_unpack_response_drops_missing_and_malformed_items():
+    output_text = '{"a": {"related": true}, "b": "yes", "extra": {"related": false}}'
+    assert unpack_response(output_text, ["a", "b", "c"]) == {"a": '{"related": true}'}
+
+
+def test_unpack_response_without_an_object():
+    assert unpack_response("", ["a"]) == {}
+    assert unpack_response('[{"related": true}]', ["a"]) == {}
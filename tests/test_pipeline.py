@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src.agent import AgentType, BaseAgent, TaskStatus
+from src.pipeline import Pipeline, PipelineManifest, clusters_handoff
+
+TEMPLATE = "Code cluster {cluster_label}:\n{subcategories}"
+
+
+class AxialAgent(BaseAgent):
+    model = "gpt-4o-mini"
+
+
+def _hand_off(agent, handoff, clusters):
+    for cluster in clusters.items():
+        agent.store.insert_many(handoff(agent, cluster))
+    agent.store.flush()
+
+
+def test_clusters_handoff_follows_stable_cluster_ids(tmp_path):
+    agent = AxialAgent(AgentType.AXIAL_CODING, data_dir=tmp_path, logs_dir=tmp_path)
+    upstream = SimpleNamespace(model=None)
+    handoff = clusters_handoff(upstream, TEMPLATE)
+
+    first = {-1: ["noise"], 0: ["a", "b"], 1: ["c"], 2: ["d"]}
+    upstream.model = SimpleNamespace(clusters=first)
+    _hand_off(agent, handoff, first)
+    assert agent.store.count(TaskStatus.PENDING) == 3
+    agent.store.put_many(
+        task.model_copy(update={"status": TaskStatus.COMPLETED, "output_text": "{}"})
+        for task in list(agent.store.iter_tasks())
+    )
+
+    # Cluster 0 unchanged, 1 gained a member, 2 vanished
+    second = {-1: ["noise"], 0: ["a", "b"], 1: ["c", "e"]}
+    upstream.model = SimpleNamespace(clusters=second)
+    _hand_off(agent, handoff, second)
+    # Replaying the same clusters changes nothing
+    _hand_off(agent, handoff, second)
+
+    status = {task.source_id: task.status for task in agent.store.iter_tasks()}
+    assert status == {
+        "0": TaskStatus.COMPLETED,
+        "1": TaskStatus.PENDING,
+        "2": TaskStatus.SKIPPED,
+    }
+    assert '"e"' in next(
+        task.input_text
+        for task in agent.store.iter_tasks()
+        if task.source_id == "1"
+    )
+    agent.close()
+
+
+def test_manifest_gives_the_agent_id_of_each_stage(tmp_path):
+    path = PipelineManifest.path("p1", tmp_path)
+    path.parent.mkdir(parents=True)
+    path.write_text(
+        PipelineManifest(pipeline_id="p1", agent_ids={"related": "r1"}).model_dump_json()
+    )
+
+    manifest = PipelineManifest.load("p1", tmp_path)
+    assert manifest.stage_agent_id("related") == "r1"
+    with pytest.raises(ValueError):
+        manifest.stage_agent_id("open_coding")
+    assert Pipeline("p1", [], data_dir=tmp_path).manifest == manifest
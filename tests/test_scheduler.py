@@ -0,0 +1,164 @@
+import asyncio
+import contextlib
+import time
+
+import pytest
+
+from src.agent import (
+    AdaptiveConcurrencyLimiter,
+    AgentType,
+    BaseAgent,
+    ErrorKind,
+    ModelTier,
+    RateLimiter,
+    RetryBudget,
+    RetryPolicy,
+    RoutingPolicy,
+    TaskError,
+    TaskStatus,
+    Throttle,
+)
+
+
+def test_retry_delay_backs_off_with_jitter_up_to_max_delay():
+    policy = RetryPolicy(max_attempts=10, base_delay=1.0, max_delay=8.0)
+    for attempt, backoff in [(1, 1.0), (2, 2.0), (3, 4.0), (4, 8.0), (9, 8.0)]:
+        delays = [policy.delay(attempt) for _ in range(200)]
+        assert all(0 <= delay <= backoff for delay in delays)
+        assert max(delays) > backoff / 2
+
+
+def test_retry_delay_waits_at_least_retry_after():
+    policy = RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=2.0)
+    assert all(policy.delay(1, retry_after=30.0) == 30.0 for _ in range(50))
+
+
+def test_retry_budget_earns_retries_from_first_attempts():
+    budget = RetryBudget(ratio=0.5, min_retries=2, max_balance=3)
+    assert [budget.try_spend() for _ in range(3)] == [True, True, False]
+    budget.record_attempt()
+    assert not budget.try_spend()
+    budget.record_attempt()
+    assert budget.try_spend()
+    # Unspent retries are capped at max_balance
+    for _ in range(100):
+        budget.record_attempt()
+    assert [budget.try_spend() for _ in range(4)] == [True, True, True, False]
+
+
+def test_routing_escalates_one_tier_at_a_time():
+    policy = RoutingPolicy(
+        tiers=[
+            ModelTier(model="gpt-4o-mini", max_input_tokens=1000),
+            ModelTier(model="gpt-4.1", max_input_tokens=4000),
+            ModelTier(model="gpt-4o"),
+        ]
+    )
+    assert policy.initial_model(1000) == "gpt-4o-mini"
+    assert policy.initial_model(1001) == "gpt-4.1"
+    assert policy.initial_model(100_000) == "gpt-4o"
+    assert policy.escalate("gpt-4o-mini") == "gpt-4.1"
+    assert policy.escalate("gpt-4.1") == "gpt-4o"
+    assert policy.escalate("gpt-4o") is None
+    assert policy.escalate("o3") is None
+
+
+class StubAgent(BaseAgent):
+    model = "gpt-4o-mini"
+
+
+def test_estimate_tasks_leaves_the_event_loop_free(tmp_path):
+    agent = StubAgent(AgentType.OPEN_CODING, data_dir=tmp_path, logs_dir=tmp_path)
+    asyncio.run(agent.create_tasks(["word " * (index + 1) for index in range(50)]))
+    ticks = 0
+
+    async def _tick() -> None:
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0)
+
+    async def _main() -> int:
+        ticker = asyncio.create_task(_tick())
+        try:
+            return await agent.estimate_tasks(chunk_size=10)
+        finally:
+            ticker.cancel()
+
+    assert asyncio.run(_main()) == 50
+    assert ticks >= 5  # At least once per chunk
+    tasks = list(agent.store.iter_tasks(TaskStatus.PENDING, by_priority=True))
+    assert [task.estimated_tokens for task in tasks] == sorted(
+        (task.estimated_tokens for task in tasks), reverse=True
+    )
+    # Estimated tasks are not counted again
+    assert asyncio.run(agent.estimate_tasks()) == 0
+    agent.close()
+
+
+def test_request_gap_is_deprecated_for_a_request_rate(tmp_path, with_stub_server):
+    agent = StubAgent(AgentType.OPEN_CODING, data_dir=tmp_path, logs_dir=tmp_path)
+    asyncio.run(agent.create_tasks([f"Comment {index}" for index in range(8)]))
+
+    async def _main(server):
+        started_at = time.monotonic()
+        result = await agent.run_tasks(request_gap=0.25)
+        return result, time.monotonic() - started_at
+
+    with pytest.warns(DeprecationWarning, match="request_gap"):
+        result, elapsed = with_stub_server(_main)
+    assert result.num_tasks_completed == 8
+    # 4 requests per second, with up to one second of them at once
+    assert elapsed >= 0.9
+    agent.close()
+
+
+def test_cancelled_calls_do_not_grow_the_concurrency_limit():
+    concurrency = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=4)
+    throttle = Throttle(RateLimiter(), concurrency)
+
+    async def _call() -> None:
+        async with throttle.slot(num_tokens=1):
+            await asyncio.sleep(10)
+
+    async def _main() -> None:
+        for _ in range(10):
+            call = asyncio.create_task(_call())
+            await asyncio.sleep(0.01)
+            call.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await call
+
+    asyncio.run(_main())
+    assert (concurrency.limit, concurrency.inflight) == (1, 0)
+
+
+def test_retries_are_limited_per_error_kind(tmp_path, with_stub_server):
+    agent = StubAgent(AgentType.OPEN_CODING, data_dir=tmp_path, logs_dir=tmp_path)
+    asyncio.run(agent.create_tasks(["Comment"]))
+    (task,) = agent.store.iter_tasks()
+    # Three earlier rate-limited calls: as many as the server error policy allows
+    rate_limited = TaskError(
+        kind=ErrorKind.RATE_LIMIT, error_class="RateLimitError", message="429"
+    )
+    agent.store.put(
+        task.model_copy(update={"attempts": 3, "errors": [rate_limited] * 3})
+    )
+    retry_policies = {
+        ErrorKind.SERVER: RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.01)
+    }
+
+    async def _main(server):
+        await agent.run_tasks(retry_policies=retry_policies)
+        num_first_run = server.num_requests
+        await agent.retry_failed(retry_policies=retry_policies)
+        return num_first_run, server.num_requests
+
+    # Every call fails with a 500, three times per run
+    assert with_stub_server(_main, server_error_rate=1.0) == (3, 6)
+    task = agent.store.get(task.task_id)
+    assert task.status == TaskStatus.FAILED
+    assert [error.kind for error in task.errors] == [ErrorKind.RATE_LIMIT] * 3 + [
+        ErrorKind.SERVER
+    ] * 6
+    agent.close()
@@ -0,0 +1,70 @@
+import time
+
+from src.agent import SQLiteTaskStore, TaskSchema, TaskStatus
+
+
+def _store(tmp_path) -> SQLiteTaskStore:
+    store = SQLiteTaskStore(tmp_path / "tasks.db", commit_every=1)
+    store.put_many(TaskSchema(task_id=f"task-{index}") for index in range(6))
+    return store
+
+
+def test_claim_leases_each_task_to_one_worker(tmp_path):
+    store = _store(tmp_path)
+    first = store.claim("worker-0", limit=4, lease_secs=60)
+    second = store.claim("worker-1", limit=4, lease_secs=60)
+    assert [task.task_id for task in first] == [f"task-{index}" for index in range(4)]
+    assert [task.task_id for task in second] == ["task-4", "task-5"]
+    assert store.claim("worker-2", limit=4, lease_secs=60) == []
+    store.close()
+
+
+def test_claim_skips_finished_tasks_and_follows_priority(tmp_path):
+    store = _store(tmp_path)
+    store.put(TaskSchema(task_id="task-0", status=TaskStatus.COMPLETED))
+    store.put(TaskSchema(task_id="task-3", estimated_tokens=100))
+    claimed = store.claim("worker-0", limit=2, lease_secs=60, by_priority=True)
+    assert [task.task_id for task in claimed] == ["task-3", "task-1"]
+    store.close()
+
+
+def test_lapsed_lease_is_claimed_by_another_worker(tmp_path):
+    store = _store(tmp_path)
+    store.claim("worker-0", limit=6, lease_secs=0.05)
+    time.sleep(0.1)
+    assert len(store.claim("worker-1", limit=6, lease_secs=60)) == 6
+    store.close()
+
+
+def test_renew_extends_only_pending_leases_of_the_worker(tmp_path):
+    store = _store(tmp_path)
+    store.claim("worker-0", limit=3, lease_secs=0.05)
+    store.claim("worker-1", limit=3, lease_secs=0.05)
+    # A finished task drops its lease and is not renewed
+    store.put(TaskSchema(task_id="task-0", status=TaskStatus.COMPLETED))
+    assert store.renew_leases("worker-0", lease_secs=60) == 2
+    time.sleep(0.1)
+    claimed = store.claim("worker-2", limit=6, lease_secs=60)
+    assert [task.task_id for task in claimed] == ["task-3", "task-4", "task-5"]
+    store.close()
+
+
+def test_pending_write_keeps_the_lease(tmp_path):
+    store = _store(tmp_path)
+    store.claim("worker-0", limit=1, lease_secs=60)
+    # E.g. a task written back while awaiting a retry
+    store.put(TaskSchema(task_id="task-0", attempts=1))
+    claimed = store.claim("worker-1", limit=1, lease_secs=60)
+    assert [task.task_id for task in claimed] == ["task-1"]
+    store.close()
+
+
+def test_release_hands_leases_back(tmp_path):
+    store = _store(tmp_path)
+    store.claim("worker-0", limit=4, lease_secs=60)
+    store.claim("worker-1", limit=2, lease_secs=60)
+    assert store.release_leases("worker-0") == 4
+    assert store.release_leases("worker-0") == 0
+    claimed = store.claim("worker-2", limit=6, lease_secs=60)
+    assert [task.task_id for task in claimed] == [f"task-{index}" for index in range(4)]
+    store.close()
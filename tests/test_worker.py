@@ -0,0 +1,137 @@
+import asyncio
+import multiprocessing
+import os
+import signal
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from stub_server import StubServer
+from src.agent import AgentType, BaseAgent, TaskStatus, WorkerConfig, run_worker
+
+
+class StubAgent(BaseAgent):
+    model = "gpt-4o-mini"
+
+
+def _worker_main(agent_id: str, base_url: str, data_dir: Path, logs_dir: Path) -> None:
+    run_worker(
+        StubAgent,
+        agent_id,
+        WorkerConfig(
+            worker_id="worker-0",
+            api_key="stub",
+            base_url=base_url,
+            max_concurrent_requests=4,
+        ),
+        {"agent_type": AgentType.OPEN_CODING, "data_dir": data_dir, "logs_dir": logs_dir},
+        lease_secs=300.0,
+    )
+
+
+def _num_leased(db_path: Path) -> int:
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM tasks WHERE lease_owner IS NOT NULL"
+        ).fetchone()[0]
+
+
+def test_worker_restarted_with_same_id_reclaims_its_leases(tmp_path, monkeypatch):
+    data_dir, logs_dir = tmp_path / "data", tmp_path / "logs"
+
+    async def _main() -> None:
+        server = StubServer(latency=0.2)
+        await server.start()
+        monkeypatch.setenv("OPENAI_BASE_URL", server.base_url)
+        monkeypatch.setenv("OPENAI_API_KEY", "stub")
+        agent = StubAgent(AgentType.OPEN_CODING, data_dir=data_dir, logs_dir=logs_dir)
+        await agent.create_tasks([f"Comment {index}" for index in range(40)])
+        agent_id = agent.config.agent_id
+        db_path = data_dir / "tasks" / f"{agent_id}.db"
+        agent.close()
+
+        process = multiprocessing.get_context("spawn").Process(
+            target=_worker_main, args=(agent_id, server.base_url, data_dir, logs_dir)
+        )
+        process.start()
+        # Kill the worker once it holds leases, before it can release them
+        deadline = time.monotonic() + 60
+        while not _num_leased(db_path):
+            assert time.monotonic() < deadline, "worker never claimed a task"
+            await asyncio.sleep(0.1)
+        os.kill(process.pid, signal.SIGKILL)
+        await asyncio.to_thread(process.join)
+        assert _num_leased(db_path)
+
+        # Leases last 300s: the restarted worker only finishes in time if it
+        # reclaims the ones its previous run left behind
+        agent = StubAgent(
+            AgentType.OPEN_CODING,
+            agent_id=agent_id,
+            data_dir=data_dir,
+            logs_dir=logs_dir,
+        )
+        try:
+            await asyncio.wait_for(
+                agent.run_tasks(
+                    max_concurrent_requests=4,
+                    worker_id="worker-0",
+                    lease_secs=300.0,
+                    claim_poll_interval=0.1,
+                ),
+                timeout=60,
+            )
+            assert agent.store.count(TaskStatus.COMPLETED) == 40
+        finally:
+            agent.close()
+            await server.close()
+
+    asyncio.run(_main())
+
+
+@contextmanager
+def _stub_server_thread(**server_kwargs) -> Iterator[StubServer]:
+    # run_worker starts its own event loop, so the server runs on another thread
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = StubServer(**server_kwargs)
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+    try:
+        yield server
+    finally:
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+
+def test_in_process_workers_keep_their_own_credentials(tmp_path, monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_BASE_URL", raising=False)
+    agent_kwargs = {
+        "agent_type": AgentType.OPEN_CODING,
+        "data_dir": tmp_path / "data",
+        "logs_dir": tmp_path / "logs",
+    }
+    with _stub_server_thread() as first, _stub_server_thread() as second:
+        for index, server in enumerate((first, second)):
+            agent = StubAgent(**agent_kwargs)
+            asyncio.run(agent.create_tasks([f"Comment {index}"]))
+            agent.close()
+            result = run_worker(
+                StubAgent,
+                agent.config.agent_id,
+                WorkerConfig(
+                    worker_id=f"worker-{index}",
+                    api_key=f"key-{index}",
+                    base_url=server.base_url,
+                ),
+                agent_kwargs,
+            )
+            assert result.num_tasks_completed == 1
+        assert (first.num_requests, second.num_requests) == (1, 1)
+    assert "OPENAI_API_KEY" not in os.environ
+    assert "OPENAI_BASE_URL" not in os.environ